@@ -0,0 +1,57 @@
+"""add generation_telemetry table
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, Sequence[str], None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'generation_telemetry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('article_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total_ms', sa.Integer(), nullable=True),
+        sa.Column('ttfb_ms', sa.Integer(), nullable=True),
+        sa.Column('llm_ms', sa.Integer(), nullable=True),
+        sa.Column('input_tokens', sa.Integer(), nullable=True),
+        sa.Column('output_tokens', sa.Integer(), nullable=True),
+        sa.Column('cache_read_tokens', sa.Integer(), nullable=True),
+        sa.Column('retries', sa.Integer(), nullable=True),
+        sa.Column('stages', sa.JSON(), nullable=True),
+        sa.Column('details', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['article_id'], ['articles.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_generation_telemetry_id'), 'generation_telemetry', ['id'], unique=False)
+    op.create_index(op.f('ix_generation_telemetry_article_id'), 'generation_telemetry', ['article_id'], unique=False)
+    op.create_index(op.f('ix_generation_telemetry_user_id'), 'generation_telemetry', ['user_id'], unique=False)
+    op.create_index(op.f('ix_generation_telemetry_model'), 'generation_telemetry', ['model'], unique=False)
+    op.create_index(op.f('ix_generation_telemetry_created_at'), 'generation_telemetry', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_generation_telemetry_created_at'), table_name='generation_telemetry')
+    op.drop_index(op.f('ix_generation_telemetry_model'), table_name='generation_telemetry')
+    op.drop_index(op.f('ix_generation_telemetry_user_id'), table_name='generation_telemetry')
+    op.drop_index(op.f('ix_generation_telemetry_article_id'), table_name='generation_telemetry')
+    op.drop_index(op.f('ix_generation_telemetry_id'), table_name='generation_telemetry')
+    op.drop_table('generation_telemetry')
@@ -0,0 +1,44 @@
+"""add image_ocr_cache table
+
+Revision ID: c3d4e5f6a7b8
+Revises: bb211ff67b7c
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, Sequence[str], None] = 'bb211ff67b7c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'image_ocr_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('image_hash', sa.String(length=64), nullable=False),
+        sa.Column('prompt_version', sa.String(length=32), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('model', sa.String(length=50), nullable=True),
+        sa.Column('hit_count', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('image_hash', 'prompt_version', name='uq_image_ocr_cache'),
+    )
+    op.create_index(op.f('ix_image_ocr_cache_id'), 'image_ocr_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_image_ocr_cache_image_hash'), 'image_ocr_cache', ['image_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_ocr_cache_image_hash'), table_name='image_ocr_cache')
+    op.drop_index(op.f('ix_image_ocr_cache_id'), table_name='image_ocr_cache')
+    op.drop_table('image_ocr_cache')
@@ -0,0 +1,32 @@
+"""add cache token columns to usage_records
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, Sequence[str], None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('usage_records') as batch_op:
+        batch_op.add_column(sa.Column('cache_read_tokens', sa.Integer(), nullable=True, server_default='0'))
+        batch_op.add_column(sa.Column('cache_write_tokens', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('usage_records') as batch_op:
+        batch_op.drop_column('cache_write_tokens')
+        batch_op.drop_column('cache_read_tokens')
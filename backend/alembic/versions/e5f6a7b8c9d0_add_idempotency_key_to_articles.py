@@ -0,0 +1,32 @@
+"""add idempotency_key to articles
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, Sequence[str], None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('articles') as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=100), nullable=True))
+        batch_op.create_unique_constraint('uq_articles_user_idempotency_key', ['user_id', 'idempotency_key'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('articles') as batch_op:
+        batch_op.drop_constraint('uq_articles_user_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
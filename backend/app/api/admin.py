@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.db.database import get_db
 from app.models.user import User
 from app.auth import get_current_admin
@@ -106,6 +107,99 @@ async def get_all_usage(
     return usage_tracker.get_all_users_usage(start_date=start_date, end_date=end_date)
 
 
+@router.get("/ocr-cache")
+async def get_ocr_cache_stats(_admin: User = Depends(get_current_admin)):
+    """圖片 OCR 快取命中統計（僅管理員）"""
+    from app.services.ocr_cache import ocr_cache
+    return ocr_cache.get_stats()
+
+
+@router.get("/llm-circuits")
+async def get_llm_circuits(_admin: User = Depends(get_current_admin)):
+    """LLM 斷路器與對沖狀態（僅管理員）：各 provider/model 的狀態、近期失敗率與延遲"""
+    from app.services.circuit_breaker import circuit_breakers
+    from app.services.hedging import hedge_policy
+    return {
+        "circuits": circuit_breakers.snapshot(),
+        "failover_models": settings.LLM_FAILOVER_MODELS,
+        "hedging": hedge_policy.get_stats(),
+    }
+
+
+@router.get("/llm-response-cache")
+async def get_llm_response_cache_stats(_admin: User = Depends(get_current_admin)):
+    """LLM 回應快取統計（僅管理員，本程序）"""
+    from app.services.llm_response_cache import llm_response_cache
+    return llm_response_cache.get_stats()
+
+
+@router.get("/seo-cache")
+async def get_seo_cache_stats(_admin: User = Depends(get_current_admin)):
+    """SEO 分析結果快取統計（僅管理員，本程序）：評分器版本、記憶體 / Redis 命中次數、即時分析工作階段與段落快取"""
+    from app.services.seo_cache import seo_cache
+    from app.services.seo_incremental import seo_incremental
+    return {**seo_cache.get_stats(), "live": seo_incremental.get_stats()}
+
+
+@router.get("/rate-limits")
+async def get_rate_limits(_admin: User = Depends(get_current_admin)):
+    """對外 API 速率限制狀態（僅管理員）：後端、各桶取得 / 等待 / 超時次數（本程序統計）"""
+    from app.services.rate_limiter import rate_limiter
+    return rate_limiter.get_stats()
+
+
+@router.get("/generation-telemetry")
+async def get_generation_telemetry(
+    days: int = Query(7, ge=1, le=90, description="統計最近幾天"),
+    model: Optional[str] = Query(None, description="只看指定模型"),
+    limit: int = Query(5000, ge=1, le=50000, description="最多取樣筆數（最新優先）"),
+    db: Session = Depends(get_db),
+    _admin: User = Depends(get_current_admin),
+):
+    """文章生成效能統計（僅管理員）：依模型彙總總耗時 / TTFB / LLM / 各階段的 p50 / p90 / p99、失敗與重試次數、平均 token"""
+    from app.services.generation_telemetry import generation_telemetry
+    return generation_telemetry.summarize(db, days=days, model=model, limit=limit)
+
+
+@router.get("/generation-telemetry/articles/{article_id}")
+async def get_article_generation_telemetry(
+    article_id: int,
+    db: Session = Depends(get_db),
+    _admin: User = Depends(get_current_admin),
+):
+    """單篇文章的生成遙測紀錄（僅管理員）：各階段耗時、圖片 / OCR / LLM 細節、各模型 token"""
+    from app.services.generation_telemetry import generation_telemetry
+    return generation_telemetry.for_article(db, article_id)
+
+
+@router.post("/seo-rescore")
+async def start_seo_rescore(
+    user_id: Optional[int] = Query(None, description="只重算指定用戶的文章（預設全站）"),
+    _admin: User = Depends(get_current_admin),
+):
+    """背景重算文章 SEO 分數（僅管理員）：調整評分規則後使用；已有重算在執行時回傳該任務"""
+    from app.services.seo_batch import seo_batch
+    job, already_running = seo_batch.start_rescore(user_id=user_id)
+    return {**job.to_dict(), "already_running": already_running, "workers": seo_batch.workers}
+
+
+@router.get("/seo-rescore")
+async def list_seo_rescore_jobs(_admin: User = Depends(get_current_admin)):
+    """最近的 SEO 重算任務（僅管理員；只有本程序啟動的任務，多 worker 部署時各自獨立）"""
+    from app.services.seo_batch import seo_batch
+    return seo_batch.list_jobs()
+
+
+@router.get("/seo-rescore/{job_id}")
+async def get_seo_rescore_job(job_id: str, _admin: User = Depends(get_current_admin)):
+    """SEO 重算任務進度（僅管理員；狀態只存在於啟動任務的程序，由其他 worker 處理的查詢會回傳 404）"""
+    from app.services.seo_batch import seo_batch
+    job = seo_batch.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="重算任務不存在（或由其他 worker 程序啟動）")
+    return job.to_dict()
+
+
 @router.get("/system-prompts")
 async def get_system_prompts(_admin: User = Depends(get_current_admin)):
     """取得系統層級提示詞（僅管理員）"""
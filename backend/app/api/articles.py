@@ -2,21 +2,31 @@
 文章 API 路由
 """
 import asyncio
+import json
 import logging
 import traceback
 from typing import List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-import httpx
 
+from app.config import settings
 from app.db.database import get_db, get_db_session
 from app.models.article import Article
 from app.models.user import User
+from app.services.article_renderer import (
+    image_anchors,
+    place_markers,
+    render_copy_formats,
+    render_markers,
+    render_vocus_formats,
+)
 from app.auth import get_current_user, get_approved_user
+from app.services.generation_jobs import build_error_report, generation_jobs, mark_article_failed
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +45,23 @@ class ArticleGenerateRequest(BaseModel):
     sub_id: Optional[str] = None  # 蝦皮聯盟行銷追蹤 Sub_id
     disable_system_instructions: bool = False  # 停用系統寫作指示
     keyword_strategy: Optional[dict] = None  # 前端傳入的 SEO 關鍵字策略
+    stream: bool = False  # 串流模式：LLM 逐塊輸出經 /events 推送，並定期寫入部分內容
+    use_cache: bool = True  # 相同輸入直接沿用上次 LLM 結果（重送 / 連點）；重新生成不同版本時須設為 False（前端對已生成過的相同內容再按一次會自動帶上）
+
+
+class ArticleBatchGenerateRequest(BaseModel):
+    product_groups: List[List[int]]  # 每組商品生成一篇文章
+    article_type: str = "comparison"
+    target_forum: str = "goodthings"
+    prompt_template_id: Optional[int] = None
+    model: Optional[str] = None
+    include_images: bool = False
+    image_sources: List[str] = ["description"]
+    sub_id: Optional[str] = None
+    disable_system_instructions: bool = False
+    keyword_strategy: Optional[dict] = None
+    stream: bool = False
+    use_cache: bool = True
 
 
 class ArticleUpdateRequest(BaseModel):
@@ -60,29 +87,120 @@ class ArticleResponse(BaseModel):
     published_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+    generation_timings: Optional[dict] = None  # 生成各階段耗時（見 generation_pipeline）
+    job_id: Optional[str] = None  # 非同步生成模式的任務 ID
 
     class Config:
         from_attributes = True
 
 
 @router.get("/image-proxy")
-async def image_proxy(url: str = Query(..., description="圖片 URL")):
-    """代理下載外部圖片（解決跨域問題，供前端複製圖片到剪貼簿）"""
+async def image_proxy(
+    url: str = Query(..., description="圖片 URL"),
+    current_user: User = Depends(get_current_user),
+):
+    """代理下載外部圖片（解決跨域問題，供前端複製圖片到剪貼簿）
+
+    需登入；只回傳 / 快取圖片內容（非圖片或超過 IMAGE_CACHE_MAX_IMAGE_BYTES 時 415）
+    """
     if not url.startswith("https://"):
         raise HTTPException(status_code=400, detail="僅支援 HTTPS URL")
 
+    from app.services.image_cache import image_cache, ImageRejected
+
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
+        cached = await image_cache.aget(url)
+    except ImageRejected as e:
+        raise HTTPException(status_code=415, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"圖片下載失敗: {e}")
 
-    content_type = resp.headers.get("content-type", "image/jpeg")
-    return Response(content=resp.content, media_type=content_type)
+    return Response(
+        content=cached.content,
+        media_type=cached.content_type,
+        headers={"Cache-Control": "private, max-age=86400", "ETag": f'"{cached.digest}"'},
+    )
+
+
+def _save_partial_content(article_id: int, content: str):
+    """寫入串流中的部分內容（獨立的短暫 session，失敗不影響生成流程本身的 session）
+
+    只更新仍在生成中的文章，晚到的部分內容不會蓋掉已寫入的完整文章
+    """
+    with get_db_session() as db:
+        try:
+            db.query(Article).filter(Article.id == article_id, Article.status == "generating").update(
+                {"content": content}, synchronize_session=False,
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"文章 {article_id} 部分內容寫入失敗（略過）: {e}")
+
+
+def _make_delta_handler(article_id: int):
+    """串流模式：將 LLM 文字片段轉發為 delta 事件，並定期寫入部分內容至 Article.content
+
+    收到 None 代表串流中斷、LLM 將從頭重試 → 清空緩衝並發 reset 事件
+    on_delta 在 event loop 上被呼叫，寫入丟到 generation_jobs.executor（上一次寫入未完成時略過本次）
+    """
+    import time as _time
+
+    chunks = []
+    last_saved = _time.time()
+    pending = None
+
+    def on_delta(text: Optional[str]):
+        nonlocal last_saved, pending
+        if text is None:
+            chunks.clear()
+            generation_jobs.publish(article_id, "reset")
+            return
+        chunks.append(text)
+        generation_jobs.publish(article_id, "delta", text=text)
+
+        now = _time.time()
+        if now - last_saved >= settings.GENERATION_PARTIAL_SAVE_INTERVAL and (pending is None or pending.done()):
+            last_saved = now
+            pending = generation_jobs.executor.submit(_save_partial_content, article_id, "".join(chunks))
+
+    return on_delta
+
+
+def _load_owned_products(db: Session, product_ids: List[int], user_id: int) -> dict:
+    from app.models.product import Product
+
+    return {p.id: p for p in db.query(Product).filter(
+        Product.id.in_(product_ids),
+        Product.user_id == user_id,
+    ).all()}
+
+
+def _save_generated_article(db: Session, article_id: int, result: dict, seo_result: dict, trace, use_model: str, start_time: float):
+    """更新 placeholder 文章為生成結果並 commit（同步 DB 寫入，由背景協程丟到執行緒執行）"""
+    import time as _time
+
+    article = db.query(Article).filter(Article.id == article_id).first()
+    if not article:
+        return
+    article.title = result["title"]
+    article.content = result["content"]
+    article.content_markdown = result.get("content_markdown")
+    article.content_with_images = result["content_with_images"]
+    article.image_map = result.get("image_map")
+    article.seo_score = seo_result["score"]
+    article.seo_suggestions = seo_result
+    article.status = "draft"
+    # 各階段相對於背景任務開始的時間（DB 載入、流水線各階段、SEO）
+    article.generation_timings = {"stages": dict(trace.stages), "total_ms": trace.elapsed_ms()}
+    commit_started = _time.perf_counter()
+    db.commit()
+    trace.stage("commit", commit_started)
+    elapsed = round(_time.time() - start_time, 1)
+    logger.info(f"文章 {article_id} 生成完成（{elapsed}s, model={use_model}）")
 
 
-def _generate_article_background(
+async def _generate_article_background(
     article_id: int,
     product_ids: List[int],
     article_type: str,
@@ -94,26 +212,36 @@ def _generate_article_background(
     image_sources: List[str],
     disable_system_instructions: bool = False,
     keyword_strategy: Optional[dict] = None,
+    stream: bool = False,
+    use_cache: bool = True,
 ):
-    """背景執行緒：實際執行 LLM 文章生成"""
+    """背景協程：實際執行 LLM 文章生成（階段轉換回報至 generation_jobs，耗時 / token 寫入 generation_telemetry）
+
+    DB 讀寫與 SEO 分析這類阻塞步驟一律丟到執行緒執行，不佔用 event loop（session 同一時間只在一個執行緒使用）
+    """
     import time as _time
+    from app.services.generation_telemetry import generation_telemetry
     from app.services.llm_service import llm_service
     from app.services.seo_service import seo_service
-    from app.models.product import Product
 
     use_model = model or "gemini-2.5-flash"
     start_time = _time.time()
+    trace = generation_telemetry.start(article_id, user_id, model or settings.LLM_MODEL)
+
+    def progress(stage: str, **data):
+        if stage in ("llm", "failover"):
+            generation_telemetry.note_llm_event(**data)
+        generation_jobs.report(article_id, stage, **data)
 
+    products_map = {}
     with get_db_session() as db:
         try:
             # 查詢後按 product_ids 順序重排（SQL IN 不保序）
-            products_map = {p.id: p for p in db.query(Product).filter(
-                Product.id.in_(product_ids),
-                Product.user_id == user_id,
-            ).all()}
+            products_map = await asyncio.to_thread(_load_owned_products, db, product_ids, user_id)
             products = [products_map[pid] for pid in product_ids if pid in products_map]
+            trace.stage("db_load", trace.started, products=len(products))
 
-            result = llm_service.generate_article(
+            result = await llm_service.agenerate_article(
                 products=products,
                 db=db,
                 article_type=article_type,
@@ -125,135 +253,431 @@ def _generate_article_background(
                 image_sources=image_sources,
                 disable_system_instructions=disable_system_instructions,
                 keyword_strategy=keyword_strategy,
+                progress=progress,
+                on_delta=_make_delta_handler(article_id) if stream else None,
+                executor=generation_jobs.executor,
+                use_cache=use_cache,
+                # 依供應商限制並行數（批量生成時避免同時打爆 Gemini / Claude 配額），只在 LLM 呼叫期間佔用
+                llm_slot=generation_jobs.provider_slot(model or settings.LLM_MODEL),
             )
 
             # 自動 SEO 分析
-            seo_result = seo_service.analyze(
+            progress("seo")
+            seo_started = _time.perf_counter()
+            seo_result = await asyncio.to_thread(
+                seo_service.analyze,
                 title=result["title"],
                 content=result["content"],
                 image_count=len(result.get("image_map", {})),
             )
+            trace.stage("seo", seo_started)
 
             # 更新 placeholder 文章
-            article = db.query(Article).filter(Article.id == article_id).first()
-            if article:
-                article.title = result["title"]
-                article.content = result["content"]
-                article.content_markdown = result.get("content_markdown")
-                article.content_with_images = result["content_with_images"]
-                article.image_map = result.get("image_map")
-                article.seo_score = seo_result["score"]
-                article.seo_suggestions = seo_result
-                article.status = "draft"
-                db.commit()
-                elapsed = round(_time.time() - start_time, 1)
-                logger.info(f"文章 {article_id} 生成完成（{elapsed}s, model={use_model}）")
+            await asyncio.to_thread(_save_generated_article, db, article_id, result, seo_result, trace, use_model, start_time)
+            progress("saved")
+            await asyncio.to_thread(generation_telemetry.save, db, trace, "success")
         except Exception as e:
             elapsed = round(_time.time() - start_time, 1)
             logger.error(f"文章 {article_id} 生成失敗（{elapsed}s）: {e}")
 
-            # 組裝詳細錯誤報告
-            product_names = []
-            try:
-                for pid in product_ids:
-                    p = products_map.get(pid)
-                    product_names.append(f"  - [{pid}] {p.name[:40] if p else '(查無商品)'}")
-            except Exception:
-                product_names = [f"  - IDs: {product_ids}"]
-
-            retry_info = ""
-            if hasattr(e, "__cause__") and hasattr(e.__cause__, "retry_history"):
-                retry_info = "\n".join(f"  {r}" for r in e.__cause__.retry_history)
-            elif hasattr(e, "retry_history"):
-                retry_info = "\n".join(f"  {r}" for r in e.retry_history)
-
-            # 完整 traceback
-            tb = traceback.format_exc()
-
-            error_report = (
-                f"[錯誤報告]\n"
-                f"錯誤類型: {type(e).__name__}\n"
-                f"錯誤訊息: {str(e)}\n"
-                f"\n"
-                f"[請求參數]\n"
-                f"模型: {use_model}\n"
-                f"文章類型: {article_type}\n"
-                f"目標看板: {target_forum}\n"
-                f"附圖模式: {'是' if include_images else '否'}\n"
-                f"圖片來源: {image_sources}\n"
-                f"範本 ID: {prompt_template_id or '預設'}\n"
-                f"耗時: {elapsed}s\n"
-                f"\n"
-                f"[商品列表] ({len(product_ids)} 件)\n"
-                f"{chr(10).join(product_names)}\n"
+            error_report = build_error_report(
+                e, traceback.format_exc(), elapsed,
+                model=use_model,
+                article_type=article_type,
+                target_forum=target_forum,
+                include_images=include_images,
+                image_sources=image_sources,
+                prompt_template_id=prompt_template_id,
+                product_ids=product_ids,
+                products_map=products_map,
             )
-            if retry_info:
-                error_report += f"\n[重試紀錄]\n{retry_info}\n"
-            error_report += f"\n[完整 Traceback]\n{tb}"
-
-            article = db.query(Article).filter(Article.id == article_id).first()
-            if article:
-                article.status = "failed"
-                article.title = f"生成失敗：{str(e)[:100]}"
-                article.content = error_report
-                db.commit()
+            await asyncio.to_thread(mark_article_failed, db, article_id, e, error_report)
+            progress("failed", error=str(e)[:200])
+            await asyncio.to_thread(generation_telemetry.save, db, trace, "failed", e)
 
 
-@router.post("/generate", response_model=ArticleResponse)
-async def generate_article(
-    request: ArticleGenerateRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_approved_user),
-):
-    """生成文章（需已核准用戶）— 同步等待 LLM 生成完成後回傳"""
+def _verify_product_ownership(db: Session, product_ids: List[int], user_id: int):
+    """驗證 product_ids 全部屬於當前用戶"""
     from app.models.product import Product
 
-    # 驗證 product_ids 屬於當前用戶（查詢後按前端順序重排）
-    products_map = {p.id: p for p in db.query(Product).filter(
-        Product.id.in_(request.product_ids),
-        Product.user_id == current_user.id,
+    owned = {pid for (pid,) in db.query(Product.id).filter(
+        Product.id.in_(product_ids),
+        Product.user_id == user_id,
     ).all()}
-    if not products_map:
+    if not owned:
         raise HTTPException(status_code=404, detail="找不到指定的商品")
-    if len(products_map) != len(request.product_ids):
+    if len(owned) != len(set(product_ids)):
         raise HTTPException(status_code=403, detail="部分商品不屬於你")
-    products = [products_map[pid] for pid in request.product_ids if pid in products_map]
 
-    # 建立 placeholder 文章
-    article = Article(
+
+def _new_placeholder(request, product_ids: List[int], user_id: int) -> Article:
+    """建立生成中的 placeholder 文章（尚未 commit）"""
+    return Article(
         title="文章生成中...",
         content=None,
         content_with_images=None,
         article_type=request.article_type,
         target_forum=request.target_forum,
-        product_ids=request.product_ids,
+        product_ids=product_ids,
         sub_id=request.sub_id.strip() if request.sub_id and request.sub_id.strip() else None,
         status="generating",
-        user_id=current_user.id,
+        user_id=user_id,
+    )
+
+
+def _mark_remote_failed(article_id: int, product_ids: List[int], params: dict, e: Exception, tb: str, elapsed: float):
+    """GENERATION_BACKEND=celery 的 web 端失敗（排入失敗 / 逾時）：仍在生成中的文章改為錯誤報告"""
+    with get_db_session() as db:
+        status = db.query(Article.status).filter(Article.id == article_id).scalar()
+        if status != "generating":
+            return
+        error_report = build_error_report(
+            e, tb, elapsed,
+            model=params["model"] or settings.LLM_MODEL,
+            article_type=params["article_type"],
+            target_forum=params["target_forum"],
+            include_images=params["include_images"],
+            image_sources=params["image_sources"],
+            prompt_template_id=params["prompt_template_id"],
+            product_ids=product_ids,
+            products_map={},
+        )
+        mark_article_failed(db, article_id, e, error_report)
+
+
+async def _follow_remote_generation(article_id: int, product_ids: List[int], user_id: int, params: dict):
+    """GENERATION_BACKEND=celery：排入 Celery chain，輪詢各步驟狀態並轉成 generation_jobs 階段事件
+
+    文章寫入 / 失敗標記由 worker 完成，這裡只負責進度回報（worker 端沒有串流 delta 事件）。
+    超過 CELERY_GENERATION_DEADLINE_SECONDS 仍未完成時撤銷尚未執行的步驟並將文章標記為 failed
+    （執行中的步驟結束後發現文章已不在生成中，不再呼叫 LLM / 寫入）
+    """
+    import time as _time
+    from celery.result import AsyncResult
+    from app.celery_app import celery_app
+    from app.tasks.article_tasks import enqueue_generation
+
+    start_time = _time.time()
+    try:
+        steps = await asyncio.to_thread(enqueue_generation, article_id, user_id, product_ids, params)
+    except Exception as e:
+        logger.error(f"文章 {article_id} 排入 Celery 失敗: {e}")
+        await asyncio.to_thread(_mark_remote_failed, article_id, product_ids, params, e, traceback.format_exc(), 0)
+        generation_jobs.report(article_id, "failed", error=str(e)[:200])
+        return
+
+    deadline = start_time + settings.CELERY_GENERATION_DEADLINE_SECONDS
+    for i, (stage, task_id) in enumerate(steps):
+        if stage != "saved":
+            generation_jobs.report(article_id, stage, remote=True)
+        result = AsyncResult(task_id, app=celery_app)
+        while True:
+            state = await asyncio.to_thread(lambda: result.state)
+            if state == "SUCCESS":
+                break
+            if state in ("FAILURE", "REVOKED"):
+                error = await asyncio.to_thread(lambda: str(result.result))
+                generation_jobs.report(article_id, "failed", error=error[:200])
+                return
+            if _time.time() >= deadline:
+                e = TimeoutError(f"Worker 生成逾時（超過 {settings.CELERY_GENERATION_DEADLINE_SECONDS}s 未完成，停在 {stage} 階段）")
+                logger.error(f"文章 {article_id} {e}")
+                pending = [tid for _, tid in steps[i:]]
+                await asyncio.to_thread(celery_app.control.revoke, pending)
+                await asyncio.to_thread(
+                    _mark_remote_failed, article_id, product_ids, params, e, "", round(_time.time() - start_time, 1),
+                )
+                generation_jobs.report(article_id, "failed", error=str(e)[:200])
+                return
+            await asyncio.sleep(settings.CELERY_GENERATION_POLL_INTERVAL)
+
+    outcome = await asyncio.to_thread(lambda: result.result)
+    if isinstance(outcome, dict) and outcome.get("skipped"):
+        # 文章在生成期間被刪除 / 標記失敗，worker 沒有寫入結果
+        generation_jobs.report(article_id, "failed", error="文章已不在生成中（已刪除或已標記失敗），生成結果未寫入")
+        return
+    generation_jobs.report(article_id, "saved")
+
+
+def _submit_generation(article_id: int, product_ids: List[int], request, user_id: int):
+    """將 placeholder 文章的生成工作排進任務管理器（GENERATION_BACKEND=celery 時交給 worker 執行）"""
+    if settings.GENERATION_BACKEND == "celery":
+        params = {
+            "article_type": request.article_type,
+            "target_forum": request.target_forum,
+            "prompt_template_id": request.prompt_template_id,
+            "model": request.model,
+            "include_images": request.include_images,
+            "image_sources": request.image_sources,
+            "disable_system_instructions": request.disable_system_instructions,
+            "keyword_strategy": request.keyword_strategy,
+            "use_cache": request.use_cache,
+        }
+        # 生成在 worker 執行（並行數由 worker 決定），web 端只追蹤進度，不佔任務名額
+        return generation_jobs.submit(
+            article_id, user_id, _follow_remote_generation(article_id, product_ids, user_id, params), bounded=False,
+        )
+    return generation_jobs.submit(
+        article_id,
+        user_id,
+        _generate_article_background(
+            article_id,
+            product_ids,
+            request.article_type,
+            request.target_forum,
+            request.prompt_template_id,
+            request.model,
+            user_id,
+            request.include_images,
+            request.image_sources,
+            request.disable_system_instructions,
+            request.keyword_strategy,
+            request.stream,
+            request.use_cache,
+        ),
     )
+
+
+async def _replay_idempotent(
+    db: Session,
+    article: Article,
+    request: ArticleGenerateRequest,
+    response: Response,
+    wait: bool,
+) -> ArticleResponse:
+    """相同 Idempotency-Key 的重複請求：回傳既有文章（仍在生成中時依 wait 等待或回傳 202）"""
+    if list(article.product_ids or []) != list(request.product_ids):
+        raise HTTPException(status_code=409, detail="Idempotency-Key 已用於不同商品的生成請求")
+
+    response.headers["Idempotent-Replayed"] = "true"
+    job = generation_jobs.get(article.id)
+    if article.status == "generating" and job:
+        if not wait:
+            response.status_code = 202
+        else:
+            await generation_jobs.wait(job)
+            db.refresh(article)
+    return ArticleResponse.model_validate(article).model_copy(update={"job_id": job.job_id if job else None})
+
+
+def _find_idempotent(db: Session, user_id: int, key: str) -> Optional[Article]:
+    return db.query(Article).filter(
+        Article.user_id == user_id,
+        Article.idempotency_key == key,
+    ).first()
+
+
+@router.post("/generate", response_model=ArticleResponse)
+async def generate_article(
+    request: ArticleGenerateRequest,
+    response: Response,
+    wait: bool = Query(True, description="true：等待生成完成後回傳；false：立即回傳 202 + job_id，透過 /events 或 /status 追蹤"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_approved_user),
+):
+    """生成文章（需已核准用戶）
+
+    生成任務一律交由 generation_jobs 在背景協程執行：
+    - wait=true（預設）：等待完成後回傳文章
+    - wait=false：立即回傳 placeholder（status=generating）與 job_id
+
+    帶 Idempotency-Key header 時，同一用戶以相同 key 重複送出（連點、逾時重送）
+    不會再生成新文章，而是回傳第一次建立的文章（回應帶 Idempotent-Replayed: true）
+    """
+    key = idempotency_key.strip() if idempotency_key and idempotency_key.strip() else None
+    if key:
+        existing = _find_idempotent(db, current_user.id, key)
+        if existing:
+            return await _replay_idempotent(db, existing, request, response, wait)
+
+    _verify_product_ownership(db, request.product_ids, current_user.id)
+
+    # 建立 placeholder 文章
+    article = _new_placeholder(request, request.product_ids, current_user.id)
+    article.idempotency_key = key
     db.add(article)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 相同 key 的並行請求已先建立文章
+        db.rollback()
+        existing = _find_idempotent(db, current_user.id, key) if key else None
+        if existing is None:
+            raise
+        return await _replay_idempotent(db, existing, request, response, wait)
     db.refresh(article)
 
-    # 同步等待 LLM 生成（在執行緒池中執行，避免阻塞 event loop）
-    await asyncio.to_thread(
-        _generate_article_background,
-        article.id,
-        request.product_ids,
-        request.article_type,
-        request.target_forum,
-        request.prompt_template_id,
-        request.model,
-        current_user.id,
-        request.include_images,
-        request.image_sources,
-        request.disable_system_instructions,
-        request.keyword_strategy,
-    )
+    job = _submit_generation(article.id, request.product_ids, request, current_user.id)
+
+    if not wait:
+        response.status_code = 202
+        return ArticleResponse.model_validate(article).model_copy(update={"job_id": job.job_id})
+
+    # 等待背景協程完成
+    await generation_jobs.wait(job)
 
     # 重新載入文章（_generate_article_background 使用獨立 session 更新）
     db.refresh(article)
-    return article
+    return ArticleResponse.model_validate(article).model_copy(update={"job_id": job.job_id})
+
+
+@router.post("/generate-batch", status_code=202)
+async def generate_articles_batch(
+    request: ArticleBatchGenerateRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_approved_user),
+):
+    """批量生成文章（需已核准用戶）
+
+    每組 product_ids 生成一篇，共用範本/模型/關鍵字策略。placeholder 於同一交易建立，
+    生成工作依供應商並行上限（GENERATION_GEMINI_CONCURRENCY / GENERATION_ANTHROPIC_CONCURRENCY）分散執行。
+    以 GET /api/articles/batches/{batch_id} 追蹤進度。
+    """
+    groups = [g for g in request.product_groups if g]
+    if not groups:
+        raise HTTPException(status_code=400, detail="product_groups 不可為空")
+    if len(groups) > settings.GENERATION_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"單次最多批量生成 {settings.GENERATION_BATCH_MAX_ITEMS} 篇")
+
+    all_ids = sorted({pid for g in groups for pid in g})
+    _verify_product_ownership(db, all_ids, current_user.id)
+
+    # 同一交易建立所有 placeholder（flush 取得 ID 後一次 commit）
+    articles = [_new_placeholder(request, group, current_user.id) for group in groups]
+    db.add_all(articles)
+    db.flush()
+    article_ids = [a.id for a in articles]
+    db.commit()
+
+    batch = generation_jobs.create_batch(current_user.id, article_ids)
+    items = []
+    for article_id, group in zip(article_ids, groups):
+        job = _submit_generation(article_id, group, request, current_user.id)
+        items.append({"article_id": article_id, "job_id": job.job_id, "product_ids": group})
+    logger.info(f"批量生成 {batch.batch_id}: {len(items)} 篇已排入（user_id={current_user.id}）")
+
+    return {
+        "batch_id": batch.batch_id,
+        "total": len(items),
+        "items": items,
+    }
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch_status(
+    batch_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """查詢批量生成進度：逐篇狀態 + 整體吞吐量"""
+    import time as _time
+
+    batch = generation_jobs.get_batch(batch_id)
+    if not batch or batch.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="批次不存在或已過期")
+
+    rows = db.query(Article.id, Article.status, Article.title).filter(
+        Article.id.in_(batch.article_ids),
+        Article.user_id == current_user.id,
+    ).all()
+    rows_map = {r.id: r for r in rows}
+
+    items = []
+    counts = {"generating": 0, "done": 0, "failed": 0}
+    last_finished = None
+    for aid in batch.article_ids:
+        row = rows_map.get(aid)
+        job = generation_jobs.get(aid)
+        status = row.status if row else "deleted"
+        if status == "generating":
+            counts["generating"] += 1
+        elif status == "failed":
+            counts["failed"] += 1
+        else:
+            counts["done"] += 1
+        if job and job.finished_at:
+            last_finished = max(last_finished or 0, job.finished_at)
+        items.append({
+            "article_id": aid,
+            "status": status,
+            "stage": job.stage if job else None,
+            "elapsed": job.to_dict()["elapsed"] if job else None,
+            "title": row.title if row and status != "generating" else None,
+        })
+
+    finished = counts["done"] + counts["failed"]
+    end = last_finished if counts["generating"] == 0 and last_finished else _time.time()
+    elapsed = max(end - batch.created_at, 0.001)
+    return {
+        "batch_id": batch_id,
+        "total": len(batch.article_ids),
+        "completed": counts["done"],
+        "failed": counts["failed"],
+        "pending": counts["generating"],
+        "done": counts["generating"] == 0,
+        "elapsed": round(elapsed, 1),
+        "throughput_per_min": round(finished / elapsed * 60, 2),
+        "items": items,
+    }
+
+
+@router.get("/{article_id}/status")
+async def get_generation_status(
+    article_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """查詢文章生成狀態（輕量輪詢，不載入文章內容）"""
+    row = db.query(Article.status).filter(Article.id == article_id, Article.user_id == current_user.id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="文章不存在")
+
+    job = generation_jobs.get(article_id)
+    return {
+        "article_id": article_id,
+        "status": row.status,
+        "job": job.to_dict() if job else None,
+    }
+
+
+@router.get("/{article_id}/events")
+async def stream_generation_events(
+    article_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """SSE 串流文章生成事件
+
+    - stage：階段轉換（images → ocr → llm → seo → saved / failed）
+    - delta：串流模式（stream=true）的 LLM 文字片段，依序串接即為目前內容
+    - reset：LLM 串流中斷重試，前端應清空已收到的片段
+    """
+    row = db.query(Article.status).filter(Article.id == article_id, Article.user_id == current_user.id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="文章不存在")
+    db_status = row.status
+
+    def _sse(event: dict) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    async def event_source():
+        if generation_jobs.get(article_id) is None:
+            # 任務不在本程序記憶體（已過期或由其他實例執行）：以 DB 狀態回報一次
+            stage = "failed" if db_status == "failed" else ("saved" if db_status != "generating" else db_status)
+            yield _sse({"type": "stage", "stage": stage, "article_id": article_id, "job_id": None})
+            return
+        async for event in generation_jobs.stream(article_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(event)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("", response_model=List[ArticleResponse])
@@ -305,14 +729,8 @@ async def update_article(
         setattr(article, key, value)
 
     # content 更新時同步重新生成 content_with_images
-    if "content" in update_data and article.image_map:
-        content_with_images = article.content
-        for marker, img_url in article.image_map.items():
-            content_with_images = content_with_images.replace(
-                f"{{{{{marker}}}}}",
-                f"\n\n![商品圖片]({img_url})\n\n"
-            )
-        article.content_with_images = content_with_images
+    if "content" in update_data:
+        article.content_with_images = render_markers(article.content or "", article.image_map)
 
     db.commit()
     db.refresh(article)
@@ -371,61 +789,20 @@ async def optimize_seo(
         raise HTTPException(status_code=404, detail="文章不存在")
 
     from app.services.seo_service import seo_service
-    import re
-
-    # 從 content_with_images 中找出圖片的相對位置（段落比例）
-    # content 本身沒有圖片標記（生成時已清除），圖片只在 content_with_images 中
-    image_positions = []  # list of (marker_key, proportional_position)
-    if article.image_map:
-        cwi = article.content_with_images or ""
-        cwi_paragraphs = [p for p in re.split(r'\n{2,}', cwi) if p.strip()]
-        total_cwi = len(cwi_paragraphs) or 1
-        # 建立 URL → marker 反查
-        url_to_marker = {url: marker for marker, url in article.image_map.items()}
-        for idx, para in enumerate(cwi_paragraphs):
-            for match in re.finditer(r'!\[.*?\]\((.*?)\)', para):
-                url = match.group(1)
-                marker = url_to_marker.get(url)
-                if marker:
-                    image_positions.append((marker, idx / total_cwi))
-
-    result = seo_service.optimize_with_llm(article, model=model, user_id=current_user.id, disable_seo_prompt=disable_seo_prompt)
+
+    # content 本身沒有圖片標記（生成時已清除），圖片位置（段落比例）只能從 content_with_images 取得
+    anchors = image_anchors(article.content_with_images or "", article.image_map)
+
+    result = await seo_service.aoptimize_with_llm(article, model=model, user_id=current_user.id, disable_seo_prompt=disable_seo_prompt)
     optimized_title = result.get("optimized_title", article.title)
-    optimized_content = result.get("optimized_content", article.content)
-
-    # 清除 LLM 自創的任何 {{IMAGE:...}} 假標記
-    optimized_content = re.sub(r'\{\{IMAGE:[^}]*\}\}', '', optimized_content)
-
-    # 按原始比例位置插入圖片標記
-    if image_positions:
-        opt_paragraphs = [p for p in re.split(r'\n{2,}', optimized_content) if p.strip()]
-        total_opt = len(opt_paragraphs) or 1
-        inserts = {}
-        for marker, proportion in image_positions:
-            opt_idx = min(int(proportion * total_opt), total_opt - 1)
-            inserts.setdefault(opt_idx, []).append(f"{{{{{marker}}}}}")
-        new_paragraphs = []
-        for i, para in enumerate(opt_paragraphs):
-            new_paragraphs.append(para)
-            if i in inserts:
-                for mt in inserts[i]:
-                    new_paragraphs.append(mt)
-        optimized_content = '\n\n'.join(new_paragraphs)
+    # 清除 LLM 自創的 {{IMAGE:...}} 假標記，按原始比例位置插回圖片標記
+    optimized_content = place_markers(result.get("optimized_content", article.content), anchors)
 
     article.title = optimized_title
     article.content = optimized_content
 
     # 同步更新 content_with_images：替換圖片標記為實際圖片
-    content_with_images = optimized_content
-    if article.image_map:
-        for marker, img_url in article.image_map.items():
-            content_with_images = content_with_images.replace(
-                f"{{{{{marker}}}}}",
-                f"\n\n![商品圖片]({img_url})\n\n"
-            )
-    # 兜底清除殘留標記
-    content_with_images = re.sub(r'\{\{IMAGE:[^}]*\}\}', '', content_with_images)
-    article.content_with_images = content_with_images
+    article.content_with_images = render_markers(optimized_content, article.image_map)
 
     article.seo_score = result.get("score")
     # 儲存完整分析結果（含 breakdown）
@@ -456,52 +833,20 @@ async def copy_article(
     if not article:
         raise HTTPException(status_code=404, detail="文章不存在")
 
-    import re
-
-    # 建立 URL → marker 反查表
-    url_to_marker = {}
-    if article.image_map:
-        url_to_marker = {url: marker for marker, url in article.image_map.items()}
-
     # content_with_images 含有 ![商品圖片](url)，是圖片資訊的唯一來源
-    cwi = article.content_with_images or article.content or ""
-    plain_content = article.content or ""
-    paste_content = cwi  # 從含圖片的版本開始建構
-    content = cwi  # 用於顯示
-
-    image_positions = []
-    img_index = 0
-
-    # 把 markdown 圖片替換為各用途的格式
-    if url_to_marker:
-        for match in re.finditer(r'!\[.*?\]\((.*?)\)', cwi):
-            url = match.group(1)
-            marker = url_to_marker.get(url)
-            if marker:
-                img_index += 1
-                image_positions.append({"marker": marker, "url": url, "index": img_index})
-
-        # content: 顯示用，替換為位置提示
-        for img in image_positions:
-            placeholder = f"\n\n📷 [在此插入圖片: {img['marker']}]\n\n"
-            content = content.replace(f"![商品圖片]({img['url']})", placeholder, 1)
-        # paste_content: 自動貼上用，替換為 📷圖N 標記
-        for img in image_positions:
-            paste_content = paste_content.replace(f"![商品圖片]({img['url']})", f"\n\n📷圖{img['index']}\n\n", 1)
-
-    # 清除殘留的 markdown 圖片語法和多餘空行
-    plain_content = re.sub(r'!\[.*?\]\(.*?\)', '', plain_content)
-    plain_content = re.sub(r'\n{3,}', '\n\n', plain_content).strip()
-    paste_content = re.sub(r'!\[.*?\]\(.*?\)', '', paste_content)
-    paste_content = re.sub(r'\n{3,}', '\n\n', paste_content).strip()
+    formats = render_copy_formats(
+        article.content_with_images or article.content or "",
+        article.content or "",
+        article.image_map,
+    )
 
     return {
         "title": article.title,
-        "content": content,
-        "plain_content": plain_content,
-        "paste_content": paste_content,
+        "content": formats["content"],
+        "plain_content": formats["plain_content"],
+        "paste_content": formats["paste_content"],
         "forum": article.target_forum,
-        "image_positions": image_positions,
+        "image_positions": formats["image_positions"],
     }
 
 
@@ -516,149 +861,21 @@ async def copy_article_vocus(
     if not article:
         raise HTTPException(status_code=404, detail="文章不存在")
 
-    import re
-
     # 優先使用 content_markdown（保留 H2/H3 標題結構 → 方格子目錄 SEO）
     # fallback 到 content（已去除 Markdown 的純文字版本）
     markdown_content = article.content_markdown or article.content or ""
-
-    image_positions = []
-    paste_content = markdown_content
-    img_index = 0
-
-    # ── 圖片提取 ──
-    # 檢查 content_markdown 是否已有內嵌圖片（新版文章）
-    has_inline_images = bool(re.search(r'!\[.*?\]\(https?://.*?\)', markdown_content))
-
-    if has_inline_images:
-        # 新版：content_markdown 已有 ![商品圖片](url) 在正確位置
-        def replace_with_marker(match):
-            nonlocal img_index
-            img_index += 1
-            image_positions.append({"url": match.group(1), "index": img_index})
-            return f"\n📷圖{img_index}\n"
-
-        paste_content = re.sub(
-            r'\n*!\[.*?\]\((https?://.*?)\)\n*',
-            replace_with_marker,
-            markdown_content
-        )
-    else:
-        # 嘗試從 content_with_images 提取（圖片在正確位置）
-        cwi = article.content_with_images or ""
-        has_cwi_images = bool(re.search(r'!\[.*?\]\(https?://.*?\)', cwi))
-
-        if has_cwi_images:
-            def replace_cwi_marker(match):
-                nonlocal img_index
-                img_index += 1
-                image_positions.append({"url": match.group(1), "index": img_index})
-                return f"\n📷圖{img_index}\n"
-
-            paste_content = re.sub(
-                r'\n*!\[.*?\]\((https?://.*?)\)\n*',
-                replace_cwi_marker,
-                cwi
-            )
-        elif article.image_map:
-            # 從 image_map 提取圖片 URL，均勻分佈在文中（不再附在文末）
-            for marker, url in article.image_map.items():
-                img_index += 1
-                image_positions.append({"url": url, "index": img_index})
-
-            if image_positions:
-                paste_content = _distribute_images_evenly(paste_content, image_positions)
-
-    # ── 舊文章 heading 重建（content_markdown 無 ## 時）──
-    has_md_headings = bool(re.search(r'^#{1,3}\s+', markdown_content, re.MULTILINE))
-    if not has_md_headings:
-        paste_content = _reconstruct_headings(paste_content)
+    formats = render_vocus_formats(markdown_content, article.content_with_images or "", article.image_map)
 
     return {
         "title": article.title,
         "content": article.content or "",
         "content_markdown": markdown_content,
         "plain_content": markdown_content,
-        "paste_content": paste_content,
-        "image_positions": image_positions,
+        "paste_content": formats["paste_content"],
+        "image_positions": formats["image_positions"],
     }
 
 
-def _distribute_images_evenly(text: str, image_positions: list) -> str:
-    """將圖片標記均勻分佈在文章段落之間（用於無法精確定位圖片的舊文章）"""
-    import re
-    paragraphs = [p for p in re.split(r'\n{2,}', text) if p.strip()]
-    n_images = len(image_positions)
-    n_paras = len(paragraphs)
-
-    if n_images == 0 or n_paras <= 1:
-        # fallback: 附在文末
-        for img in image_positions:
-            text += f"\n\n📷圖{img['index']}"
-        return text
-
-    # 計算插入間隔（均勻分佈）
-    interval = max(1, n_paras // (n_images + 1))
-    result = []
-    img_idx = 0
-
-    for i, para in enumerate(paragraphs):
-        result.append(para)
-        if img_idx < n_images and (i + 1) % interval == 0 and i < n_paras - 1:
-            result.append(f"📷圖{image_positions[img_idx]['index']}")
-            img_idx += 1
-
-    # 剩餘未插入的圖片附在最後
-    while img_idx < n_images:
-        result.append(f"📷圖{image_positions[img_idx]['index']}")
-        img_idx += 1
-
-    return "\n\n".join(result)
-
-
-def _reconstruct_headings(text: str) -> str:
-    """為舊文章（無 ## heading）重建 Markdown 標題結構
-    規則：=== 分隔線後的短行 → ## H2，emoji 開頭的短獨立行 → ### H3"""
-    import re
-    # 常見 heading emoji
-    heading_emojis = r'[\U0001F300-\U0001F9FF\u2600-\u26FF\u2700-\u27BF]'
-
-    lines = text.split('\n')
-    result = []
-    prev_was_separator = False
-    prev_was_empty = False
-
-    for line in lines:
-        stripped = line.strip()
-
-        # 偵測分隔線
-        if re.match(r'^(-{3,}|={3,})$', stripped):
-            prev_was_separator = True
-            result.append(stripped)
-            continue
-
-        # 分隔線後的非空短行 → H2
-        if prev_was_separator and stripped and len(stripped) < 80:
-            result.append(f'## {stripped}')
-            prev_was_separator = False
-            prev_was_empty = False
-            continue
-
-        # emoji 開頭 + 短行 + 前後有空行 → H3（子標題）
-        if (prev_was_empty and stripped and len(stripped) < 60
-                and re.match(heading_emojis, stripped)):
-            result.append(f'### {stripped}')
-            prev_was_separator = False
-            prev_was_empty = False
-            continue
-
-        prev_was_separator = False
-        prev_was_empty = (stripped == '')
-        result.append(line)
-
-    return '\n'.join(result)
-
-
 @router.get("/{article_id}/images")
 async def get_article_images(
     article_id: int,
@@ -1,7 +1,6 @@
 """
 關鍵字研究 API 路由
 """
-import asyncio
 import logging
 from typing import List
 
@@ -50,11 +49,7 @@ async def research_keywords(
         raise HTTPException(status_code=400, detail="所有商品尚未擷取，無法研究關鍵字")
 
     try:
-        strategy = await asyncio.to_thread(
-            keyword_research_service.research_keywords,
-            valid_products,
-            current_user.id,
-        )
+        strategy = await keyword_research_service.aresearch_keywords(valid_products, current_user.id)
         return strategy
     except Exception as e:
         logger.error(f"關鍵字研究失敗: {e}")
@@ -70,10 +65,7 @@ async def autocomplete_preview(
     from app.services.keyword_research_service import keyword_research_service
 
     try:
-        suggestions = await asyncio.to_thread(
-            keyword_research_service.autocomplete_preview,
-            seed,
-        )
+        suggestions = await keyword_research_service.aautocomplete_preview(seed)
         return {"seed": seed, "suggestions": suggestions}
     except Exception as e:
         logger.error(f"Autocomplete 預覽失敗: {e}")
@@ -1,16 +1,18 @@
 """
 SEO 分析 API 路由
 """
-from typing import Optional
+import asyncio
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.models.article import Article
 from app.models.user import User
 from app.auth import get_current_user
+from app.config import settings
 
 router = APIRouter()
 
@@ -18,7 +20,42 @@ router = APIRouter()
 class SeoAnalyzeRequest(BaseModel):
     title: str
     content: str
-    keywords: Optional[list] = None
+    keywords: Optional[List[str]] = None
+    histogram_bins: int = Field(10, ge=1, le=100)  # diagnostics.keyword_histogram 的區間數
+
+    @field_validator("keywords")
+    @classmethod
+    def drop_blank_keywords(cls, keywords: Optional[List[str]]) -> Optional[List[str]]:
+        """捨棄空白關鍵字（空字串在任何內容中都算出現，會灌高密度 / 分佈分數）
+
+        全部為空白時等同未指定，改從標題提取關鍵字（見 seo_service.resolve_keywords）
+        """
+        if keywords is None:
+            return None
+        return [kw for kw in keywords if kw.strip()]
+
+
+class SeoBatchAnalyzeRequest(BaseModel):
+    article_ids: List[int] = Field(..., min_length=1, max_length=settings.SEO_BATCH_MAX_ARTICLES)
+    persist: bool = True  # 寫回 seo_score / seo_suggestions
+    include_details: bool = False  # 回傳每篇的完整分析結果（否則只有分數與等級）
+
+
+class SeoLiveStartRequest(SeoAnalyzeRequest):
+    image_count: Optional[int] = Field(None, ge=0)  # 未提供時以內容中的圖片標記計數
+
+
+class SeoParagraphOp(BaseModel):
+    start: int = Field(..., ge=0)  # 段落索引（以空行分隔）
+    delete: int = Field(0, ge=0)  # 自 start 起刪除的段落數
+    insert: List[str] = []  # 在 start 插入的段落（含空行時自動拆段）
+
+
+class SeoLivePatchRequest(BaseModel):
+    version: int  # 工作階段目前版本（上一次回應的 version）
+    ops: List[SeoParagraphOp] = []
+    title: Optional[str] = None
+    image_count: Optional[int] = Field(None, ge=0)
 
 
 @router.post("/analyze")
@@ -29,14 +66,34 @@ async def analyze_seo(
     """分析文章 SEO 分數"""
     from app.services.seo_service import seo_service
 
-    result = seo_service.analyze(
+    # 評分是 CPU 密集運算，移出 event loop
+    result = await asyncio.to_thread(
+        seo_service.analyze,
         title=request.title,
         content=request.content,
         keywords=request.keywords,
+        histogram_bins=request.histogram_bins,
     )
     return result
 
 
+@router.post("/analyze-batch")
+async def analyze_seo_batch(
+    request: SeoBatchAnalyzeRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """批量分析自己文章的 SEO（程序池平行評分），預設寫入 DB；生成中 / 生成失敗的文章略過"""
+    from app.services.seo_batch import seo_batch
+
+    return await asyncio.to_thread(
+        seo_batch.analyze_articles,
+        current_user.id,
+        request.article_ids,
+        persist=request.persist,
+        include_details=request.include_details,
+    )
+
+
 @router.post("/analyze/{article_id}")
 async def analyze_seo_by_id(
     article_id: int,
@@ -50,7 +107,8 @@ async def analyze_seo_by_id(
 
     from app.services.seo_service import seo_service
 
-    result = seo_service.analyze(
+    result = await asyncio.to_thread(
+        seo_service.analyze,
         title=article.title,
         content=article.content or "",
         image_count=len(article.image_map) if article.image_map else 0,
@@ -62,3 +120,64 @@ async def analyze_seo_by_id(
     db.refresh(article)
 
     return result
+
+
+@router.post("/live")
+async def start_seo_live(
+    request: SeoLiveStartRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """開始即時 SEO 分析（編輯中）：送出全文，回傳 session_id / version 與分析結果，之後以 PATCH 送段落修改"""
+    from app.services.seo_incremental import seo_incremental
+
+    return await asyncio.to_thread(
+        seo_incremental.start,
+        current_user.id,
+        request.title,
+        request.content,
+        keywords=request.keywords,
+        image_count=request.image_count,
+        histogram_bins=request.histogram_bins,
+    )
+
+
+@router.patch("/live/{session_id}")
+async def patch_seo_live(
+    session_id: str,
+    request: SeoLivePatchRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """套用段落修改並回傳最新分析（只重新掃描改動的段落，次毫秒級，直接在 event loop 上執行）
+
+    404：工作階段不存在或已過期；409：版本不符。兩者前端都應重新 POST /live
+    """
+    from app.services.seo_incremental import StaleSessionVersion, seo_incremental
+
+    session = seo_incremental.get(current_user.id, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="SEO 分析工作階段不存在或已過期")
+    try:
+        return seo_incremental.patch(
+            session,
+            request.version,
+            [op.model_dump() for op in request.ops],
+            title=request.title,
+            image_count=request.image_count,
+        )
+    except StaleSessionVersion as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/live/{session_id}")
+async def close_seo_live(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """結束即時 SEO 分析工作階段"""
+    from app.services.seo_incremental import seo_incremental
+
+    if not seo_incremental.close(current_user.id, session_id):
+        raise HTTPException(status_code=404, detail="SEO 分析工作階段不存在或已過期")
+    return {"message": "工作階段已結束"}
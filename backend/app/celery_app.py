@@ -1,11 +1,16 @@
 """
 Celery 應用程式初始化
 
-啟動 Worker:
+啟動 Worker（預設消費 celery 與全部文章生成分片佇列）:
     cd backend
     celery -A app.celery_app worker --loglevel=info --concurrency=2
+
+文章生成（GENERATION_BACKEND=celery）依 user_id 分配到 generation.0 ~ generation.{N-1} 分片佇列，
+worker 以 round robin 輪流從各佇列取任務、每次只預取 1 個，
+單一用戶一次排入大量文章時只會塞住自己的分片，不會讓其他用戶一直排在後面
 """
 from celery import Celery
+from kombu import Queue
 
 from app.config import settings
 
@@ -16,6 +21,14 @@ celery_app = Celery(
     include=["app.tasks.article_tasks"],
 )
 
+GENERATION_QUEUES = [f"generation.{i}" for i in range(max(1, settings.CELERY_GENERATION_QUEUE_SHARDS))]
+
+
+def generation_queue(user_id: int) -> str:
+    """用戶的文章生成分片佇列"""
+    return GENERATION_QUEUES[user_id % len(GENERATION_QUEUES)]
+
+
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
@@ -30,4 +43,7 @@ celery_app.conf.update(
     worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
     result_expires=86400,
     broker_connection_retry_on_startup=True,
+    task_queues=[Queue("celery")] + [Queue(name) for name in GENERATION_QUEUES],
+    # Redis broker 依序輪流 BRPOP 各佇列（預設值，明確設定避免被改成優先順序）
+    broker_transport_options={"queue_order_strategy": "round_robin"},
 )
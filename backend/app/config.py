@@ -28,14 +28,116 @@ class Settings(BaseSettings):
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 16384
 
+    # Gemini 上下文快取（SYSTEM_INSTRUCTIONS + 寫作範本）
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = True
+    GEMINI_CONTEXT_CACHE_TTL: int = 3600  # 秒
+    GEMINI_CONTEXT_CACHE_REFRESH_MARGIN: int = 300  # 距到期少於此秒數時延長 TTL
+    GEMINI_CONTEXT_CACHE_MIN_CHARS: int = 2000  # system prompt 少於此字數不建立快取（API 有最小 token 數）
+
+    # Claude prompt 快取（system 靜態段落加 cache_control 斷點）
+    ANTHROPIC_PROMPT_CACHE_ENABLED: bool = True
+
+    # LLM 斷路器（依 provider + model 追蹤近期錯誤率，供應商故障時快速失敗）
+    LLM_CIRCUIT_ENABLED: bool = True
+    LLM_CIRCUIT_WINDOW_SECONDS: int = 60  # 統計視窗
+    LLM_CIRCUIT_MIN_REQUESTS: int = 4  # 視窗內至少幾次呼叫才判斷
+    LLM_CIRCUIT_FAILURE_RATE: float = 0.5  # 失敗率（含慢呼叫）達此比例即開啟
+    LLM_CIRCUIT_SLOW_CALL_SECONDS: float = 240.0  # 超過此秒數的成功呼叫視為失敗
+    LLM_CIRCUIT_OPEN_SECONDS: int = 30  # 開啟後多久放行探測請求
+    LLM_CIRCUIT_PROBE_TIMEOUT_SECONDS: int = 330  # 探測請求超過此秒數未回報結果即視為遺失（略長於 LLM 請求逾時）
+    # 文章生成備援模型（主模型斷路器開啟或重試用盡時改用），例：{"gemini-2.5-flash": "claude-haiku-4-5"}
+    LLM_FAILOVER_MODELS: dict[str, str] = {}
+
+    # LLM 對沖請求（async 生成路徑；呼叫超過近期延遲百分位仍無輸出時送出第二個相同請求）
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_SAMPLE_SIZE: int = 200  # 每個模型保留的延遲樣本數
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 樣本不足時不對沖
+    LLM_HEDGE_MIN_DELAY: float = 5.0  # 最早幾秒後才對沖
+    LLM_HEDGE_BUDGET_RATIO: float = 0.05  # 對沖請求數上限（佔同時段請求數比例）
+    LLM_HEDGE_BUDGET_WINDOW: int = 600  # 預算統計視窗（秒）
+
+    # 對外 API 速率限制（token bucket；多 worker / 多實例部署時改用 redis 後端共用額度）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory / redis
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/4"
+    # 每分鐘請求數，鍵為 provider 或 "provider:model"（如 "gemini:gemini-2.5-pro"），未列出者不限速
+    RATE_LIMITS: dict[str, float] = {
+        "gemini": 1000,
+        "anthropic": 50,
+        "shopee": 120,
+        "autocomplete": 600,
+    }
+    RATE_LIMIT_BURST: dict[str, float] = {}  # 桶容量（瞬間突發量），預設為 1 秒的量
+    RATE_LIMIT_MAX_WAIT: float = 60.0  # 等待額度超過此秒數即放棄
+
+    # LLM 回應快取（相同輸入的重複生成請求直接回傳上次結果）
+    LLM_RESPONSE_CACHE_ENABLED: bool = True
+    LLM_RESPONSE_CACHE_TTL: int = 3600  # 秒
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = 500
+    LLM_RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # 文章生成任務（async 協程 + 進度事件）
+    GENERATION_MAX_WORKERS: int = 12  # 圖片下載 / OCR 等阻塞步驟的執行緒池大小
+    GENERATION_MAX_CONCURRENT_JOBS: int = 16  # 同時執行的生成任務上限（整個流程：圖片下載 / OCR / LLM / DB），超過的任務維持 queued 排隊
+    GENERATION_GEMINI_CONCURRENCY: int = 8  # 同時進行的 Gemini 文章生成上限
+    GENERATION_ANTHROPIC_CONCURRENCY: int = 4  # 同時進行的 Claude 文章生成上限
+    GENERATION_BATCH_MAX_ITEMS: int = 100  # 單次批量生成最多篇數
+    GENERATION_JOB_TTL: int = 3600  # 已完成任務狀態在記憶體中保留秒數
+    GENERATION_PARTIAL_SAVE_INTERVAL: float = 3.0  # 串流模式寫入部分內容到 DB 的間隔秒數
+    GENERATION_DELTA_BACKLOG_CHARS: int = 64000  # 串流模式重播給新訂閱者的 delta 字數上限（較早的片段以 truncated 事件代替）
+    GENERATION_TELEMETRY_ENABLED: bool = True  # 每次生成寫入 generation_telemetry（各階段耗時 / token / 重試）
+    GENERATION_BACKEND: str = "inline"  # inline：web 程序內的背景協程 / celery：交給 Celery worker（web 只負責排入佇列）
+
+    # 生成前 prompt token 預算（超出時依序裁減商品描述 / 圖片 / 讀圖文字，見 prompt_budget）
+    PROMPT_TOKEN_BUDGET: int = 32000  # 輸入 token 上限（另受模型 context window - LLM_MAX_TOKENS 限制）
+    PROMPT_COUNT_TOKENS_ENABLED: bool = True  # 估算接近預算時呼叫供應商 count_tokens 精算
+    PROMPT_COUNT_TOKENS_RATIO: float = 0.6  # 本地估算超過預算此比例才精算
+
+    # Claude 兩階段圖片文字提取（Gemini Flash OCR）
+    OCR_CONCURRENCY: int = 4  # 同時進行的 OCR 請求數
+    OCR_IMAGES_PER_REQUEST: int = 2  # 每次請求打包的圖片數（1 = 逐張）
+
     # 圖片下載目錄
     IMAGES_DIR: Path = Path("./images")
 
+    # 圖片快取（內容定址 + LRU，供 LLM 附圖 / 圖片代理 / ZIP 打包共用）
+    IMAGE_CACHE_DIR: Path = Path("./image_cache")
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    IMAGE_CACHE_FRESH_SECONDS: int = 86400  # 超過此秒數以 ETag/Last-Modified 重新驗證
+    IMAGE_CACHE_MAX_IMAGE_BYTES: int = 20 * 1024 * 1024  # 單張圖片大小上限，超過不下載也不快取
+
+    # 多模態 LLM 圖片前處理（縮圖 + 重新壓縮 + 長圖切片）
+    IMAGE_NORMALIZE_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1536  # 最長邊上限（長圖為寬度與切片高度）
+    IMAGE_MAX_TILES: int = 4  # 單張長圖最多切片數（超過時整張縮小，不截斷）
+    IMAGE_NORMALIZE_FORMAT: str = "WEBP"
+    IMAGE_NORMALIZE_QUALITY: int = 80
+
+    # SEO 分析結果快取（標題 / 內容 / 關鍵字 / 圖片數 / 評分器版本相同時直接回傳）
+    SEO_CACHE_ENABLED: bool = True
+    SEO_CACHE_MAX_ENTRIES: int = 2000
+    SEO_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    SEO_CACHE_REDIS_URL: str = ""  # 設定時啟用 Redis 持久層（多 worker / 重啟後共用），空字串 = 只用記憶體
+    SEO_CACHE_TTL: int = 7 * 86400  # Redis 層過期秒數
+
+    # SEO 增量分析（編輯中以段落 patch 即時評分）
+    SEO_LIVE_MAX_SESSIONS: int = 1000  # 程序內保留的編輯工作階段數
+    SEO_LIVE_SESSION_TTL: int = 1800  # 閒置超過此秒數的工作階段過期
+
+    # SEO 批量評分（程序池平行評分 + 分塊批量寫回）
+    SEO_BATCH_WORKERS: int = 0  # 評分程序數（0 = CPU 核心數，1 = 不開程序池）
+    SEO_BATCH_CHUNK_SIZE: int = 200  # 每次送進程序池 / 批量寫回的文章數
+    SEO_BATCH_MAX_ARTICLES: int = 1000  # /api/seo/analyze-batch 單次請求上限
+
     # Celery 任務佇列設定
     CELERY_BROKER_URL: str = "redis://localhost:6379/2"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/3"
     CELERY_TASK_TIMEOUT: int = 300
     CELERY_WORKER_CONCURRENCY: int = 2
+    CELERY_GENERATION_QUEUE_SHARDS: int = 8  # 文章生成佇列分片數（依 user_id 分配，worker 輪流消費 → 用戶間公平）
+    CELERY_GENERATION_POLL_INTERVAL: float = 1.0  # web 追蹤 worker 生成進度的輪詢間隔秒數
+    CELERY_GENERATION_DEADLINE_SECONDS: int = 1800  # 排入到寫入完成（含排隊）的總時限，逾時標記為 failed 並撤銷未執行的步驟
 
     # JWT 認證
     JWT_SECRET_KEY: str = "change-me-in-production-use-a-random-secret"
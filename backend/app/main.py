@@ -74,6 +74,10 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    # 關閉 SEO 批量評分程序池（有用到時才會建立）
+    from app.services.seo_batch import seo_batch
+    seo_batch.shutdown()
+
 
 app = FastAPI(
     title="Dcard 自動文章生成系統",
@@ -7,5 +7,7 @@ from app.models.api_usage import ApiUsage
 from app.models.prompt_template import PromptTemplate
 from app.models.usage_record import UsageRecord
 from app.models.announcement import Announcement
+from app.models.image_ocr_cache import ImageOcrCache
+from app.models.generation_telemetry import GenerationTelemetry
 
-__all__ = ["User", "Product", "ProductImage", "Article", "ApiUsage", "PromptTemplate", "UsageRecord", "Announcement"]
+__all__ = ["User", "Product", "ProductImage", "Article", "ApiUsage", "PromptTemplate", "UsageRecord", "Announcement", "ImageOcrCache", "GenerationTelemetry"]
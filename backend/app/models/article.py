@@ -1,7 +1,7 @@
 """
 文章模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float, ForeignKey, UniqueConstraint
 
 from app.db.database import Base
 from app.utils.timezone import taipei_now
@@ -27,8 +27,14 @@ class Article(Base):
     sub_id = Column(String(100))  # 蝦皮聯盟行銷追蹤 Sub_id
     status = Column(String(20), default="draft")  # draft / optimized / published
     published_url = Column(String(1000))
+    generation_timings = Column(JSON)  # 生成各階段耗時 {"stages": {階段: {"start_ms", "duration_ms"}}, "total_ms", ...}
+    idempotency_key = Column(String(100))  # 生成請求的 Idempotency-Key（同一用戶重複送出時回傳同一篇）
     created_at = Column(DateTime, default=taipei_now)
     updated_at = Column(DateTime, default=taipei_now, onupdate=taipei_now)
 
+    __table_args__ = (
+        UniqueConstraint('user_id', 'idempotency_key', name='uq_articles_user_idempotency_key'),
+    )
+
     def __repr__(self):
         return f"<Article {self.id}: {self.title[:30]}>"
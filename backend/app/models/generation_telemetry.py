@@ -0,0 +1,32 @@
+"""
+文章生成遙測模型（每次生成一筆：各階段耗時、token、重試次數）
+"""
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey
+
+from app.db.database import Base
+from app.utils.timezone import taipei_now
+
+
+class GenerationTelemetry(Base):
+    """單次文章生成的效能紀錄（成功或失敗皆記錄）"""
+
+    __tablename__ = "generation_telemetry"
+
+    id = Column(Integer, primary_key=True, index=True)
+    article_id = Column(Integer, ForeignKey("articles.id", ondelete="SET NULL"), nullable=True, index=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    model = Column(String(100), nullable=False, index=True)  # 實際產生文章的模型（含備援切換後）
+    status = Column(String(20), nullable=False)  # success / failed
+    total_ms = Column(Integer)  # 從背景任務開始到寫入 DB 的總耗時
+    ttfb_ms = Column(Integer)  # LLM 首次輸出延遲（串流為第一個片段，非串流為完整回應）
+    llm_ms = Column(Integer)  # LLM 呼叫耗時（成功的那次請求）
+    input_tokens = Column(Integer, default=0)  # 含 OCR 等輔助呼叫，不含快取讀取
+    output_tokens = Column(Integer, default=0)
+    cache_read_tokens = Column(Integer, default=0)
+    retries = Column(Integer, default=0)  # LLM 重試次數（不含備援切換）
+    stages = Column(JSON)  # {階段: {"start_ms", "duration_ms", ...}}
+    details = Column(JSON)  # 圖片 / OCR / LLM 細節、各模型 token、錯誤類型
+    created_at = Column(DateTime, default=taipei_now, index=True)
+
+    def __repr__(self):
+        return f"<GenerationTelemetry article={self.article_id} {self.model} {self.status} {self.total_ms}ms>"
@@ -0,0 +1,29 @@
+"""
+圖片文字提取快取模型（Claude 兩階段策略的 Gemini Flash OCR 結果）
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+
+from app.db.database import Base
+from app.utils.timezone import taipei_now
+
+
+class ImageOcrCache(Base):
+    """圖片 OCR 結果（按圖片內容雜湊 + 提取 prompt 版本）"""
+
+    __tablename__ = "image_ocr_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_hash = Column(String(64), nullable=False, index=True)  # 圖片內容 sha256
+    prompt_version = Column(String(32), nullable=False)  # 提取 prompt 版本（prompt 變更即失效）
+    text = Column(Text, nullable=False)
+    model = Column(String(50))
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=taipei_now)
+    last_used_at = Column(DateTime, default=taipei_now)
+
+    __table_args__ = (
+        UniqueConstraint('image_hash', 'prompt_version', name='uq_image_ocr_cache'),
+    )
+
+    def __repr__(self):
+        return f"<ImageOcrCache {self.image_hash[:12]} ({self.prompt_version})>"
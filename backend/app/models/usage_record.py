@@ -20,6 +20,8 @@ class UsageRecord(Base):
     requests = Column(Integer, default=0)
     input_tokens = Column(Integer, default=0)
     output_tokens = Column(Integer, default=0)
+    cache_read_tokens = Column(Integer, default=0)              # prompt 快取命中（不含在 input_tokens 內）
+    cache_write_tokens = Column(Integer, default=0)             # prompt 快取寫入（Anthropic cache_creation）
     created_at = Column(DateTime, default=taipei_now)
     updated_at = Column(DateTime, default=taipei_now, onupdate=taipei_now)
 
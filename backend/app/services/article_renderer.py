@@ -0,0 +1,289 @@
+"""
+文章後處理 — LLM 原始輸出一次掃描產生純文字 / Markdown / 含圖片三種版本
+
+生成、SEO 優化、編輯文章、複製格式化（Dcard / 方格子）共用，取代各處重複的 strip_markdown + 逐個圖片標記 str.replace：
+
+- 逐行掃描一次：行首標題 / 列表符號以字串操作處理，只有含強調符號的行才套用預先編譯的行內 regex
+- 第一個有意義的行為標題（略過空行與分隔線），其後為內文
+- {{IMAGE:...}} 標記以一次 regex 掃描替換：image_map 內的標記換成 Markdown 圖片，
+  其餘（LLM 自創的不存在索引）直接移除
+- 整體為 O(文章長度 + 標記數)，與 image_map 大小無關（bench: scripts/bench_article_renderer.py）
+"""
+import re
+from typing import Optional
+
+# {{IMAGE:pid:idx}} 圖片標記（含 LLM 自創的格式）
+IMAGE_MARKER_RE = re.compile(r'\{\{(IMAGE:[^}]*)\}\}')
+# Markdown 圖片 ![alt](url)
+MD_IMAGE_RE = re.compile(r'!\[.*?\]\((.*?)\)')
+
+# 行內強調（依序套用，與原本的 strip_markdown 規則相同）：**x** / __x__ / *x*（保留表情符號旁的單獨 *）
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+_UNDERLINE_RE = re.compile(r'__(.+?)__')
+_ITALIC_RE = re.compile(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)')
+_HEADING_RE = re.compile(r'#{1,6}[ \t]+')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+# 段落分隔（空行）
+_PARAGRAPH_RE = re.compile(r'\n{2,}')
+# 方格子目錄用的 H1~H3 標題
+_MD_HEADING_LINE_RE = re.compile(r'^#{1,3}\s+', re.MULTILINE)
+_SEPARATOR_RE = re.compile(r'^(-{3,}|={3,})$')
+# 常見 heading emoji
+_HEADING_EMOJI_RE = re.compile(r'[\U0001F300-\U0001F9FF\u2600-\u26FF\u2700-\u27BF]')
+# 自動貼上版的圖片位置「📷圖N」（📷 也在 heading emoji 範圍內，不可當成子標題）
+_PASTE_IMAGE_RE = re.compile(r'📷圖\d+$')
+
+# 標題解析時略過的分隔線
+SKIP_LINES = {'---', '===', '***', '- - -', '* * *'}
+
+
+def _strip_inline(line: str) -> str:
+    # 大部分行沒有強調符號，直接略過 regex
+    if '*' in line:
+        line = _BOLD_RE.sub(r'\1', line)
+    if '__' in line:
+        line = _UNDERLINE_RE.sub(r'\1', line)
+    if '*' in line:
+        line = _ITALIC_RE.sub(r'\1', line)
+    return line
+
+
+def plain_line(line: str) -> str:
+    """單行 Markdown → 純文字（標題符號、粗體 / 斜體、列表符號）"""
+    if line.startswith('#'):
+        m = _HEADING_RE.match(line)
+        if m:
+            line = line[m.end():]
+    line = _strip_inline(line)
+    if line.startswith('- ') and not line.startswith('- -'):
+        line = line[2:]
+    return line
+
+
+def strip_markdown(text: str) -> str:
+    """清除 Markdown 語法，保留純文字與圖片標記（Dcard 不支援 Markdown）"""
+    return '\n'.join(plain_line(line) for line in text.split('\n'))
+
+
+def image_markdown(url: str) -> str:
+    return f"\n\n![商品圖片]({url})\n\n"
+
+
+def render_markers(text: str, image_map: Optional[dict]) -> str:
+    """{{IMAGE:...}} 標記 → Markdown 圖片；不在 image_map 的標記移除"""
+    if '{{' not in text:
+        return text
+    image_map = image_map or {}
+
+    def sub(m: re.Match) -> str:
+        url = image_map.get(m.group(1))
+        return image_markdown(url) if url else ''
+
+    return IMAGE_MARKER_RE.sub(sub, text)
+
+
+def remove_markers(text: str) -> str:
+    """移除所有 {{IMAGE:...}} 標記"""
+    return IMAGE_MARKER_RE.sub('', text) if '{{' in text else text
+
+
+def _split_title(lines: list[str]) -> tuple[str, int]:
+    """第一個有意義的行（略過空行與分隔線）為標題，回傳 (標題, 內文起始行)"""
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or stripped in SKIP_LINES:
+            continue
+        return stripped.lstrip('#').strip(), i + 1
+    return "", 0
+
+
+def parse_title_content(text: str) -> tuple[str, str]:
+    """LLM 輸出 → (標題, 純文字內文)，內文保留圖片標記；找不到標題時標題為空字串"""
+    lines = [plain_line(line) for line in text.strip().split('\n')]
+    title, start = _split_title(lines)
+    return title, '\n'.join(lines[start:]).strip()
+
+
+def render_llm_output(text: str, image_map: Optional[dict]) -> dict:
+    """LLM 原始輸出 → {"title", "content", "content_markdown", "content_with_images"}
+
+    title 找不到時為空字串（由呼叫端補預設標題）；content 為不含圖片標記的純文字
+    """
+    raw_lines = text.strip().split('\n')
+    plain_lines = [plain_line(line) for line in raw_lines]
+    title, start = _split_title(plain_lines)
+
+    content = '\n'.join(plain_lines[start:]).strip()
+    content_markdown = '\n'.join(raw_lines[start:]).strip()
+    return {
+        "title": title,
+        "content": remove_markers(content),
+        "content_markdown": render_markers(content_markdown, image_map),
+        "content_with_images": render_markers(content, image_map),
+    }
+
+
+def render_copy_formats(content_with_images: str, plain_content: str, image_map: Optional[dict]) -> dict:
+    """Dcard 複製格式：含圖片內容一次掃描產生顯示版 / 自動貼上版與圖片位置
+
+    - content：已知圖片換成「📷 [在此插入圖片: marker]」位置提示
+    - paste_content：已知圖片換成「📷圖N」，其他 Markdown 圖片移除
+    - plain_content：移除所有 Markdown 圖片
+    """
+    url_to_marker = {url: marker for marker, url in (image_map or {}).items()}
+    image_positions = []
+    display_parts = []
+    paste_parts = []
+    pos = 0
+    if url_to_marker:
+        for m in MD_IMAGE_RE.finditer(content_with_images):
+            marker = url_to_marker.get(m.group(1))
+            segment = content_with_images[pos:m.start()]
+            display_parts.append(segment)
+            paste_parts.append(segment)
+            pos = m.end()
+            if marker:
+                index = len(image_positions) + 1
+                image_positions.append({"marker": marker, "url": m.group(1), "index": index})
+                display_parts.append(f"\n\n📷 [在此插入圖片: {marker}]\n\n")
+                paste_parts.append(f"\n\n📷圖{index}\n\n")
+            else:
+                display_parts.append(m.group(0))
+    display_parts.append(content_with_images[pos:])
+    paste = ''.join(paste_parts) + content_with_images[pos:] if url_to_marker else MD_IMAGE_RE.sub('', content_with_images)
+
+    return {
+        "content": ''.join(display_parts),
+        "paste_content": _BLANK_LINES_RE.sub('\n\n', paste).strip(),
+        "plain_content": _BLANK_LINES_RE.sub('\n\n', MD_IMAGE_RE.sub('', plain_content)).strip(),
+        "image_positions": image_positions,
+    }
+
+
+def split_paragraphs(text: str) -> list[str]:
+    """以空行切段，略過空白段落"""
+    return [p for p in _PARAGRAPH_RE.split(text) if p.strip()]
+
+
+def image_anchors(content_with_images: str, image_map: Optional[dict]) -> list[tuple[str, float]]:
+    """含圖片內容中已知圖片所在段落的相對位置 [(marker, 段落索引 / 段落數)]，供改寫後按比例放回"""
+    if not image_map:
+        return []
+    url_to_marker = {url: marker for marker, url in image_map.items()}
+    paragraphs = split_paragraphs(content_with_images)
+    total = len(paragraphs) or 1
+    anchors = []
+    for idx, para in enumerate(paragraphs):
+        for m in MD_IMAGE_RE.finditer(para):
+            marker = url_to_marker.get(m.group(1))
+            if marker:
+                anchors.append((marker, idx / total))
+    return anchors
+
+
+def place_markers(text: str, anchors: list[tuple[str, float]]) -> str:
+    """移除 LLM 自創的 {{IMAGE:...}} 標記，再依 image_anchors 的比例把圖片標記插在對應段落之後"""
+    text = remove_markers(text)
+    if not anchors:
+        return text
+    paragraphs = split_paragraphs(text)
+    total = len(paragraphs) or 1
+    inserts: dict[int, list[str]] = {}
+    for marker, proportion in anchors:
+        inserts.setdefault(min(int(proportion * total), total - 1), []).append(f"{{{{{marker}}}}}")
+    result = []
+    for i, para in enumerate(paragraphs):
+        result.append(para)
+        result.extend(inserts.get(i, ()))
+    return '\n\n'.join(result)
+
+
+def distribute_paste_images(text: str, image_positions: list) -> str:
+    """將「📷圖N」均勻分佈在文章段落之間（用於無法精確定位圖片的舊文章）"""
+    paragraphs = split_paragraphs(text)
+    n_images = len(image_positions)
+    n_paras = len(paragraphs)
+
+    if n_images == 0 or n_paras <= 1:
+        # fallback: 附在文末
+        return text + ''.join(f"\n\n📷圖{img['index']}" for img in image_positions)
+
+    # 計算插入間隔（均勻分佈）
+    interval = max(1, n_paras // (n_images + 1))
+    result = []
+    img_idx = 0
+    for i, para in enumerate(paragraphs):
+        result.append(para)
+        if img_idx < n_images and (i + 1) % interval == 0 and i < n_paras - 1:
+            result.append(f"📷圖{image_positions[img_idx]['index']}")
+            img_idx += 1
+
+    # 剩餘未插入的圖片附在最後
+    result.extend(f"📷圖{img['index']}" for img in image_positions[img_idx:])
+    return '\n\n'.join(result)
+
+
+def reconstruct_headings(text: str) -> str:
+    """為舊文章（無 ## heading）重建 Markdown 標題結構
+    規則：=== 分隔線後的短行 → ## H2，emoji 開頭的短獨立行 → ### H3"""
+    result = []
+    prev_was_separator = False
+    prev_was_empty = False
+
+    for line in text.split('\n'):
+        stripped = line.strip()
+
+        # 偵測分隔線
+        if _SEPARATOR_RE.match(stripped):
+            prev_was_separator = True
+            result.append(stripped)
+            continue
+
+        # 分隔線後的非空短行 → H2
+        if prev_was_separator and stripped and len(stripped) < 80:
+            result.append(f'## {stripped}')
+            prev_was_separator = False
+            prev_was_empty = False
+            continue
+
+        # emoji 開頭 + 短行 + 前後有空行 → H3（子標題）
+        if (prev_was_empty and stripped and len(stripped) < 60
+                and _HEADING_EMOJI_RE.match(stripped) and not _PASTE_IMAGE_RE.match(stripped)):
+            result.append(f'### {stripped}')
+            prev_was_separator = False
+            prev_was_empty = False
+            continue
+
+        prev_was_separator = False
+        prev_was_empty = (stripped == '')
+        result.append(line)
+
+    return '\n'.join(result)
+
+
+def render_vocus_formats(content_markdown: str, content_with_images: str, image_map: Optional[dict]) -> dict:
+    """方格子複製格式：{"paste_content", "image_positions"}，圖片編號與 Dcard 版（render_copy_formats）相同
+
+    - 依序從 content_markdown / content_with_images 取內嵌的已知圖片換成「📷圖N」
+    - 兩者都沒有內嵌圖片的舊文章：image_map 的圖片均勻分佈在段落之間
+    - content_markdown 沒有 H1~H3 標題時重建標題結構（方格子目錄 SEO）
+    """
+    paste_content = content_markdown
+    image_positions = []
+    for source in (content_markdown, content_with_images):
+        formats = render_copy_formats(source, "", image_map)
+        if formats["image_positions"]:
+            paste_content = formats["paste_content"]
+            image_positions = formats["image_positions"]
+            break
+    else:
+        if image_map:
+            image_positions = [
+                {"marker": marker, "url": url, "index": index}
+                for index, (marker, url) in enumerate(image_map.items(), 1)
+            ]
+            paste_content = distribute_paste_images(content_markdown, image_positions)
+
+    if not _MD_HEADING_LINE_RE.search(content_markdown):
+        paste_content = reconstruct_headings(paste_content)
+    return {"paste_content": paste_content, "image_positions": image_positions}
@@ -0,0 +1,173 @@
+"""
+LLM 供應商斷路器 — 依 (provider, model) 追蹤近期錯誤率與延遲，供應商故障時快速失敗
+
+狀態：
+- closed：正常放行，記錄每次呼叫結果
+- open：最近 LLM_CIRCUIT_WINDOW_SECONDS 秒內請求數 ≥ LLM_CIRCUIT_MIN_REQUESTS
+        且失敗率（含超過 LLM_CIRCUIT_SLOW_CALL_SECONDS 的慢呼叫）≥ LLM_CIRCUIT_FAILURE_RATE 時開啟，
+        期間直接拒絕請求（呼叫端可改用備援模型）
+- half_open：開啟 LLM_CIRCUIT_OPEN_SECONDS 秒後放行一個探測請求，成功則關閉、失敗則重新開啟；
+             探測請求沒有結果就結束（被取消、對沖落敗）時呼叫端以 release() 歸還名額，
+             未歸還的名額超過 LLM_CIRCUIT_PROBE_TIMEOUT_SECONDS 也會失效，改放行下一個探測請求
+
+狀態只存在於單一程序記憶體中（多個 worker 各自判斷）。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """斷路器開啟中，請求未送出"""
+
+    transient = True  # 供應商暫時不可用，可改用備援模型
+
+
+class CircuitBreaker:
+    """單一 (provider, model) 的斷路器"""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.state = "closed"
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._probe_started: Optional[float] = None
+        # (時間, 是否失敗, 延遲秒數)
+        self._calls: deque[tuple[float, bool, float]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    def allow(self) -> bool:
+        """是否放行本次請求（half_open 時只放行一個探測請求）"""
+        return self.admit() is not None
+
+    def admit(self) -> Optional[str]:
+        """放行判斷：拒絕回傳 None、一般放行回傳 "pass"、半開狀態的探測請求回傳 "probe"
+
+        探測請求結束時需以 record_success / record_failure 回報結果，沒有結果（被取消）時呼叫 release()
+        """
+        if not settings.LLM_CIRCUIT_ENABLED:
+            return "pass"
+        with self._lock:
+            if self.state == "closed":
+                return "pass"
+            if self.state == "open":
+                if time.time() - self.opened_at < settings.LLM_CIRCUIT_OPEN_SECONDS:
+                    return None
+                self.state = "half_open"
+                self._probe_in_flight = False
+                logger.info(f"斷路器半開，放行探測請求: {self.name}")
+            if self._probe_in_flight:
+                if time.time() - self._probe_started < settings.LLM_CIRCUIT_PROBE_TIMEOUT_SECONDS:
+                    return None
+                logger.warning(f"斷路器探測請求逾時未回報，放行新的探測請求: {self.name}")
+            self._probe_in_flight = True
+            self._probe_started = time.time()
+            return "probe"
+
+    def release(self):
+        """探測請求沒有結果就結束（被取消）：不計入統計，只歸還探測名額"""
+        with self._lock:
+            if self.state == "half_open" and self._probe_in_flight:
+                self._probe_in_flight = False
+                logger.info(f"斷路器探測請求已取消，歸還探測名額: {self.name}")
+
+    def record_success(self, latency: float):
+        slow = latency >= settings.LLM_CIRCUIT_SLOW_CALL_SECONDS
+        with self._lock:
+            self._append(slow, latency)
+            if self.state == "half_open":
+                self.state = "closed"
+                self.opened_at = None
+                self._probe_in_flight = False
+                self._calls.clear()
+                logger.info(f"斷路器關閉（探測成功）: {self.name}")
+            else:
+                self._maybe_open()
+
+    def record_failure(self, latency: float):
+        with self._lock:
+            self._append(True, latency)
+            if self.state == "half_open":
+                self._open("探測請求失敗")
+            else:
+                self._maybe_open()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._trim()
+            calls = list(self._calls)
+        failures = sum(1 for _, failed, _ in calls if failed)
+        latencies = sorted(lat for _, _, lat in calls)
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "state": self.state,
+            "opened_at": self.opened_at,
+            "window_requests": len(calls),
+            "window_failures": failures,
+            "failure_rate": round(failures / len(calls), 3) if calls else 0.0,
+            "p50_latency": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "max_latency": round(latencies[-1], 2) if latencies else None,
+        }
+
+    # ── 內部方法（呼叫端需持有鎖）──
+
+    def _append(self, failed: bool, latency: float):
+        self._calls.append((time.time(), failed, latency))
+        self._trim()
+
+    def _trim(self):
+        cutoff = time.time() - settings.LLM_CIRCUIT_WINDOW_SECONDS
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _maybe_open(self):
+        if self.state != "closed" or len(self._calls) < settings.LLM_CIRCUIT_MIN_REQUESTS:
+            return
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        rate = failures / len(self._calls)
+        if rate >= settings.LLM_CIRCUIT_FAILURE_RATE:
+            self._open(f"失敗率 {rate:.0%}（{failures}/{len(self._calls)}）")
+
+    def _open(self, reason: str):
+        self.state = "open"
+        self.opened_at = time.time()
+        self._probe_in_flight = False
+        logger.warning(f"斷路器開啟: {self.name} - {reason}，{settings.LLM_CIRCUIT_OPEN_SECONDS}s 內直接拒絕請求")
+
+
+class CircuitBreakerRegistry:
+    """斷路器集合（單例）"""
+
+    def __init__(self):
+        self._breakers: dict[tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str) -> CircuitBreaker:
+        key = (provider, model)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(provider, model)
+                self._breakers[key] = breaker
+            return breaker
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [b.snapshot() for b in breakers]
+
+
+# 單例
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,154 @@
+"""
+Gemini 明確上下文快取（Context Caching）— SYSTEM_INSTRUCTIONS + 寫作範本只上傳一次
+
+每篇文章的 system_instruction 都是相同的數 KB 中文指示，建立 cached content 後
+生成請求只需帶 cache 名稱，快取部分的輸入 token 以折扣計價、也減少 prefill 延遲。
+
+- 快取鍵：(model, 範本 ID, system prompt 雜湊)，範本內容修改後自動建立新快取並刪除舊的
+- 快取到期前 GEMINI_CONTEXT_CACHE_REFRESH_MARGIN 秒內使用時延長 TTL
+- 建立失敗（模型不支援、內容低於最小 token 數、API 錯誤）時回傳 None，
+  呼叫端照常以 system_instruction 送出；同一鍵在 _RETRY_AFTER 秒內不再嘗試
+- 生成請求因 cached content 失效而失敗時（is_cache_error），呼叫端 invalidate 後改帶完整 system prompt
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Optional
+
+from google.genai import types
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 建立快取失敗後，同一鍵暫停嘗試的秒數
+_RETRY_AFTER = 600
+
+# cached content 失效時 API 錯誤訊息的關鍵字（小寫比對）
+_CACHE_ERROR_MARKERS = ("cachedcontent", "cached_content", "cached content")
+
+
+def is_cache_error(error: Exception, cache_name: str) -> bool:
+    """錯誤是否來自請求所帶的 cached content（已過期 / 被刪除 / 無權限）
+
+    只比對 cached content 相關字樣或快取名稱本身；其他 404 / not found（如模型不存在）不算
+    """
+    message = str(error).lower()
+    return cache_name.lower() in message or any(marker in message for marker in _CACHE_ERROR_MARKERS)
+
+
+class _CacheEntry:
+    def __init__(self, name: str, prompt_hash: str, expire_at: float):
+        self.name = name
+        self.prompt_hash = prompt_hash
+        self.expire_at = expire_at
+
+
+class GeminiContextCache:
+    """Gemini cached content 管理器（執行緒安全，單例）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], _CacheEntry] = {}
+        self._key_locks: dict[tuple[str, str], threading.Lock] = {}
+        self._failed_until: dict[tuple[str, str, str], float] = {}
+
+    @staticmethod
+    def prompt_hash(system_prompt: str) -> str:
+        return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+    def get(self, client, model: str, template_id: str, system_prompt: str) -> Optional[str]:
+        """取得（必要時建立 / 延長）對應的 cached content 名稱，無法使用快取時回傳 None"""
+        if not settings.GEMINI_CONTEXT_CACHE_ENABLED:
+            return None
+        if len(system_prompt) < settings.GEMINI_CONTEXT_CACHE_MIN_CHARS:
+            # 內容太短：低於 API 最小 token 數，快取也省不了多少
+            return None
+
+        key = (model, template_id)
+        digest = self.prompt_hash(system_prompt)
+        with self._lock:
+            if self._failed_until.get((*key, digest), 0) > time.time():
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 同一鍵的建立 / 延長序列化，避免並行請求重複建立快取
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            now = time.time()
+
+            if entry and entry.prompt_hash == digest:
+                if entry.expire_at - now > settings.GEMINI_CONTEXT_CACHE_REFRESH_MARGIN:
+                    return entry.name
+                if entry.expire_at - now > 5 and self._refresh(client, entry):
+                    return entry.name
+
+            stale = entry.name if entry else None
+            entry = self._create(client, model, template_id, system_prompt, digest)
+            with self._lock:
+                if entry is None:
+                    self._entries.pop(key, None)
+                    self._prune_failures()
+                    self._failed_until[(*key, digest)] = time.time() + _RETRY_AFTER
+                else:
+                    self._entries[key] = entry
+
+        if stale and (entry is None or stale != entry.name):
+            self._delete(client, stale)
+        return entry.name if entry else None
+
+    def invalidate(self, model: str, template_id: str, name: str):
+        """快取在伺服器端已失效（過期 / 被刪除）時由呼叫端通知，下次使用重新建立"""
+        with self._lock:
+            entry = self._entries.get((model, template_id))
+            if entry and entry.name == name:
+                del self._entries[(model, template_id)]
+        logger.info(f"Gemini 上下文快取失效: {name}")
+
+    def _prune_failures(self):
+        """清除已過暫停期的失敗紀錄（呼叫端需持有鎖）"""
+        now = time.time()
+        for failed_key in [k for k, until in self._failed_until.items() if until <= now]:
+            del self._failed_until[failed_key]
+
+    @staticmethod
+    def _create(client, model: str, template_id: str, system_prompt: str, digest: str) -> Optional[_CacheEntry]:
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+        try:
+            cached = client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_prompt,
+                    display_name=f"article-{template_id}-{digest}",
+                    ttl=f"{ttl}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Gemini 上下文快取建立失敗（改用一般請求）: {model} / {template_id} - {e}")
+            return None
+        logger.info(f"Gemini 上下文快取建立: {cached.name}（{model} / {template_id}，TTL {ttl}s）")
+        return _CacheEntry(cached.name, digest, time.time() + ttl)
+
+    @staticmethod
+    def _refresh(client, entry: _CacheEntry) -> bool:
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+        try:
+            client.caches.update(name=entry.name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s"))
+        except Exception as e:
+            logger.warning(f"Gemini 上下文快取延長失敗，改為重新建立: {entry.name} - {e}")
+            return False
+        entry.expire_at = time.time() + ttl
+        return True
+
+    @staticmethod
+    def _delete(client, name: str):
+        try:
+            client.caches.delete(name=name)
+        except Exception as e:
+            logger.debug(f"舊的 Gemini 上下文快取刪除失敗（等待自然過期）: {name} - {e}")
+
+
+# 單例
+gemini_context_cache = GeminiContextCache()
@@ -2,47 +2,37 @@
 LLM API 共用工具函數
 支援 Gemini 和 Anthropic Claude 的用量追蹤
 """
-import re
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def strip_markdown(text: str) -> str:
-    """清除 Markdown 語法，保留純文字（Dcard 不支援 Markdown）"""
-    # 移除標題符號 ### ## #（保留文字）
-    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-    # 移除粗體 **text** 或 __text__（保留文字）
-    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
-    text = re.sub(r'__(.+?)__', r'\1', text)
-    # 移除斜體 *text* 或 _text_（但保留表情符號旁的 *）
-    text = re.sub(r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)', r'\1', text)
-    # 移除 markdown 列表符號 - item（但保留 --- 分隔線）
-    text = re.sub(r'^- (?!-)', '', text, flags=re.MULTILINE)
-    # 保留圖片標記 {{IMAGE:...}} 不動
-    return text
-
-
 def track_gemini_usage(response, model: str = "gemini-2.5-flash", user_id: int = None):
     """追蹤 Gemini API 用量"""
     try:
+        from app.services.generation_telemetry import generation_telemetry
         from app.services.usage_tracker import usage_tracker
 
         input_tokens = 0
         output_tokens = 0
+        cached_tokens = 0
 
         if hasattr(response, 'usage_metadata') and response.usage_metadata:
             input_tokens = getattr(response.usage_metadata, 'prompt_token_count', 0) or 0
             output_tokens = getattr(response.usage_metadata, 'candidates_token_count', 0) or 0
+            # 上下文快取命中的部分（已包含在 prompt_token_count 內）
+            cached_tokens = getattr(response.usage_metadata, 'cached_content_token_count', 0) or 0
 
         usage_tracker.record_usage(
             provider="google",
             model=model,
-            input_tokens=input_tokens,
+            input_tokens=input_tokens - cached_tokens,
             output_tokens=output_tokens,
             user_id=user_id,
+            cache_read_tokens=cached_tokens,
         )
-        logger.info(f"API 用量 ({model}): input={input_tokens}, output={output_tokens}, user_id={user_id}")
+        generation_telemetry.note_usage(model, input_tokens - cached_tokens, output_tokens, cache_read_tokens=cached_tokens)
+        logger.info(f"API 用量 ({model}): input={input_tokens} (cached={cached_tokens}), output={output_tokens}, user_id={user_id}")
     except Exception as e:
         logger.warning(f"用量追蹤失敗: {e}")
 
@@ -50,14 +40,20 @@ def track_gemini_usage(response, model: str = "gemini-2.5-flash", user_id: int =
 def track_anthropic_usage(response, model: str, user_id: int = None):
     """追蹤 Anthropic Claude API 用量"""
     try:
+        from app.services.generation_telemetry import generation_telemetry
         from app.services.usage_tracker import usage_tracker
 
         input_tokens = 0
         output_tokens = 0
+        cache_read_tokens = 0
+        cache_write_tokens = 0
 
         if hasattr(response, 'usage') and response.usage:
+            # input_tokens 不含快取部分（Anthropic 分開回報快取讀取 / 寫入）
             input_tokens = getattr(response.usage, 'input_tokens', 0) or 0
             output_tokens = getattr(response.usage, 'output_tokens', 0) or 0
+            cache_read_tokens = getattr(response.usage, 'cache_read_input_tokens', 0) or 0
+            cache_write_tokens = getattr(response.usage, 'cache_creation_input_tokens', 0) or 0
 
         usage_tracker.record_usage(
             provider="anthropic",
@@ -65,12 +61,35 @@ def track_anthropic_usage(response, model: str, user_id: int = None):
             input_tokens=input_tokens,
             output_tokens=output_tokens,
             user_id=user_id,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+        )
+        generation_telemetry.note_usage(model, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+        logger.info(
+            f"API 用量 ({model}): input={input_tokens}, cache_read={cache_read_tokens}, "
+            f"cache_write={cache_write_tokens}, output={output_tokens}, user_id={user_id}"
         )
-        logger.info(f"API 用量 ({model}): input={input_tokens}, output={output_tokens}, user_id={user_id}")
     except Exception as e:
         logger.warning(f"用量追蹤失敗: {e}")
 
 
+def anthropic_system_blocks(*texts: str) -> list[dict] | str:
+    """組合 Claude system 參數：每段靜態文字各自一個 block 並加上 prompt 快取斷點
+
+    前綴完全相同的後續請求會命中快取（快取讀取只算 input 單價 10%）；
+    低於模型最小可快取長度的段落 API 會直接忽略斷點，不影響結果
+    """
+    from app.config import settings
+
+    texts = [t for t in texts if t]
+    if not settings.ANTHROPIC_PROMPT_CACHE_ENABLED:
+        return "".join(texts)
+    return [
+        {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+        for text in texts
+    ]
+
+
 def is_anthropic_model(model: str) -> bool:
     """判斷是否為 Anthropic Claude 模型"""
     return model.startswith("claude-")
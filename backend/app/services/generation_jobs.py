@@ -0,0 +1,369 @@
+"""
+文章生成任務管理 — event loop 上的生成協程 + 階段進度事件（供 SSE 串流 / 狀態輪詢）
+
+生成流程階段：queued → images → ocr → llm → seo → saved（失敗時為 failed）
+queued 包含等待任務名額（GENERATION_MAX_CONCURRENT_JOBS）的時間，事件的 waiting 為排在前面（含自己）的任務數
+images / ocr 在流水線中並行（見 generation_pipeline），ocr 事件帶 streaming=True 時表示邊下載邊讀圖
+主模型故障改用備援模型時會插入 failover 階段，之後重新進入 llm（或 ocr）
+串流模式另有 delta（LLM 文字片段）與 reset（串流中斷重試，丟棄已收到片段）事件；
+重播給新訂閱者的 delta 最多保留 GENERATION_DELTA_BACKLOG_CHARS 字，較早的片段以一個
+truncated 事件（dropped_chars）代替，需要完整內容時改讀 Article.content（定期寫入的部分內容）
+GENERATION_BACKEND=celery 時生成由 Celery worker 執行（見 tasks/article_tasks），這裡的協程只輪詢步驟狀態並轉成階段事件（沒有 delta）
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Coroutine, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 結束階段：進入後不再有新事件
+TERMINAL_STAGES = {"saved", "failed"}
+
+
+class GenerationJob:
+    """單一文章生成任務狀態"""
+
+    def __init__(self, article_id: int, user_id: int):
+        self.job_id = uuid.uuid4().hex
+        self.article_id = article_id
+        self.user_id = user_id
+        self.stage = "queued"
+        self.events: list[dict] = []
+        self.delta_chars = 0  # events 中 delta 片段的總字數
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.future: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.stage in TERMINAL_STAGES
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "article_id": self.article_id,
+            "stage": self.stage,
+            "done": self.done,
+            "elapsed": round(end - self.created_at, 1),
+            "stages": [e["stage"] for e in self.events if e["type"] == "stage"],
+        }
+
+
+class GenerationBatch:
+    """批量生成任務（一組文章 ID）"""
+
+    def __init__(self, user_id: int, article_ids: list[int]):
+        self.batch_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.article_ids = article_ids
+        self.created_at = time.time()
+
+
+class GenerationJobManager:
+    """生成任務管理器（單例）
+
+    - 生成以 asyncio task 在 event loop 上執行（LLM 呼叫走 async client，不佔用執行緒）
+    - 同時執行的任務數受 GENERATION_MAX_CONCURRENT_JOBS 限制，取得名額前不開始任何工作（停留在 queued 階段）
+    - 圖片下載 / OCR 等阻塞步驟使用有界執行緒池 executor（GENERATION_MAX_WORKERS）
+    - 透過 report() 回報階段（可從任意執行緒呼叫），訂閱者（SSE）以 asyncio.Queue 即時收到事件
+    - provider_slot() 依供應商（Gemini / Claude）限制同時進行的 LLM 生成數，超過的任務排隊等待
+    - 已完成任務於新任務提交與任務結束時清除（保留 GENERATION_JOB_TTL 秒）
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: dict[int, GenerationJob] = {}
+        self._batches: dict[str, GenerationBatch] = {}
+        self._provider_slots: dict[str, asyncio.Semaphore] = {}
+        self._job_slots: Optional[asyncio.Semaphore] = None
+        self._active = 0  # 佔用或等待任務名額、尚未結束的任務數
+        self._subscribers: dict[int, list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """生成流程中阻塞步驟（圖片下載、OCR）使用的執行緒池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.GENERATION_MAX_WORKERS,
+                thread_name_prefix="article-gen",
+            )
+        return self._executor
+
+    @property
+    def job_slots(self) -> asyncio.Semaphore:
+        """同時執行的生成任務名額（GENERATION_MAX_CONCURRENT_JOBS）"""
+        with self._lock:
+            if self._job_slots is None:
+                self._job_slots = asyncio.Semaphore(settings.GENERATION_MAX_CONCURRENT_JOBS)
+            return self._job_slots
+
+    def submit(self, article_id: int, user_id: int, coro: Coroutine, bounded: bool = True) -> GenerationJob:
+        """建立任務並在目前的 event loop 上排程生成協程，立即回傳（不等待完成）
+
+        bounded=True 時協程取得任務名額後才開始執行；只追蹤遠端進度的協程（Celery worker 執行）傳 False
+        """
+        job = GenerationJob(article_id, user_id)
+        with self._lock:
+            self._prune()
+            self._jobs[article_id] = job
+            if bounded:
+                self._active += 1
+            # 排在此任務之前（含自己）等待名額的任務數，0 表示立即開始
+            waiting = max(0, self._active - settings.GENERATION_MAX_CONCURRENT_JOBS) if bounded else 0
+        self.report(article_id, "queued", queue_depth=self.queue_depth, waiting=waiting)
+        job.future = asyncio.get_running_loop().create_task(
+            self._run_bounded(coro) if bounded else coro, name=f"article-gen-{article_id}",
+        )
+        job.future.add_done_callback(lambda t: self._finalize(article_id, t))
+        if bounded:
+            job.future.add_done_callback(lambda _t: self._release_active(coro))
+        return job
+
+    async def _run_bounded(self, coro: Coroutine):
+        """取得任務名額後才執行生成協程"""
+        async with self.job_slots:
+            return await coro
+
+    def _release_active(self, coro: Coroutine):
+        """任務結束：名額計數減一；等待名額時就被取消的任務，其生成協程從未開始，在此關閉"""
+        with self._lock:
+            self._active -= 1
+        coro.close()
+
+    def _finalize(self, article_id: int, task: asyncio.Task):
+        """兜底：任務協程結束卻未回報結束階段時（如錯誤處理本身失敗、被取消），標記為 failed"""
+        job = self.get(article_id)
+        if job is None or job.done:
+            return
+        exc = asyncio.CancelledError("任務已取消") if task.cancelled() else task.exception()
+        if exc is not None:
+            logger.error(f"文章 {article_id} 生成任務異常結束: {exc}")
+        self.report(article_id, "failed", error=str(exc)[:200] if exc else "任務未回報完成狀態")
+
+    def provider_slot(self, model: str) -> asyncio.Semaphore:
+        """取得模型所屬供應商的並行額度（async with 區塊內佔用一個名額）"""
+        from app.services.gemini_utils import is_anthropic_model
+
+        provider = "anthropic" if is_anthropic_model(model) else "google"
+        with self._lock:
+            slot = self._provider_slots.get(provider)
+            if slot is None:
+                limit = (settings.GENERATION_ANTHROPIC_CONCURRENCY if provider == "anthropic"
+                         else settings.GENERATION_GEMINI_CONCURRENCY)
+                slot = asyncio.Semaphore(limit)
+                self._provider_slots[provider] = slot
+        return slot
+
+    def create_batch(self, user_id: int, article_ids: list[int]) -> GenerationBatch:
+        batch = GenerationBatch(user_id, article_ids)
+        with self._lock:
+            self._batches[batch.batch_id] = batch
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[GenerationBatch]:
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    def get(self, article_id: int) -> Optional[GenerationJob]:
+        with self._lock:
+            return self._jobs.get(article_id)
+
+    @property
+    def queue_depth(self) -> int:
+        """尚未完成的任務數（含執行中）"""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if not j.done)
+
+    async def wait(self, job: GenerationJob):
+        """等待任務完成（shield：等待端斷線被取消時不會連帶取消生成）"""
+        if job.future is not None:
+            await asyncio.shield(job.future)
+
+    def report(self, article_id: int, stage: str, **data):
+        """回報階段轉換（可從任意執行緒呼叫）"""
+        with self._lock:
+            job = self._jobs.get(article_id)
+            if job is None or job.done:
+                return
+            job.stage = stage
+            if stage in TERMINAL_STAGES:
+                job.finished_at = time.time()
+                # 完整內容已寫入 DB，釋放串流片段只保留階段紀錄
+                job.events = [e for e in job.events if e["type"] == "stage"]
+                job.delta_chars = 0
+            self._publish_locked(job, {"type": "stage", "stage": stage, **data})
+            if stage in TERMINAL_STAGES:
+                # 沒有新任務提交時也要釋放過期任務
+                self._prune()
+
+    def publish(self, article_id: int, event_type: str, **data):
+        """發佈非階段事件（如串流模式的 delta / reset），可從任意執行緒呼叫"""
+        with self._lock:
+            job = self._jobs.get(article_id)
+            if job is None or job.done:
+                return
+            if event_type == "reset":
+                # 串流從頭重試：先前的片段已作廢，不必再重播
+                job.events = [e for e in job.events if e["type"] not in ("delta", "truncated")]
+                job.delta_chars = 0
+            self._publish_locked(job, {"type": event_type, **data})
+            if event_type == "delta":
+                job.delta_chars += len(data.get("text") or "")
+                self._cap_deltas_locked(job)
+
+    @staticmethod
+    def _event(job: GenerationJob, event: dict) -> dict:
+        return {
+            **event,
+            "article_id": job.article_id,
+            "job_id": job.job_id,
+            "elapsed": round(time.time() - job.created_at, 1),
+        }
+
+    def _cap_deltas_locked(self, job: GenerationJob):
+        """重播用的 delta 超過 GENERATION_DELTA_BACKLOG_CHARS 時丟棄最早的片段，原位置改為 truncated 事件"""
+        while job.delta_chars > settings.GENERATION_DELTA_BACKLOG_CHARS:
+            idx = next(i for i, e in enumerate(job.events) if e["type"] == "delta")
+            dropped = len(job.events.pop(idx).get("text") or "")
+            job.delta_chars -= dropped
+            if idx > 0 and job.events[idx - 1]["type"] == "truncated":
+                job.events[idx - 1]["dropped_chars"] += dropped
+            else:
+                job.events.insert(idx, self._event(job, {"type": "truncated", "dropped_chars": dropped}))
+
+    def _publish_locked(self, job: GenerationJob, event: dict):
+        event = self._event(job, event)
+        job.events.append(event)
+        for loop, queue in self._subscribers.get(job.article_id, []):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # 訂閱者的 event loop 已關閉
+                pass
+
+    async def stream(self, article_id: int, heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """訂閱任務事件：先重播歷史事件，再即時推送，直到結束階段
+
+        超過 heartbeat 秒無事件時 yield None（供 SSE 送 keep-alive）
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            job = self._jobs.get(article_id)
+            if job is None:
+                return
+            backlog = list(job.events)
+            subscribed = not job.done
+            if subscribed:
+                self._subscribers.setdefault(article_id, []).append((loop, queue))
+
+        try:
+            for event in backlog:
+                yield event
+            if not subscribed:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["type"] == "stage" and event["stage"] in TERMINAL_STAGES:
+                    return
+        finally:
+            if subscribed:
+                with self._lock:
+                    subs = self._subscribers.get(article_id, [])
+                    if (loop, queue) in subs:
+                        subs.remove((loop, queue))
+                    if not subs:
+                        self._subscribers.pop(article_id, None)
+
+    def _prune(self):
+        """清除超過 TTL 的已完成任務與批次（呼叫端需持有鎖）"""
+        cutoff = time.time() - settings.GENERATION_JOB_TTL
+        expired = [aid for aid, j in self._jobs.items() if j.done and j.finished_at < cutoff]
+        for aid in expired:
+            del self._jobs[aid]
+        expired_batches = [
+            bid for bid, b in self._batches.items()
+            if b.created_at < cutoff and not any(aid in self._jobs for aid in b.article_ids)
+        ]
+        for bid in expired_batches:
+            del self._batches[bid]
+
+
+def build_error_report(
+    e: Exception,
+    tb: str,
+    elapsed: float,
+    *,
+    model: str,
+    article_type: str,
+    target_forum: str,
+    include_images: bool,
+    image_sources: list[str],
+    prompt_template_id: Optional[int],
+    product_ids: list[int],
+    products_map: dict,
+) -> str:
+    """組裝生成失敗的詳細錯誤報告（寫入失敗文章的 content，供使用者回報問題）"""
+    product_names = []
+    for pid in product_ids:
+        p = products_map.get(pid)
+        product_names.append(f"  - [{pid}] {p.name[:40] if p else '(查無商品)'}")
+
+    retry_info = ""
+    if hasattr(e, "__cause__") and hasattr(e.__cause__, "retry_history"):
+        retry_info = "\n".join(f"  {r}" for r in e.__cause__.retry_history)
+    elif hasattr(e, "retry_history"):
+        retry_info = "\n".join(f"  {r}" for r in e.retry_history)
+
+    error_report = (
+        f"[錯誤報告]\n"
+        f"錯誤類型: {type(e).__name__}\n"
+        f"錯誤訊息: {str(e)}\n"
+        f"\n"
+        f"[請求參數]\n"
+        f"模型: {model}\n"
+        f"文章類型: {article_type}\n"
+        f"目標看板: {target_forum}\n"
+        f"附圖模式: {'是' if include_images else '否'}\n"
+        f"圖片來源: {image_sources}\n"
+        f"範本 ID: {prompt_template_id or '預設'}\n"
+        f"耗時: {elapsed}s\n"
+        f"\n"
+        f"[商品列表] ({len(product_ids)} 件)\n"
+        f"{chr(10).join(product_names)}\n"
+    )
+    if retry_info:
+        error_report += f"\n[重試紀錄]\n{retry_info}\n"
+    error_report += f"\n[完整 Traceback]\n{tb}"
+    return error_report
+
+
+def mark_article_failed(db, article_id: int, e: Exception, error_report: str):
+    """將生成中的文章標記為 failed，內容改為錯誤報告"""
+    from app.models.article import Article
+
+    # 失敗可能發生在 commit 途中，先丟棄未完成的變更
+    db.rollback()
+    article = db.query(Article).filter(Article.id == article_id).first()
+    if article:
+        article.status = "failed"
+        article.title = f"生成失敗：{str(e)[:100]}"
+        article.content = error_report
+        db.commit()
+
+
+# 單例
+generation_jobs = GenerationJobManager()
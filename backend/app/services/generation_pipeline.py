@@ -0,0 +1,76 @@
+"""
+文章生成流水線 — 以小型 DAG 描述生成階段與相依關係，相依完成的階段立即並行執行
+
+agenerate_article 的階段（箭頭為相依）：
+
+    template（載入範本，DB）──┐
+    keywords（關鍵字策略文字）┤
+    images（圖片下載）────────┼──→ llm（先做 token 預算 budget 並組合商品資料，再呼叫 LLM）
+    ocr（Claude 讀圖，隨圖片到達逐組開始）┘
+
+- 每個階段是 async 函式，參數為目前已完成階段的結果 dict，回傳值存為該階段結果
+- 階段開始時間與耗時記錄在 timings（相對於流水線開始的毫秒數），供寫入 Article.generation_timings
+- 任一階段失敗時取消其餘階段並拋出原例外
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+StageFn = Callable[[dict], Awaitable[Any]]
+
+
+class Pipeline:
+    """生成階段 DAG（單次使用）"""
+
+    def __init__(self):
+        self._stages: dict[str, tuple[StageFn, tuple[str, ...]]] = {}
+        self.started = time.perf_counter()
+        self.results: dict[str, Any] = {}
+        self.timings: dict[str, dict] = {}
+
+    def add(self, name: str, fn: StageFn, deps: Iterable[str] = ()):
+        """加入階段；相依的階段必須先加入（順序即為 DAG 的拓撲順序）"""
+        deps = tuple(deps)
+        missing = [d for d in deps if d not in self._stages]
+        if name in self._stages or missing:
+            raise ValueError(f"階段 {name} 重複或相依未定義: {missing}")
+        self._stages[name] = (fn, deps)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    async def run(self) -> dict[str, Any]:
+        self.started = time.perf_counter()
+        tasks: dict[str, asyncio.Task] = {}
+        for name, (fn, deps) in self._stages.items():
+            tasks[name] = asyncio.ensure_future(self._run_stage(name, fn, [tasks[d] for d in deps]))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return self.results
+
+    def record(self, name: str, started: float, **data):
+        """記錄一個階段的時間（流水線外的階段如 SEO 分析也可用同一格式記錄）"""
+        self.timings[name] = {
+            "start_ms": round((started - self.started) * 1000),
+            "duration_ms": round((time.perf_counter() - started) * 1000),
+            **data,
+        }
+
+    def elapsed_ms(self) -> int:
+        return round((time.perf_counter() - self.started) * 1000)
+
+    async def _run_stage(self, name: str, fn: StageFn, deps: list[asyncio.Task]):
+        if deps:
+            await asyncio.gather(*deps)
+        started = time.perf_counter()
+        try:
+            self.results[name] = await fn(self.results)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(name, started, failed=True)
+            raise
+        self.record(name, started)
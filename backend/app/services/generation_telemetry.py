@@ -0,0 +1,320 @@
+"""
+文章生成遙測 — 每次生成記錄各階段耗時、圖片 / OCR / LLM 細節、token 與重試次數，寫入 generation_telemetry
+
+- 背景任務以 start() 建立本次生成的 GenerationTrace（存於 contextvar），
+  生成流程各處以 note_*() 回報，沒有進行中的 trace 時（如同步 API）為 no-op；
+  Celery chain 的各步驟以 export() / restore() 接續同一筆 trace
+- asyncio task 會繼承 contextvar；丟到執行緒池的工作需經 run_in_executor() 才看得到 trace
+- token 由 track_gemini_usage / track_anthropic_usage 回報，含 OCR 等輔助呼叫，依模型分開統計
+- 生成前的 token 預算（見 prompt_budget）記入 details.prompt，寫入時附上生成模型實際的每次 input token 供對照
+- summarize() 依模型彙總總耗時 / TTFB / LLM / 各階段的百分位數，供管理員找出生成時間花在哪裡
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.utils.timezone import taipei_now
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["GenerationTrace"]] = contextvars.ContextVar(
+    "generation_trace", default=None,
+)
+
+# summarize() 計算的百分位數
+PERCENTILES = (50, 90, 99)
+
+
+class GenerationTrace:
+    """單次文章生成的遙測資料（可從多個執行緒回報）"""
+
+    def __init__(self, article_id: Optional[int], user_id: Optional[int], model: str):
+        self.article_id = article_id
+        self.user_id = user_id
+        self.model = model
+        self.started = time.perf_counter()
+        self.stages: dict[str, dict] = {}
+        self.tokens: dict[str, dict] = {}
+        self.images: dict = {}
+        self.ocr: dict = {}
+        self.llm: dict = {}
+        self.prompt: dict = {}
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def stage(self, name: str, started: float, **data):
+        """記錄一個階段（started 為 time.perf_counter()）"""
+        with self._lock:
+            self.stages[name] = {
+                "start_ms": round((started - self.started) * 1000),
+                "duration_ms": round((time.perf_counter() - started) * 1000),
+                **data,
+            }
+
+    def elapsed_ms(self) -> int:
+        return round((time.perf_counter() - self.started) * 1000)
+
+    def export(self) -> dict:
+        """序列化（JSON），供跨程序的 Celery chain 在步驟間傳遞"""
+        with self._lock:
+            return {
+                "model": self.model,
+                "stages": dict(self.stages),
+                "tokens": {model: dict(t) for model, t in self.tokens.items()},
+                "images": dict(self.images),
+                "ocr": dict(self.ocr),
+                "llm": dict(self.llm),
+                "prompt": dict(self.prompt),
+                "retries": self.retries,
+            }
+
+    def restore(self, data: dict, started_at: float):
+        """接續前一個步驟 export() 的資料；started_at 為整個生成開始的 time.time()（跨程序共用的時間基準）"""
+        self.started = time.perf_counter() - (time.time() - started_at)
+        with self._lock:
+            self.model = data.get("model") or self.model
+            self.stages.update(data.get("stages") or {})
+            self.tokens.update(data.get("tokens") or {})
+            self.images.update(data.get("images") or {})
+            self.ocr.update(data.get("ocr") or {})
+            self.llm.update(data.get("llm") or {})
+            self.prompt.update(data.get("prompt") or {})
+            self.retries += data.get("retries") or 0
+
+
+class GenerationTelemetryService:
+    """生成遙測（單例）"""
+
+    # ── 生成流程回報（沒有 trace 時為 no-op）──
+
+    def start(self, article_id: Optional[int], user_id: Optional[int], model: str) -> GenerationTrace:
+        trace = GenerationTrace(article_id, user_id, model)
+        _current_trace.set(trace)
+        return trace
+
+    @staticmethod
+    def current() -> Optional[GenerationTrace]:
+        return _current_trace.get()
+
+    @staticmethod
+    def clear():
+        """結束目前的 trace（Celery worker 重複使用同一個執行緒執行下一個任務，不能沿用上一篇文章的 trace）"""
+        _current_trace.set(None)
+
+    @staticmethod
+    async def run_in_executor(executor, fn, *args):
+        """在執行緒池執行 fn，並帶入目前的 contextvar（讓執行緒內的用量回報記到同一個 trace）"""
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(executor, ctx.run, fn, *args)
+
+    def note_stages(self, started: float, timings: dict[str, dict]):
+        """併入生成流水線的階段時間（started 為流水線開始的 time.perf_counter()）"""
+        trace = self.current()
+        if trace is None:
+            return
+        offset_ms = round((started - trace.started) * 1000)
+        with trace._lock:
+            for name, timing in timings.items():
+                trace.stages[name] = {**timing, "start_ms": timing["start_ms"] + offset_ms}
+
+    def note_usage(self, model: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
+        trace = self.current()
+        if trace is None:
+            return
+        with trace._lock:
+            t = trace.tokens.setdefault(model, {"requests": 0, "input": 0, "output": 0, "cache_read": 0, "cache_write": 0})
+            t["requests"] += 1
+            t["input"] += input_tokens
+            t["output"] += output_tokens
+            t["cache_read"] += cache_read_tokens
+            t["cache_write"] += cache_write_tokens
+
+    def note_llm_call(self, model: str, ttfb: float, total: float, hedged: bool = False):
+        """成功的 LLM 呼叫（秒）；重試 / 備援時以最後成功的那次為準"""
+        trace = self.current()
+        if trace is None:
+            return
+        with trace._lock:
+            trace.model = model
+            trace.llm.update(model=model, ttfb_ms=round(ttfb * 1000), llm_ms=round(total * 1000), hedged=hedged)
+
+    def note_llm_event(self, **data):
+        """LLM 階段的其他資訊（cached / coalesced / failover_from）"""
+        trace = self.current()
+        if trace is None:
+            return
+        with trace._lock:
+            if data.get("model"):
+                trace.model = data["model"]
+            trace.llm.update({k: v for k, v in data.items() if v is not None})
+
+    def note_prompt(self, **data):
+        """生成前的 token 預算：budget / initial（裁減前估算）/ estimated（裁減後）/ source / trimmed"""
+        trace = self.current()
+        if trace is None:
+            return
+        with trace._lock:
+            trace.prompt.update(data)
+
+    def note_retries(self, count: int):
+        trace = self.current()
+        if trace is None or not count:
+            return
+        with trace._lock:
+            trace.retries += count
+
+    def note_images(self, urls: int, parts: int, size: int):
+        trace = self.current()
+        if trace is None:
+            return
+        with trace._lock:
+            trace.images.update(urls=urls, parts=parts, bytes=size)
+
+    def note_ocr(self, images: int, requests: int, cache_hits: int):
+        trace = self.current()
+        if trace is None:
+            return
+        with trace._lock:
+            trace.ocr.update(images=images, requests=requests, cache_hits=cache_hits)
+
+    # ── 寫入 / 查詢 ──
+
+    def save(self, db: Session, trace: GenerationTrace, status: str, error: Optional[BaseException] = None):
+        """寫入一筆遙測紀錄（失敗只記 log，不影響生成結果）"""
+        if not settings.GENERATION_TELEMETRY_ENABLED:
+            return
+        from app.models.generation_telemetry import GenerationTelemetry
+
+        with trace._lock:
+            tokens = {model: dict(t) for model, t in trace.tokens.items()}
+            details = {"images": trace.images, "ocr": trace.ocr, "llm": trace.llm, "tokens": tokens}
+            if trace.prompt:
+                details["prompt"] = {**trace.prompt, "actual": _prompt_tokens(tokens.get(trace.model))}
+            stages = dict(trace.stages)
+        if error is not None:
+            cause = error.__cause__ or error
+            details["error"] = {"type": type(cause).__name__, "message": str(cause)[:300]}
+        try:
+            db.add(GenerationTelemetry(
+                article_id=trace.article_id,
+                user_id=trace.user_id,
+                model=trace.model,
+                status=status,
+                total_ms=trace.elapsed_ms(),
+                ttfb_ms=trace.llm.get("ttfb_ms"),
+                llm_ms=trace.llm.get("llm_ms"),
+                input_tokens=sum(t["input"] for t in tokens.values()),
+                output_tokens=sum(t["output"] for t in tokens.values()),
+                cache_read_tokens=sum(t["cache_read"] for t in tokens.values()),
+                retries=trace.retries,
+                stages=stages,
+                details=details,
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"文章 {trace.article_id} 生成遙測寫入失敗（略過）: {e}")
+
+    def summarize(self, db: Session, days: int = 7, model: Optional[str] = None, limit: int = 5000) -> dict:
+        """近 days 天（最多 limit 筆）依模型彙總：次數、失敗率、重試、token 平均與各耗時百分位數"""
+        from app.models.generation_telemetry import GenerationTelemetry
+
+        query = db.query(
+            GenerationTelemetry.model,
+            GenerationTelemetry.status,
+            GenerationTelemetry.total_ms,
+            GenerationTelemetry.ttfb_ms,
+            GenerationTelemetry.llm_ms,
+            GenerationTelemetry.input_tokens,
+            GenerationTelemetry.output_tokens,
+            GenerationTelemetry.retries,
+            GenerationTelemetry.stages,
+        ).filter(GenerationTelemetry.created_at >= taipei_now() - timedelta(days=days))
+        if model:
+            query = query.filter(GenerationTelemetry.model == model)
+        rows = query.order_by(GenerationTelemetry.created_at.desc()).limit(limit).all()
+
+        groups: dict[str, list] = {}
+        for row in rows:
+            groups.setdefault(row.model, []).append(row)
+
+        models = {}
+        for name, group in sorted(groups.items()):
+            ok = [r for r in group if r.status == "success"]
+            stage_samples: dict[str, list[int]] = {}
+            for r in ok:
+                for stage, timing in (r.stages or {}).items():
+                    if isinstance(timing, dict) and timing.get("duration_ms") is not None:
+                        stage_samples.setdefault(stage, []).append(timing["duration_ms"])
+            models[name] = {
+                "count": len(group),
+                "failed": len(group) - len(ok),
+                "retries": sum(r.retries or 0 for r in group),
+                "total_ms": _percentiles([r.total_ms for r in ok]),
+                "ttfb_ms": _percentiles([r.ttfb_ms for r in ok]),
+                "llm_ms": _percentiles([r.llm_ms for r in ok]),
+                "stages_ms": {stage: _percentiles(samples) for stage, samples in sorted(stage_samples.items())},
+                "avg_input_tokens": _mean([r.input_tokens for r in ok]),
+                "avg_output_tokens": _mean([r.output_tokens for r in ok]),
+            }
+        return {"days": days, "samples": len(rows), "models": models}
+
+    @staticmethod
+    def for_article(db: Session, article_id: int) -> list[dict]:
+        """單篇文章的所有生成紀錄（重新生成會有多筆）"""
+        from app.models.generation_telemetry import GenerationTelemetry
+
+        records = db.query(GenerationTelemetry).filter(
+            GenerationTelemetry.article_id == article_id,
+        ).order_by(GenerationTelemetry.created_at).all()
+        return [
+            {
+                "id": r.id,
+                "model": r.model,
+                "status": r.status,
+                "total_ms": r.total_ms,
+                "ttfb_ms": r.ttfb_ms,
+                "llm_ms": r.llm_ms,
+                "input_tokens": r.input_tokens,
+                "output_tokens": r.output_tokens,
+                "cache_read_tokens": r.cache_read_tokens,
+                "retries": r.retries,
+                "stages": r.stages,
+                "details": r.details,
+                "created_at": r.created_at,
+            }
+            for r in records
+        ]
+
+
+def _percentiles(values: list) -> Optional[dict]:
+    """最近秩法百分位數，無樣本時回傳 None"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    result = {f"p{p}": values[min(len(values) - 1, max(0, -(-len(values) * p // 100) - 1))] for p in PERCENTILES}
+    result["max"] = values[-1]
+    return result
+
+
+def _prompt_tokens(usage: Optional[dict]) -> Optional[int]:
+    """生成模型每次呼叫的實際輸入 token（含快取讀寫部分，與預算估算同口徑）"""
+    if not usage or not usage["requests"]:
+        return None
+    return round((usage["input"] + usage["cache_read"] + usage["cache_write"]) / usage["requests"])
+
+
+def _mean(values: list) -> Optional[int]:
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values)) if values else None
+
+
+# 單例
+generation_telemetry = GenerationTelemetryService()
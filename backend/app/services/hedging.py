@@ -0,0 +1,93 @@
+"""
+LLM 對沖請求（hedged requests）策略 — 依模型近期延遲決定何時送出第二個相同請求
+
+- 每個 (model, 模式) 保留最近 LLM_HEDGE_SAMPLE_SIZE 次呼叫的「首次輸出延遲」
+  （串流模式為第一個文字片段，非串流為完整回應）
+- 呼叫超過該分佈的 LLM_HEDGE_PERCENTILE 仍無輸出時，送出對沖請求，先產生輸出者勝出
+- 對沖數量受 LLM_HEDGE_BUDGET_RATIO 限制（最近 LLM_HEDGE_BUDGET_WINDOW 秒內對沖數 / 請求數），
+  避免供應商整體變慢時所有請求都加倍
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HedgePolicy:
+    """對沖策略（執行緒安全，單例）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: dict[tuple[str, str], deque[float]] = {}
+        self._requests: deque[float] = deque()
+        self._hedges: deque[float] = deque()
+        self._hedge_wins = 0
+
+    def record_latency(self, model: str, mode: str, seconds: float):
+        """記錄一次成功呼叫的首次輸出延遲（mode: "stream" / "full"）"""
+        with self._lock:
+            samples = self._latencies.get((model, mode))
+            if samples is None or samples.maxlen != settings.LLM_HEDGE_SAMPLE_SIZE:
+                samples = deque(samples or (), maxlen=settings.LLM_HEDGE_SAMPLE_SIZE)
+                self._latencies[(model, mode)] = samples
+            samples.append(seconds)
+
+    def hedge_delay(self, model: str, mode: str) -> Optional[float]:
+        """應在幾秒後送出對沖請求；未啟用或樣本不足時回傳 None"""
+        if not settings.LLM_HEDGE_ENABLED:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get((model, mode), ()))
+        if len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        idx = min(len(samples) - 1, int(len(samples) * settings.LLM_HEDGE_PERCENTILE))
+        return max(samples[idx], settings.LLM_HEDGE_MIN_DELAY)
+
+    def note_request(self):
+        with self._lock:
+            self._requests.append(time.time())
+            self._trim()
+
+    def try_acquire(self) -> bool:
+        """在預算內時佔用一次對沖額度"""
+        with self._lock:
+            self._trim()
+            if len(self._hedges) + 1 > len(self._requests) * settings.LLM_HEDGE_BUDGET_RATIO:
+                return False
+            self._hedges.append(time.time())
+            return True
+
+    def note_hedge_win(self):
+        with self._lock:
+            self._hedge_wins += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            self._trim()
+            latencies = {f"{model}/{mode}": len(s) for (model, mode), s in self._latencies.items()}
+            requests, hedges, wins = len(self._requests), len(self._hedges), self._hedge_wins
+        return {
+            "enabled": settings.LLM_HEDGE_ENABLED,
+            "window_requests": requests,
+            "window_hedges": hedges,
+            "hedge_wins_total": wins,
+            "samples": latencies,
+            "delays": {
+                key: self.hedge_delay(*key.rsplit("/", 1)) for key in latencies
+            },
+        }
+
+    def _trim(self):
+        cutoff = time.time() - settings.LLM_HEDGE_BUDGET_WINDOW
+        for q in (self._requests, self._hedges):
+            while q and q[0] < cutoff:
+                q.popleft()
+
+
+# 單例
+hedge_policy = HedgePolicy()
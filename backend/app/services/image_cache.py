@@ -0,0 +1,320 @@
+"""
+商品圖片本地快取 — 內容定址（URL → sha256 → 檔案）+ LRU 容量上限 + ETag/Last-Modified 重新驗證
+
+目錄結構：
+    {IMAGE_CACHE_DIR}/meta/{sha256(url)}.json   URL 對應的中繼資料（內容雜湊、ETag、抓取時間）
+    {IMAGE_CACHE_DIR}/blobs/{hh}/{sha256(內容)}  圖片內容（相同內容只存一份）
+    {IMAGE_CACHE_DIR}/normalized/{sha256(內容)}-{參數版本}/  LLM 前處理結果（見 image_preprocess，隨 blob 淘汰）
+
+LRU 以 blob 檔案 mtime 表示最近使用時間，每次讀取時更新。
+只快取圖片：回應超過 IMAGE_CACHE_MAX_IMAGE_BYTES，或既非 image/* 也無法由內容辨識為圖片時拋出 ImageRejected。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path: Path, data: bytes):
+    """先寫暫存檔再 rename，避免並行讀取到寫一半的檔案"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+# 常見圖片格式的檔頭（content-type 不可靠時以內容辨識）
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+class ImageRejected(ValueError):
+    """回應不是圖片或超過大小上限，不寫入快取"""
+
+
+def sniff_image_type(content: bytes) -> Optional[str]:
+    """依檔頭辨識圖片格式，無法辨識時回傳 None"""
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in IMAGE_SIGNATURES:
+        if content.startswith(signature):
+            return content_type
+    return None
+
+
+class CachedImage:
+    """快取命中的圖片內容"""
+
+    def __init__(self, content: bytes, content_type: str, digest: str):
+        self.content = content
+        self.content_type = content_type
+        self.digest = digest  # 內容 sha256，可作為下游快取鍵
+
+
+class ImageCache:
+    """圖片磁碟快取（執行緒安全，單例）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self._storing: set[str] = set()  # 寫入中的 blob（並行存入相同內容時只計一次容量）
+        self._evicting = False
+
+    @property
+    def root(self) -> Path:
+        return settings.IMAGE_CACHE_DIR
+
+    # ── 公開方法 ──
+
+    def get(self, url: str, client: Optional[httpx.Client] = None) -> CachedImage:
+        """取得圖片（同步）：新鮮快取直接回傳，過期則條件式請求重新驗證
+
+        下載失敗時若有舊快取則回傳舊內容，否則拋出 httpx 例外；回應不是圖片或過大時拋出 ImageRejected
+        """
+        meta, cached = self._lookup(url)
+        if cached:
+            return cached
+
+        headers = self._conditional_headers(meta)
+        try:
+            if client is None:
+                with httpx.Client(timeout=10.0) as own_client:
+                    resp, content = self._fetch(own_client, url, headers)
+            else:
+                resp, content = self._fetch(client, url, headers)
+            return self._handle_response(url, meta, resp, content)
+        except httpx.HTTPError as e:
+            if meta:
+                logger.warning(f"圖片重新驗證失敗，使用舊快取: {url[:80]}... - {e}")
+                return self._read(meta)
+            raise
+
+    async def aget(self, url: str, client: Optional[httpx.AsyncClient] = None) -> CachedImage:
+        """取得圖片（非同步版本，行為同 get；磁碟讀寫與淘汰在執行緒執行，不佔用 event loop）"""
+        meta, cached = await asyncio.to_thread(self._lookup, url)
+        if cached:
+            return cached
+
+        headers = self._conditional_headers(meta)
+        try:
+            if client is None:
+                async with httpx.AsyncClient(timeout=15.0) as own_client:
+                    resp, content = await self._afetch(own_client, url, headers)
+            else:
+                resp, content = await self._afetch(client, url, headers)
+            return await asyncio.to_thread(self._handle_response, url, meta, resp, content)
+        except httpx.HTTPError as e:
+            if meta:
+                logger.warning(f"圖片重新驗證失敗，使用舊快取: {url[:80]}... - {e}")
+                return await asyncio.to_thread(self._read, meta)
+            raise
+
+    # ── 內部方法 ──
+
+    @staticmethod
+    def _url_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, url: str) -> Path:
+        return self.root / "meta" / f"{self._url_key(url)}.json"
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def _lookup(self, url: str) -> tuple[Optional[dict], Optional[CachedImage]]:
+        """回傳 (meta, 新鮮快取內容)；沒有快取或已過期時內容為 None"""
+        meta = self._load_meta(url)
+        if meta and self._is_fresh(meta):
+            return meta, self._read(meta)
+        return meta, None
+
+    @staticmethod
+    def _check_length(resp: httpx.Response):
+        length = resp.headers.get("content-length")
+        if length and length.isdigit() and int(length) > settings.IMAGE_CACHE_MAX_IMAGE_BYTES:
+            raise ImageRejected(f"圖片過大（{int(length)} bytes）")
+
+    @staticmethod
+    def _append_chunk(chunks: list[bytes], size: int, chunk: bytes) -> int:
+        size += len(chunk)
+        if size > settings.IMAGE_CACHE_MAX_IMAGE_BYTES:
+            raise ImageRejected(f"圖片超過 {settings.IMAGE_CACHE_MAX_IMAGE_BYTES} bytes")
+        chunks.append(chunk)
+        return size
+
+    def _fetch(self, client: httpx.Client, url: str, headers: dict) -> tuple[httpx.Response, bytes]:
+        """串流下載，超過 IMAGE_CACHE_MAX_IMAGE_BYTES 立即中止"""
+        with client.stream("GET", url, headers=headers) as resp:
+            chunks, size = [], 0
+            if resp.status_code == 200:
+                self._check_length(resp)
+                for chunk in resp.iter_bytes():
+                    size = self._append_chunk(chunks, size, chunk)
+        return resp, b"".join(chunks)
+
+    async def _afetch(self, client: httpx.AsyncClient, url: str, headers: dict) -> tuple[httpx.Response, bytes]:
+        async with client.stream("GET", url, headers=headers) as resp:
+            chunks, size = [], 0
+            if resp.status_code == 200:
+                self._check_length(resp)
+                async for chunk in resp.aiter_bytes():
+                    size = self._append_chunk(chunks, size, chunk)
+        return resp, b"".join(chunks)
+
+    def _load_meta(self, url: str) -> Optional[dict]:
+        path = self._meta_path(url)
+        try:
+            meta = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        # blob 已被 LRU 淘汰 → 視為未命中
+        if not self._blob_path(meta["digest"]).exists():
+            path.unlink(missing_ok=True)
+            return None
+        return meta
+
+    @staticmethod
+    def _is_fresh(meta: dict) -> bool:
+        return time.time() - meta.get("fetched_at", 0) < settings.IMAGE_CACHE_FRESH_SECONDS
+
+    @staticmethod
+    def _conditional_headers(meta: Optional[dict]) -> dict:
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def _handle_response(self, url: str, meta: Optional[dict], resp: httpx.Response, content: bytes) -> CachedImage:
+        if resp.status_code == 304 and meta:
+            meta["fetched_at"] = time.time()
+            meta["etag"] = resp.headers.get("etag", meta.get("etag"))
+            self._write_meta(url, meta)
+            return self._read(meta)
+        resp.raise_for_status()
+        return self._store(url, resp, content)
+
+    def _read(self, meta: dict) -> CachedImage:
+        blob = self._blob_path(meta["digest"])
+        content = blob.read_bytes()
+        try:
+            os.utime(blob, None)  # 更新 LRU 使用時間
+        except OSError:
+            pass
+        return CachedImage(content, meta["content_type"], meta["digest"])
+
+    def _store(self, url: str, resp: httpx.Response, content: bytes) -> CachedImage:
+        content_type = resp.headers.get("content-type", "")
+        if not content_type.lower().startswith("image/"):
+            # 部分 CDN 回傳 application/octet-stream：以檔頭辨識，仍無法辨識則拒絕
+            content_type = sniff_image_type(content)
+            if content_type is None:
+                raise ImageRejected(f"回應不是圖片（content-type: {resp.headers.get('content-type')}）")
+        digest = hashlib.sha256(content).hexdigest()
+
+        blob = self._blob_path(digest)
+        with self._lock:
+            # 相同內容正在寫入 / 已存在時不重複寫入與計算容量
+            is_new = digest not in self._storing and not blob.exists()
+            if is_new:
+                self._storing.add(digest)
+        if is_new:
+            try:
+                atomic_write(blob, content)
+                with self._lock:
+                    if self._total_bytes is not None:
+                        self._total_bytes += len(content)
+            finally:
+                with self._lock:
+                    self._storing.discard(digest)
+
+        self._write_meta(url, {
+            "url": url,
+            "digest": digest,
+            "content_type": content_type,
+            "size": len(content),
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+            "fetched_at": time.time(),
+        })
+        if is_new:
+            self._evict_if_needed()
+        return CachedImage(content, content_type, digest)
+
+    def _write_meta(self, url: str, meta: dict):
+        atomic_write(self._meta_path(url), json.dumps(meta).encode("utf-8"))
+
+    def _evict_if_needed(self):
+        """超過 IMAGE_CACHE_MAX_BYTES 時，依最久未使用順序刪除 blob 直到 90% 以下
+
+        目錄掃描不持有鎖（同一時間只有一個執行緒淘汰），其他執行緒的讀寫不必等待
+        """
+        max_bytes = settings.IMAGE_CACHE_MAX_BYTES
+        blobs_dir = self.root / "blobs"
+        with self._lock:
+            if self._evicting:
+                return
+            if self._total_bytes is not None and self._total_bytes <= max_bytes:
+                return
+            self._evicting = True
+        try:
+            entries = []
+            for p in blobs_dir.glob("*/*"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            with self._lock:
+                if self._total_bytes is None:
+                    self._total_bytes = sum(size for _, size, _ in entries)
+                if self._total_bytes <= max_bytes:
+                    return
+            entries.sort()
+
+            target = int(max_bytes * 0.9)
+            removed = 0
+            for _, size, p in entries:
+                with self._lock:
+                    if self._total_bytes <= target:
+                        break
+                    if p.name in self._storing:
+                        continue
+                    self._total_bytes -= size
+                p.unlink(missing_ok=True)
+                removed += 1
+                # 一併清除該圖片的前處理結果（見 image_preprocess）
+                for derived in (self.root / "normalized").glob(f"{p.name}-*"):
+                    shutil.rmtree(derived, ignore_errors=True)
+            logger.info(f"圖片快取淘汰 {removed} 個檔案，目前 {self._total_bytes / 1024 / 1024:.1f} MB")
+        finally:
+            with self._lock:
+                self._evicting = False
+
+
+# 單例
+image_cache = ImageCache()
@@ -0,0 +1,183 @@
+"""
+多模態 LLM 圖片前處理 — 縮圖 + 重新壓縮 + 超長描述圖切片（結果快取於磁碟）
+
+蝦皮描述圖常見 750×15000 以上的長圖，直接送 Gemini 會被整張縮小到看不清文字，
+且原始檔動輒數 MB。前處理後：
+- 一般圖片：最長邊縮到 IMAGE_MAX_EDGE 以內
+- 超長圖片：寬度縮到 IMAGE_MAX_EDGE 以內，再切成高度 IMAGE_MAX_EDGE 的片段（片段間少量重疊避免切斷文字）；
+  超過 IMAGE_MAX_TILES 片時整張再縮小到剛好 IMAGE_MAX_TILES 片（不截掉底部）。
+  切片的估算圖片 token 多於原圖時改為整張縮圖，前處理不會讓圖片 token 變多
+- 統一轉成 IMAGE_NORMALIZE_FORMAT（預設 WEBP）
+
+Pillow 未安裝時自動略過前處理，直接使用原圖。
+"""
+import hashlib
+import io
+import math
+import json
+import logging
+from pathlib import Path
+
+from app.config import settings
+from app.services.image_cache import atomic_write
+from app.services.prompt_budget import GEMINI_IMAGE_SMALL_EDGE, GEMINI_IMAGE_TILE_SIZE, GEMINI_IMAGE_TILE_TOKENS
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - 依部署環境而定
+    Image = None
+    logger.warning("Pillow 未安裝，圖片前處理停用（直接傳送原圖給 LLM）")
+
+# 超長圖判定：高 / 寬 超過此比例才切片
+TALL_RATIO = 2.0
+# 切片間重疊像素（避免文字剛好被切斷）
+TILE_OVERLAP = 48
+
+_MIME_BY_FORMAT = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+def _image_tokens(width: int, height: int) -> int:
+    """Gemini 圖片 token 估算（同 prompt_budget.estimate_image_tokens，以尺寸計算）"""
+    if width <= GEMINI_IMAGE_SMALL_EDGE and height <= GEMINI_IMAGE_SMALL_EDGE:
+        return GEMINI_IMAGE_TILE_TOKENS
+    return math.ceil(width / GEMINI_IMAGE_TILE_SIZE) * math.ceil(height / GEMINI_IMAGE_TILE_SIZE) * GEMINI_IMAGE_TILE_TOKENS
+
+
+class ImagePreprocessor:
+    """圖片前處理器（單例）"""
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and settings.IMAGE_NORMALIZE_ENABLED
+
+    @property
+    def _cache_dir(self) -> Path:
+        return settings.IMAGE_CACHE_DIR / "normalized"
+
+    @staticmethod
+    def _params_version() -> str:
+        params = (
+            f"{settings.IMAGE_MAX_EDGE}:{settings.IMAGE_MAX_TILES}:{settings.IMAGE_NORMALIZE_FORMAT}:"
+            f"{settings.IMAGE_NORMALIZE_QUALITY}:{TALL_RATIO}:{TILE_OVERLAP}"
+        )
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()[:8]
+
+    def normalize(self, img_bytes: bytes, mime_type: str, digest: str | None = None) -> list[tuple[bytes, str]]:
+        """前處理單張圖片，回傳 [(bytes, mime_type), ...]（長圖會切成多片）
+
+        digest: 原圖內容 sha256（圖片快取已算好時傳入），用作前處理結果快取鍵
+        """
+        if not self.enabled:
+            return [(img_bytes, mime_type)]
+
+        digest = digest or hashlib.sha256(img_bytes).hexdigest()
+        key = f"{digest}-{self._params_version()}"
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+
+        try:
+            parts = self._process(img_bytes, mime_type)
+        except Exception as e:
+            logger.warning(f"圖片前處理失敗，使用原圖: {e}")
+            return [(img_bytes, mime_type)]
+
+        self._save(key, parts)
+        return parts
+
+    def _process(self, img_bytes: bytes, mime_type: str) -> list[tuple[bytes, str]]:
+        img = Image.open(io.BytesIO(img_bytes))
+        img.seek(0)  # 動圖只取第一幀
+        width, height = img.size
+        max_edge = settings.IMAGE_MAX_EDGE
+
+        tiles = None
+        if height > width * TALL_RATIO and height > max_edge:
+            tiles = self._tile(img, max_edge)
+            if sum(_image_tokens(*tile.size) for tile in tiles) > _image_tokens(width, height):
+                # 切片反而比原圖多 token：改為整張縮圖
+                tiles = None
+        if tiles is None:
+            scale = min(1.0, max_edge / max(width, height))
+            if scale >= 1.0 and len(img_bytes) <= 512 * 1024:
+                # 已經夠小，重新編碼沒有好處
+                return [(img_bytes, mime_type)]
+            tiles = [self._resize(img, scale)]
+
+        parts = [self._encode(tile) for tile in tiles]
+        if len(parts) == 1 and len(parts[0][0]) >= len(img_bytes):
+            return [(img_bytes, mime_type)]
+        return parts
+
+    @staticmethod
+    def _resize(img, scale: float):
+        if scale >= 1.0:
+            return img
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        return img.resize(size, Image.LANCZOS)
+
+    def _tile(self, img, max_edge: int) -> list:
+        """長圖：寬度縮到 max_edge 內，依高度 max_edge 切片
+
+        超過 IMAGE_MAX_TILES 片時整體縮小到高度剛好放進 IMAGE_MAX_TILES 片，所有片段合起來涵蓋整張圖
+        """
+        step = max_edge - TILE_OVERLAP
+        max_tiles = max(1, settings.IMAGE_MAX_TILES)
+        # n 片最多涵蓋 n * step + TILE_OVERLAP 像素高
+        max_height = max_tiles * step + TILE_OVERLAP
+        # 縮放後高度四捨五入，預留 1px 避免多出一片
+        scale = min(1.0, max_edge / img.width, (max_height - 1) / img.height)
+        img = self._resize(img, scale)
+
+        tiles = []
+        top = 0
+        while True:
+            bottom = min(top + max_edge, img.height)
+            tiles.append(img.crop((0, top, img.width, bottom)))
+            if bottom >= img.height:
+                return tiles
+            top += step
+
+    @staticmethod
+    def _encode(img) -> tuple[bytes, str]:
+        fmt = settings.IMAGE_NORMALIZE_FORMAT.upper()
+        if img.mode in ("RGBA", "LA", "P"):
+            # 透明背景合成白底（JPEG 不支援透明，WEBP 去除 alpha 也較小）
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=settings.IMAGE_NORMALIZE_QUALITY)
+        return buf.getvalue(), _MIME_BY_FORMAT.get(fmt, "image/jpeg")
+
+    # ── 磁碟快取 ──
+
+    def _load(self, key: str) -> list[tuple[bytes, str]] | None:
+        manifest = self._cache_dir / key / "manifest.json"
+        try:
+            entries = json.loads(manifest.read_text(encoding="utf-8"))
+            return [((manifest.parent / e["file"]).read_bytes(), e["mime_type"]) for e in entries]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: str, parts: list[tuple[bytes, str]]):
+        directory = self._cache_dir / key
+        try:
+            entries = []
+            for i, (data, mime_type) in enumerate(parts):
+                name = f"{i}.bin"
+                atomic_write(directory / name, data)
+                entries.append({"file": name, "mime_type": mime_type})
+            # manifest 最後寫入，存在即代表所有片段完整
+            atomic_write(directory / "manifest.json", json.dumps(entries).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"圖片前處理結果快取寫入失敗（略過）: {e}")
+
+
+# 單例
+image_preprocessor = ImagePreprocessor()
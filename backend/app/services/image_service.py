@@ -10,6 +10,7 @@ import httpx
 
 from app.config import settings
 from app.models.product_image import ProductImage
+from app.services.image_cache import image_cache
 
 logger = logging.getLogger(__name__)
 
@@ -42,12 +43,11 @@ class ImageService:
                     if existing and existing.local_path and Path(existing.local_path).exists():
                         continue
 
-                    # 下載圖片
-                    response = await client.get(url)
-                    response.raise_for_status()
+                    # 下載圖片（經由本地圖片快取）
+                    cached = await image_cache.aget(url, client)
 
                     ext = ".jpg"
-                    content_type = response.headers.get("content-type", "")
+                    content_type = cached.content_type
                     if "png" in content_type:
                         ext = ".png"
                     elif "webp" in content_type:
@@ -56,7 +56,7 @@ class ImageService:
                     filename = f"{img_type}_{idx}{ext}"
                     filepath = product_dir / filename
 
-                    filepath.write_bytes(response.content)
+                    filepath.write_bytes(cached.content)
 
                     # 記錄到資料庫
                     if existing:
@@ -119,9 +119,8 @@ class ImageService:
                         if local_record and local_record.local_path and Path(local_record.local_path).exists():
                             zf.write(local_record.local_path, f"{marker.replace(':', '_')}.jpg")
                         else:
-                            response = await client.get(url)
-                            response.raise_for_status()
-                            zf.writestr(f"{marker.replace(':', '_')}.jpg", response.content)
+                            cached = await image_cache.aget(url, client)
+                            zf.writestr(f"{marker.replace(':', '_')}.jpg", cached.content)
 
                     except Exception as e:
                         logger.error(f"打包圖片失敗 [{marker}]: {e}")
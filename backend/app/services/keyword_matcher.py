@@ -0,0 +1,154 @@
+"""
+多關鍵字比對 — 關鍵字集合編譯成一個比對器，一次掃描找出全部出現位置，供 SEO 各評分項共用
+
+- 比對規則（關鍵字密度）：全域最長匹配優先、同一段文字不重複計算 —
+  關鍵字由長到短（同長度依原順序）逐一計入所有不與已計入範圍重疊的出現位置，
+  例如關鍵字 ["風機推薦", "吹風"] 在「吹風機推薦」中計入「風機推薦」（4 字）而不是較左邊的「吹風」
+- 比對器是 re 的交替式（關鍵字由長到短排列），整段內容在 C 層一次掃描；
+  純 Python 逐字元走訪的 Aho-Corasick 在 CPython 上反而比原本逐關鍵字 str.find 慢數倍
+  - 關鍵字之間不會部分重疊（某關鍵字的結尾 = 另一關鍵字的開頭）時，出現位置只有包含或不相交兩種關係，
+    由左至右取最長（leftmost-longest）的結果即等於全域最長匹配優先，一次 finditer 完成
+  - 可能部分重疊時改用 lookahead 交替式取得每個位置開頭的最長關鍵字（加上同位置開頭的較短關鍵字即為
+    全部出現位置），互相重疊的出現位置分成群組依長度挑選
+- 全部出現位置另外回報（occurrences），被較長關鍵字包住或與其部分重疊的短關鍵字
+  （如「吹風機推薦」中的「吹風機」）也算出現，關鍵字分佈評分才判斷得到前幾個主要關鍵字是否出現
+- 編譯結果依關鍵字集合快取（compile_keywords）
+"""
+import bisect
+import functools
+import re
+
+
+class KeywordMatches:
+    """單篇內容的比對結果
+
+    spans: 不重疊的比對結果 [(start, end, 關鍵字索引)]（全域最長匹配優先），依位置排序
+    occurrences: 所有關鍵字的所有出現位置（可互相重疊），依位置排序
+    """
+
+    def __init__(self, keywords: list[str], spans: list[tuple[int, int, int]], occurrences: list[tuple[int, int, int]]):
+        self.keywords = keywords
+        self.spans = spans
+        self.occurrences = occurrences
+        self._starts = [start for start, _, _ in occurrences]
+
+    @property
+    def matched_chars(self) -> int:
+        """關鍵字涵蓋的字元數（不重複計算）"""
+        return sum(end - start for start, end, _ in self.spans)
+
+    def contains(self, start: int, end: int, top: int) -> bool:
+        """前 top 個關鍵字是否有任一個完整出現在 [start, end)"""
+        i = bisect.bisect_left(self._starts, start)
+        while i < len(self.occurrences):
+            occ_start, occ_end, index = self.occurrences[i]
+            if occ_start >= end:
+                return False
+            if occ_end <= end and index < top:
+                return True
+            i += 1
+        return False
+
+
+class KeywordMatcher:
+    """編譯後的多關鍵字比對器（不可變，可跨執行緒共用）"""
+
+    def __init__(self, keywords: list[str]):
+        self.keywords = list(keywords)
+        # 重複的關鍵字以第一次出現的索引為準（與 keywords[:N] 的判斷一致）；
+        # 空字串不比對（API 端已捨棄空白關鍵字，見 api/seo.SeoAnalyzeRequest）
+        self._index: dict[str, int] = {}
+        for i, kw in enumerate(self.keywords):
+            if kw and kw not in self._index:
+                self._index[kw] = i
+        ordered = sorted(self._index, key=len, reverse=True)
+        alternation = "|".join(map(re.escape, ordered))
+        self._overlapping = any(_overlaps(kw, other) for kw in ordered for other in ordered)
+        if not ordered:
+            self._pattern = None
+        elif self._overlapping:
+            # lookahead：每個位置都嘗試比對，取得可互相重疊的出現位置
+            self._pattern = re.compile(f"(?=({alternation}))")
+        else:
+            self._pattern = re.compile(f"({alternation})")
+        # 每個關鍵字內含的其他（較短）關鍵字：[(offset, 長度, 索引)]
+        self._nested: dict[str, list[tuple[int, int, int]]] = {}
+        for kw in ordered:
+            nested = [
+                (offset, len(other), self._index[other])
+                for other in ordered if len(other) < len(kw)
+                for offset in _find_all(kw, other)
+                # 重疊模式下只補同位置開頭的關鍵字（其他位置開頭的由 lookahead 比對到）
+                if offset == 0 or not self._overlapping
+            ]
+            if nested:
+                self._nested[kw] = nested
+
+    def scan(self, text: str) -> KeywordMatches:
+        spans = []
+        occurrences = []
+        if self._pattern is not None:
+            for m in self._pattern.finditer(text):
+                kw = m.group(1)
+                start = m.start()
+                match = (start, start + len(kw), self._index[kw])
+                spans.append(match)
+                occurrences.append(match)
+                for offset, length, index in self._nested.get(kw, ()):
+                    occurrences.append((start + offset, start + offset + length, index))
+        if self._overlapping:
+            # lookahead 比對到的是全部出現位置，再挑出不重疊的結果
+            spans = _select(occurrences)
+        elif len(occurrences) != len(spans):
+            occurrences.sort()
+        return KeywordMatches(self.keywords, spans, occurrences)
+
+
+def _overlaps(kw: str, other: str) -> bool:
+    """kw 的結尾是否等於 other 的開頭（兩者在內容中可能部分重疊，而不只是包含）"""
+    return any(kw.endswith(other[:k]) for k in range(1, min(len(kw), len(other))))
+
+
+def _select(occurrences: list[tuple[int, int, int]]) -> list[tuple[int, int, int]]:
+    """全域最長匹配優先：由長到短（同長度依關鍵字順序、再依位置）計入不與已計入範圍重疊的出現位置
+
+    occurrences 依開頭位置排序。只有互相重疊的出現位置會影響彼此，
+    依位置切成重疊群組各自挑選；大部分群組只有一個出現位置，直接計入
+    """
+    spans = []
+    group = []
+    group_end = -1
+    for occ in occurrences:
+        if group and occ[0] >= group_end:
+            spans += _pick_longest(group)
+            group = []
+        group.append(occ)
+        group_end = max(group_end, occ[1])
+    if group:
+        spans += _pick_longest(group)
+    return spans
+
+
+def _pick_longest(group: list[tuple[int, int, int]]) -> list[tuple[int, int, int]]:
+    if len(group) == 1:
+        return group
+    accepted = []
+    for start, end, index in sorted(group, key=lambda o: (o[0] - o[1], o[2], o[0])):
+        if all(end <= a_start or start >= a_end for a_start, a_end, _ in accepted):
+            accepted.append((start, end, index))
+    return sorted(accepted)
+
+
+def _find_all(text: str, sub: str) -> list[int]:
+    positions = []
+    pos = text.find(sub)
+    while pos != -1:
+        positions.append(pos)
+        pos = text.find(sub, pos + 1)
+    return positions
+
+
+@functools.lru_cache(maxsize=256)
+def compile_keywords(keywords: tuple[str, ...]) -> KeywordMatcher:
+    """編譯關鍵字集合（快取，相同關鍵字組合重複使用）"""
+    return KeywordMatcher(list(keywords))
@@ -2,18 +2,22 @@
 SEO 長尾關鍵字研究服務
 Google Autocomplete 展開 + LLM 策略生成
 """
+import asyncio
 import json
 import logging
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+import httpx
 import requests
 from google import genai
 from google.genai import types
 
 from app.config import settings
 from app.services.gemini_utils import track_gemini_usage
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import single_flight
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +50,8 @@ class KeywordResearchService:
     def research_keywords(self, products: list, user_id: int) -> dict:
         """完整關鍵字研究流程（同步）
 
+        同一用戶對相同商品的研究進行中時，合併為一次（見 single_flight）
+
         Args:
             products: Product ORM 物件列表
             user_id: 用戶 ID（用量追蹤）
@@ -53,6 +59,9 @@ class KeywordResearchService:
         Returns:
             KeywordStrategy dict
         """
+        return single_flight.do(self._flight_key(products, user_id), self._research_keywords, products, user_id)
+
+    def _research_keywords(self, products: list, user_id: int) -> dict:
         # 1. 提取種子詞
         seeds = self._extract_seed_keywords(products, user_id)
         logger.info(f"種子詞提取完成: {seeds}")
@@ -73,6 +82,30 @@ class KeywordResearchService:
         suggestions = self._fetch_autocomplete(seed)
         return suggestions
 
+    async def aresearch_keywords(self, products: list, user_id: int) -> dict:
+        """完整關鍵字研究流程（async 版本，LLM 走 genai aio client、Autocomplete 走 httpx.AsyncClient）"""
+        return await single_flight.ado(
+            self._flight_key(products, user_id), lambda: self._aresearch_keywords(products, user_id),
+        )
+
+    async def _aresearch_keywords(self, products: list, user_id: int) -> dict:
+        seeds = await self._aextract_seed_keywords(products, user_id)
+        logger.info(f"種子詞提取完成: {seeds}")
+
+        autocomplete = await self._aexpand_autocomplete(seeds)
+        total = sum(len(v) for v in autocomplete.values())
+        logger.info(f"Autocomplete 展開完成: {total} 個建議")
+
+        strategy = await self._agenerate_strategy(products, seeds, autocomplete, user_id)
+        logger.info(f"關鍵字策略生成完成: 主關鍵字={strategy.get('primary_keyword')}")
+
+        return strategy
+
+    async def aautocomplete_preview(self, seed: str) -> list[str]:
+        """單一種子詞的建議預覽（async 版本）"""
+        async with httpx.AsyncClient(timeout=5) as client:
+            return await self._afetch_autocomplete(client, seed)
+
     def format_keyword_context(self, strategy: dict) -> str:
         """格式化為文章生成 prompt 注入文字"""
         primary = strategy.get("primary_keyword", "")
@@ -122,8 +155,12 @@ class KeywordResearchService:
 
     # ── 內部方法 ──
 
-    def _extract_seed_keywords(self, products: list, user_id: int) -> list[str]:
-        """從商品名稱提取 1-3 個種子詞（LLM 輔助）"""
+    @staticmethod
+    def _flight_key(products: list, user_id: int) -> tuple:
+        return ("keyword_research", user_id, tuple((p.id, p.name) for p in products))
+
+    def _seed_request(self, products: list) -> tuple[list[str], str, types.GenerateContentConfig]:
+        """種子詞提取的 prompt 與 config，回傳 (商品名稱, prompt, config)"""
         product_names = [p.name for p in products if p.name and p.name != "待擷取"]
         if not product_names:
             raise ValueError("沒有有效的商品名稱可提取種子詞")
@@ -144,16 +181,12 @@ class KeywordResearchService:
             response_mime_type="application/json",
             http_options=types.HttpOptions(timeout=30_000),
         )
+        return product_names, prompt, config
 
-        response = self.gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[prompt],
-            config=config,
-        )
-        track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
-
+    @staticmethod
+    def _parse_seeds(text: str, product_names: list[str]) -> list[str]:
         try:
-            seeds = json.loads(response.text)
+            seeds = json.loads(text)
             if isinstance(seeds, list) and all(isinstance(s, str) for s in seeds):
                 return seeds[:3]
         except (json.JSONDecodeError, TypeError):
@@ -165,21 +198,37 @@ class KeywordResearchService:
         logger.warning(f"種子詞 LLM 解析失敗，fallback: {fallback}")
         return fallback[:3] if fallback else [product_names[0][:6]]
 
+    def _extract_seed_keywords(self, products: list, user_id: int) -> list[str]:
+        """從商品名稱提取 1-3 個種子詞（LLM 輔助）"""
+        product_names, prompt, config = self._seed_request(products)
+        rate_limiter.acquire("gemini:gemini-2.5-flash")
+        response = self.gemini_client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=[prompt],
+            config=config,
+        )
+        track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
+        return self._parse_seeds(response.text, product_names)
+
+    async def _aextract_seed_keywords(self, products: list, user_id: int) -> list[str]:
+        product_names, prompt, config = self._seed_request(products)
+        await rate_limiter.aacquire("gemini:gemini-2.5-flash")
+        response = await self.gemini_client.aio.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=[prompt],
+            config=config,
+        )
+        track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
+        return self._parse_seeds(response.text, product_names)
+
     def _expand_autocomplete(self, seeds: list[str]) -> dict[str, list[str]]:
         """Google Autocomplete 展開（精簡版：中文修飾詞 + 高頻字母，並行請求）"""
         results = {}
-        # 高頻字母（台灣中文搜尋中最常觸發有意義建議的字母）
-        high_value_letters = "bcdmprs"
-        year = datetime.now().year
 
         for seed in seeds:
-            # 組裝所有查詢
-            queries = [seed]  # 基礎
-            queries += [f"{seed} {c}" for c in high_value_letters]
-            queries += [f"{seed} {m}" for m in CHINESE_MODIFIERS]
-            queries.append(f"{year} {seed} 推薦")
+            queries = self._autocomplete_queries(seed)
 
-            # 並行請求（max 5 workers，避免被 rate limit）
+            # 並行請求（max 5 workers；請求速率由 rate_limiter 的 autocomplete 額度控制）
             suggestions = set()
             with ThreadPoolExecutor(max_workers=5) as executor:
                 futures = {
@@ -198,31 +247,76 @@ class KeywordResearchService:
 
         return results
 
+    async def _aexpand_autocomplete(self, seeds: list[str]) -> dict[str, list[str]]:
+        """Autocomplete 展開（async 版本，同一時間最多 5 個請求）"""
+        semaphore = asyncio.Semaphore(5)
+
+        async with httpx.AsyncClient(timeout=5) as client:
+            async def fetch(query: str) -> list[str]:
+                async with semaphore:
+                    return await self._afetch_autocomplete(client, query)
+
+            results = {}
+            for seed in seeds:
+                batches = await asyncio.gather(*(fetch(q) for q in self._autocomplete_queries(seed)))
+                suggestions = {item for items in batches for item in items}
+                suggestions.discard(seed)
+                results[seed] = sorted(suggestions)
+        return results
+
+    @staticmethod
+    def _autocomplete_queries(seed: str) -> list[str]:
+        """單一種子詞要展開的查詢（基礎 + 高頻字母 + 中文修飾詞 + 年份）"""
+        # 高頻字母（台灣中文搜尋中最常觸發有意義建議的字母）
+        high_value_letters = "bcdmprs"
+        year = datetime.now().year
+        queries = [seed]  # 基礎
+        queries += [f"{seed} {c}" for c in high_value_letters]
+        queries += [f"{seed} {m}" for m in CHINESE_MODIFIERS]
+        queries.append(f"{year} {seed} 推薦")
+        return queries
+
+    @staticmethod
+    def _parse_autocomplete(data) -> list[str]:
+        # 格式：["query", ["suggestion1", "suggestion2", ...]]
+        if isinstance(data, list) and len(data) >= 2:
+            return [s for s in data[1] if isinstance(s, str)]
+        return []
+
     def _fetch_autocomplete(self, query: str) -> list[str]:
         """單次 Google Autocomplete 請求"""
         try:
+            rate_limiter.acquire("autocomplete")
             resp = requests.get(
                 self.AUTOCOMPLETE_URL,
                 params={"client": "firefox", "q": query, "hl": "zh-TW"},
                 timeout=5,
             )
             resp.raise_for_status()
-            data = resp.json()
-            # 格式：["query", ["suggestion1", "suggestion2", ...]]
-            if isinstance(data, list) and len(data) >= 2:
-                return [s for s in data[1] if isinstance(s, str)]
+            return self._parse_autocomplete(resp.json())
         except Exception as e:
             logger.debug(f"Autocomplete 請求失敗 ({query}): {e}")
         return []
 
-    def _generate_strategy(
+    async def _afetch_autocomplete(self, client: httpx.AsyncClient, query: str) -> list[str]:
+        try:
+            await rate_limiter.aacquire("autocomplete")
+            resp = await client.get(
+                self.AUTOCOMPLETE_URL,
+                params={"client": "firefox", "q": query, "hl": "zh-TW"},
+            )
+            resp.raise_for_status()
+            return self._parse_autocomplete(resp.json())
+        except Exception as e:
+            logger.debug(f"Autocomplete 請求失敗 ({query}): {e}")
+        return []
+
+    def _strategy_request(
         self,
         products: list,
-        seeds: list[str],
         autocomplete: dict[str, list[str]],
-        user_id: int,
-    ) -> dict:
-        """LLM 生成關鍵字策略 JSON"""
+    ) -> tuple[str, types.GenerateContentConfig]:
+        """關鍵字策略的 prompt 與 config"""
         # 組裝商品資訊
         product_info = []
         for p in products:
@@ -311,19 +405,49 @@ class KeywordResearchService:
             http_options=types.HttpOptions(timeout=60_000),
         )
 
+        return prompt, config
+
+    def _parse_strategy(self, raw: str) -> dict:
+        strategy = self._parse_json_robust(raw)
+        if strategy is None:
+            logger.error(f"關鍵字策略 JSON 解析失敗\n原始回應: {raw[:800]}")
+            raise RuntimeError("關鍵字策略生成失敗：LLM 回傳非有效 JSON")
+        return strategy
+
+    def _generate_strategy(
+        self,
+        products: list,
+        seeds: list[str],
+        autocomplete: dict[str, list[str]],
+        user_id: int,
+    ) -> dict:
+        """LLM 生成關鍵字策略 JSON"""
+        prompt, config = self._strategy_request(products, autocomplete)
+        rate_limiter.acquire("gemini:gemini-2.5-flash")
         response = self.gemini_client.models.generate_content(
             model="gemini-2.5-flash",
             contents=[prompt],
             config=config,
         )
         track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
+        return self._parse_strategy(response.text or "")
 
-        raw = response.text or ""
-        strategy = self._parse_json_robust(raw)
-        if strategy is None:
-            logger.error(f"關鍵字策略 JSON 解析失敗\n原始回應: {raw[:800]}")
-            raise RuntimeError("關鍵字策略生成失敗：LLM 回傳非有效 JSON")
-        return strategy
+    async def _agenerate_strategy(
+        self,
+        products: list,
+        seeds: list[str],
+        autocomplete: dict[str, list[str]],
+        user_id: int,
+    ) -> dict:
+        prompt, config = self._strategy_request(products, autocomplete)
+        await rate_limiter.aacquire("gemini:gemini-2.5-flash")
+        response = await self.gemini_client.aio.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=[prompt],
+            config=config,
+        )
+        track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
+        return self._parse_strategy(response.text or "")
 
     @staticmethod
     def _parse_json_robust(text: str) -> dict | None:
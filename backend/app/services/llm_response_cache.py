@@ -0,0 +1,100 @@
+"""
+LLM 回應快取 — 相同輸入（模型 + system prompt + user message + 圖片 + 取樣參數）直接回傳上次的生成結果
+
+使用者重複送出相同的生成請求（連點、client 逾時後重送）時不再重新呼叫 LLM。
+
+- 快取鍵：sha256(model, system prompt 雜湊, user message 雜湊, 各圖片內容雜湊, temperature, max_tokens)；
+  llm_service 以 token 預算裁減前的完整輸入計算（見 LLMService._request_key），讀圖 / 預算計算前就能查快取
+- 存放於程序記憶體，LRU：超過 LLM_RESPONSE_CACHE_MAX_ENTRIES 筆或 LLM_RESPONSE_CACHE_MAX_BYTES 時淘汰最久未用者
+- 超過 LLM_RESPONSE_CACHE_TTL 秒的項目視為未命中
+- 呼叫端可逐次停用（generate_article 的 use_cache=False，例如刻意重新生成不同版本）
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+from app.services.ocr_cache import image_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LLM 回應快取（執行緒安全，單例）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 快取鍵 → (生成文字, 寫入時間)
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_message: str, image_parts: list[tuple[bytes, str]] | None) -> str:
+        parts = [
+            model,
+            _sha(system_prompt),
+            _sha(user_message),
+            ",".join(image_hash(img_bytes) for img_bytes, _ in image_parts or ()),
+            str(settings.LLM_TEMPERATURE),
+            str(settings.LLM_MAX_TOKENS),
+        ]
+        return _sha("\n".join(parts))
+
+    def get(self, key: str) -> Optional[str]:
+        if not settings.LLM_RESPONSE_CACHE_ENABLED:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[1] < settings.LLM_RESPONSE_CACHE_TTL:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            if entry:
+                self._remove(key)
+            self._misses += 1
+            return None
+
+    def put(self, key: str, text: str):
+        if not settings.LLM_RESPONSE_CACHE_ENABLED or not text:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (text, time.time())
+            self._bytes += len(text.encode("utf-8"))
+            while self._entries and (
+                len(self._entries) > settings.LLM_RESPONSE_CACHE_MAX_ENTRIES
+                or self._bytes > settings.LLM_RESPONSE_CACHE_MAX_BYTES
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            entries, size = len(self._entries), self._bytes
+        lookups = hits + misses
+        return {
+            "enabled": settings.LLM_RESPONSE_CACHE_ENABLED,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _remove(self, key: str):
+        text, _ = self._entries.pop(key)
+        self._bytes -= len(text.encode("utf-8"))
+
+
+# 單例
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,116 @@
+"""
+LLM 呼叫重試策略 — 同步（Celery worker）與 async（FastAPI）呼叫路徑共用的重試 / 斷路器 / 錯誤分類
+
+呼叫端只負責「怎麼送出一次請求」與「怎麼等待」（time.sleep / asyncio.sleep），
+其餘判斷都在 RetryPolicy，兩條路徑的行為因此不會分歧：
+
+    policy = RetryPolicy("Gemini", breaker, GEMINI_TRANSIENT_ERRORS, max_retries, on_delta)
+    for attempt in range(max_retries):
+        （取得速率額度，逾時 raise policy.with_history(e)）
+        policy.start(attempt)                 # 斷路器拒絕時拋出 CircuitOpenError
+        try:
+            result = 送出請求
+        except Exception as e:
+            wait = policy.failed(e, recover)  # 不可重試時拋出 RuntimeError
+            （等待 wait 秒）
+            continue
+        except BaseException:
+            policy.abandon()                  # 被取消：歸還斷路器探測名額
+            raise
+        policy.succeeded()
+        return result
+    raise policy.exhausted()
+
+- 暫時性錯誤（錯誤訊息含 transient_errors 關鍵字）計入斷路器失敗並以 5s / 10s / 20s 退避重試；
+  斷路器已開啟或已是最後一次時不再等待（呼叫端可改用備援模型）
+- 其他錯誤代表供應商有正常回應（請求內容問題），不計入故障；recover(e) 回傳 True 時
+  （如上下文快取失效、圖片無法解析）調整請求後立即重試，否則拋出 RuntimeError
+"""
+import logging
+import time
+from typing import Callable, Optional
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.generation_telemetry import generation_telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """單次 LLM 呼叫（含重試）的狀態"""
+
+    def __init__(self, label: str, breaker: CircuitBreaker, transient_errors: list[str], max_retries: int, on_delta=None):
+        self.label = label
+        self.breaker = breaker
+        self.transient_errors = transient_errors
+        self.max_retries = max_retries
+        self.on_delta = on_delta
+        self.history: list[str] = []
+        self.attempt = 0
+        self.started = 0.0
+        self.probe = False  # 本次嘗試是否為斷路器半開狀態的探測請求
+
+    def with_history(self, error: BaseException) -> BaseException:
+        """附上目前的重試紀錄（供錯誤報告使用）"""
+        error.retry_history = self.history
+        return error
+
+    def start(self, attempt: int):
+        """開始第 attempt 次嘗試（已取得速率額度後才問斷路器，避免佔住半開狀態的探測名額卻沒送出請求）"""
+        self.attempt = attempt
+        admission = self.breaker.admit()
+        if admission is None:
+            raise self.with_history(CircuitOpenError(
+                f"{self.label} {self.breaker.model} 暫時停用（斷路器開啟，近期錯誤率過高）"
+            ))
+        self.probe = admission == "probe"
+        self.started = time.time()
+
+    def abandon(self):
+        """嘗試沒有結果就結束（asyncio.CancelledError、任務中止等 BaseException）：
+        不計入斷路器統計，但探測請求必須歸還名額，否則斷路器會一直停在半開狀態拒絕所有請求
+        """
+        if self.probe:
+            self.probe = False
+            self.breaker.release()
+
+    def elapsed(self) -> float:
+        return time.time() - self.started
+
+    def succeeded(self):
+        self.probe = False
+        self.breaker.record_success(self.elapsed())
+        if self.history:
+            logger.info(f"{self.label} API 第 {self.attempt+1} 次嘗試成功（前 {len(self.history)} 次失敗）")
+            generation_telemetry.note_retries(len(self.history))
+
+    def failed(self, e: Exception, recover: Optional[Callable[[Exception], bool]] = None) -> float:
+        """記錄失敗並決定下一步：回傳下一次嘗試前要等待的秒數（0 = 立即重試），不可重試時拋出 RuntimeError"""
+        self.probe = False
+        elapsed = round(self.elapsed(), 1)
+        error_str = str(e).lower()
+        self.history.append(f"第{self.attempt+1}次({elapsed}s): {type(e).__name__}: {str(e)[:200]}")
+        transient = any(kw in error_str for kw in self.transient_errors)
+        if transient:
+            self.breaker.record_failure(elapsed)
+        else:
+            # 供應商有正常回應（請求內容問題），不計入故障
+            self.breaker.record_success(elapsed)
+        if self.on_delta:
+            # 串流中斷：丟棄部分內容，下一次嘗試從頭開始
+            self.on_delta(None)
+        if recover and recover(e):
+            return 0
+        if transient:
+            if self.breaker.state == "open" or self.attempt + 1 == self.max_retries:
+                # 斷路器已開啟 / 已是最後一次：不再等待退避，直接失敗（呼叫端可改用備援模型）
+                return 0
+            wait = 2 ** self.attempt * 5  # 5s, 10s, 20s
+            logger.warning(f"{self.label} API 暫時性錯誤（第 {self.attempt+1}/{self.max_retries} 次），{wait}s 後重試: {e}")
+            return wait
+        raise self.with_history(RuntimeError(f"{self.label} API 錯誤: {e}"))
+
+    def exhausted(self) -> RuntimeError:
+        error = self.with_history(RuntimeError(f"{self.label} API {self.max_retries} 次重試均失敗"))
+        error.transient = True
+        return error
@@ -1,7 +1,10 @@
 """
 LLM 文章生成服務 - 支援 Gemini + Anthropic Claude（含多模態圖片輸入）
 """
+import asyncio
 import base64
+import contextlib
+import functools
 import logging
 import re
 import time
@@ -16,10 +19,56 @@ from sqlalchemy.orm import Session
 from app.config import settings
 from app.services.prompts import get_default_prompt, DEFAULT_SYSTEM_PROMPT, SYSTEM_INSTRUCTIONS
 from app.models.prompt_template import PromptTemplate
-from app.services.gemini_utils import strip_markdown, track_gemini_usage, track_anthropic_usage, is_anthropic_model
+from app.services.circuit_breaker import circuit_breakers
+from app.services.gemini_context_cache import gemini_context_cache, is_cache_error
+from app.services.generation_pipeline import Pipeline
+from app.services.generation_telemetry import generation_telemetry
+from app.services.hedging import hedge_policy
+from app.services.image_cache import image_cache
+from app.services.image_preprocess import image_preprocessor
+from app.services.llm_response_cache import llm_response_cache
+from app.services.llm_retry import RetryPolicy
+from app.services import prompt_budget
+from app.services.rate_limiter import rate_limiter, RateLimitTimeout
+from app.services.single_flight import single_flight
+from app.services.ocr_cache import ocr_cache, image_hash, prompt_version
+from app.services.article_renderer import render_llm_output
+from app.services.gemini_utils import track_gemini_usage, track_anthropic_usage, is_anthropic_model, anthropic_system_blocks
 
 logger = logging.getLogger(__name__)
 
+# Gemini Flash 圖片文字提取（Claude 兩階段策略用）
+IMAGE_EXTRACT_PROMPT = (
+    "請仔細閱讀這張商品圖片，提取所有有用的文字資訊，包括但不限於：\n"
+    "- 商品規格、尺寸、重量\n"
+    "- 成分表、材質說明\n"
+    "- 使用方式、注意事項\n"
+    "- 賣點文案、促銷資訊\n"
+    "- 任何圖片中可見的文字\n\n"
+    "請以條列方式整理，保留原始文字，不要加入你的評論。如果圖片中沒有文字，簡短描述圖片內容。"
+)
+
+IMAGE_EXTRACT_MULTI_PROMPT = (
+    "以下依序附上 {count} 張商品圖片，請逐張提取所有有用的文字資訊，包括但不限於：\n"
+    "- 商品規格、尺寸、重量\n"
+    "- 成分表、材質說明\n"
+    "- 使用方式、注意事項\n"
+    "- 賣點文案、促銷資訊\n"
+    "- 任何圖片中可見的文字\n\n"
+    "請以條列方式整理，保留原始文字，不要加入你的評論。如果圖片中沒有文字，簡短描述圖片內容。\n\n"
+    "⚠️ 輸出格式：每張圖片的結果必須以獨立一行「=== 圖片 N ===」開頭（N 為 1 到 {count} 的圖片順序），"
+    "不可合併或省略任何一張。"
+)
+
+# 提取 prompt 版本（OCR 快取鍵的一部分，prompt 修改後舊結果自動失效）
+IMAGE_EXTRACT_PROMPT_VERSION = prompt_version(IMAGE_EXTRACT_PROMPT, IMAGE_EXTRACT_MULTI_PROMPT)
+
+# 可重試的暫時性錯誤（錯誤訊息關鍵字，小寫比對）
+GEMINI_TRANSIENT_ERRORS = ["timed out", "timeout", "503", "500", "overloaded", "unavailable"]
+ANTHROPIC_TRANSIENT_ERRORS = ["timed out", "timeout", "529", "503", "500", "overloaded", "unavailable"]
+
+OCR_SECTION_RE = re.compile(r'^\s*={3}\s*圖片\s*(\d+)\s*={3}\s*$', re.MULTILINE)
+
 
 class LLMService:
     """LLM 文章生成服務（Gemini + Claude）"""
@@ -27,6 +76,7 @@ class LLMService:
     def __init__(self):
         self._gemini_client = None
         self._anthropic_client = None
+        self._async_anthropic_client = None
 
     @property
     def gemini_client(self):
@@ -50,16 +100,26 @@ class LLMService:
             )
         return self._anthropic_client
 
-    def _download_images(self, products, image_sources: list[str]) -> list[tuple[bytes, str]]:
-        """下載商品圖片供 LLM 多模態分析（平行下載）
+    @property
+    def async_gemini_client(self):
+        """genai 原生 async client（與同步 client 共用連線設定）"""
+        return self.gemini_client.aio
 
-        Args:
-            products: 商品列表
-            image_sources: ["main", "description"] 指定要下載哪類圖片
+    @property
+    def async_anthropic_client(self):
+        if self._async_anthropic_client is None:
+            if not settings.ANTHROPIC_API_KEY:
+                raise ValueError("ANTHROPIC_API_KEY 未設定，請在 .env 中設定")
+            import anthropic
+            self._async_anthropic_client = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                timeout=300.0,
+            )
+        return self._async_anthropic_client
 
-        Returns:
-            list of (image_bytes, mime_type)
-        """
+    @staticmethod
+    def _image_urls(products, image_sources: list[str]) -> list[str]:
+        """依圖片來源列出要下載的圖片 URL（主圖每商品 3 張、描述圖 5 張）"""
         image_urls = []
         for p in products:
             if "main" in image_sources and p.images:
@@ -68,134 +128,379 @@ class LLMService:
             if "description" in image_sources and p.description_images:
                 for url in p.description_images[:5]:
                     image_urls.append(url)
+        return image_urls
 
-        def _fetch_one(url):
-            try:
-                with httpx.Client(timeout=10.0) as client:
-                    resp = client.get(url)
-                    resp.raise_for_status()
-                    img_bytes = resp.content
-                    if len(img_bytes) < 1024:
-                        logger.warning(f"圖片太小（{len(img_bytes)} bytes），跳過: {url[:80]}...")
-                        return None
-                    content_type = resp.headers.get("content-type", "image/jpeg")
-                    mime_type = content_type.split(";")[0].strip().lower()
-                    allowed_types = {"image/jpeg", "image/png", "image/gif", "image/webp"}
-                    if mime_type not in allowed_types:
-                        mime_type = "image/jpeg"
-                    logger.debug(f"圖片下載成功: {url[:80]}...")
-                    return (img_bytes, mime_type)
-            except Exception as e:
-                logger.warning(f"圖片下載失敗（跳過）: {url[:80]}... - {e}")
+    @staticmethod
+    def _fetch_image(client: httpx.Client, url: str) -> list[tuple[bytes, str]] | None:
+        """取得單張圖片並前處理，失敗或過小時回傳 None"""
+        try:
+            cached = image_cache.get(url, client)
+            img_bytes = cached.content
+            if len(img_bytes) < 1024:
+                logger.warning(f"圖片太小（{len(img_bytes)} bytes），跳過: {url[:80]}...")
                 return None
+            mime_type = cached.content_type.split(";")[0].strip().lower()
+            allowed_types = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+            if mime_type not in allowed_types:
+                mime_type = "image/jpeg"
+            logger.debug(f"圖片取得成功: {url[:80]}...")
+            # 縮圖 / 重新壓縮 / 長圖切片，降低請求大小與圖片 token
+            return image_preprocessor.normalize(img_bytes, mime_type, digest=cached.digest)
+        except Exception as e:
+            logger.warning(f"圖片下載失敗（跳過）: {url[:80]}... - {e}")
+            return None
+
+    @staticmethod
+    def _flatten(image_groups: list[list[tuple[bytes, str]]]) -> list[tuple[bytes, str]]:
+        """每張原圖一組的前處理結果 → 依序攤平成送給 LLM 的圖片列表"""
+        return [part for group in image_groups for part in group]
+
+    @staticmethod
+    def _log_downloaded(url_count: int, image_parts: list[tuple[bytes, str]]):
+        total_bytes = sum(len(b) for b, _ in image_parts)
+        generation_telemetry.note_images(url_count, len(image_parts), total_bytes)
+        total_kb = total_bytes / 1024
+        logger.info(f"共下載 {url_count} 張圖片，前處理後 {len(image_parts)} 張（{total_kb:.0f} KB）供 LLM 分析")
+
+    def _download_images(self, products, image_sources: list[str]) -> list[list[tuple[bytes, str]]]:
+        """下載商品圖片供 LLM 多模態分析（平行下載，經由本地圖片快取）
+
+        Args:
+            products: 商品列表
+            image_sources: ["main", "description"] 指定要下載哪類圖片
+
+        Returns:
+            每張原圖一組 [(image_bytes, mime_type), ...]（經前處理，超長圖片會切成多片），
+            以 _flatten 攤平後送給 LLM
+        """
+        image_urls = self._image_urls(products, image_sources)
 
-        image_parts = []
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            results = executor.map(_fetch_one, image_urls)
+        # 共用一個連線池（httpx.Client 可跨執行緒使用），快取命中時完全不連線
+        image_groups = []
+        with httpx.Client(timeout=10.0) as client, ThreadPoolExecutor(max_workers=5) as executor:
+            results = executor.map(functools.partial(self._fetch_image, client), image_urls)
             for result in results:
-                if result is not None:
-                    image_parts.append(result)
+                if result:
+                    image_groups.append(result)
+
+        self._log_downloaded(len(image_urls), self._flatten(image_groups))
+        return image_groups
+
+    async def _adownload_images(self, products, image_sources: list[str], executor, on_parts=None) -> list[list[tuple[bytes, str]]]:
+        """_download_images 的 async 版本（在 executor 下載，每篇文章最多 5 張同時進行）
+
+        on_parts: 選用的 callback，依原圖片順序在每張圖片就緒時收到其前處理結果，
+                  供 OCR 不必等全部下載完就開始
+        """
+        loop = asyncio.get_running_loop()
+        image_urls = self._image_urls(products, image_sources)
+        slots = asyncio.Semaphore(5)
+
+        async def fetch(url):
+            async with slots:
+                return await loop.run_in_executor(executor, self._fetch_image, client, url)
+
+        # 建立 client（含 SSL context）約需百毫秒，放到 executor 避免卡住其他準備階段
+        client = await loop.run_in_executor(executor, functools.partial(httpx.Client, timeout=10.0))
+        image_groups = []
+        tasks = [asyncio.ensure_future(fetch(url)) for url in image_urls]
+        try:
+            for task in tasks:
+                result = await task
+                if result:
+                    image_groups.append(result)
+                    if on_parts:
+                        on_parts(result)
+        finally:
+            for task in tasks:
+                task.cancel()
+            client.close()
+
+        self._log_downloaded(len(image_urls), self._flatten(image_groups))
+        return image_groups
+
+    def _stream_gemini(self, use_model: str, contents: list, config, on_delta) -> tuple:
+        """串流呼叫 Gemini（generate_content_stream），逐塊回呼 on_delta
+
+        回傳 (完整文字, 最後一個 chunk)，最後一個 chunk 帶有完整 usage_metadata 供用量追蹤
+        """
+        chunks = []
+        last_chunk = None
+        for chunk in self.gemini_client.models.generate_content_stream(
+            model=use_model, contents=contents, config=config,
+        ):
+            last_chunk = chunk
+            text = chunk.text
+            if text:
+                chunks.append(text)
+                on_delta(text)
+        return "".join(chunks), last_chunk
 
-        logger.info(f"共下載 {len(image_parts)}/{len(image_urls)} 張圖片供 LLM 分析")
-        return image_parts
+    def _stream_anthropic(self, request: dict, on_delta) -> tuple:
+        """串流呼叫 Claude（messages.stream），逐塊回呼 on_delta，回傳 (完整文字, final message)"""
+        chunks = []
+        with self.anthropic_client.messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                chunks.append(text)
+                on_delta(text)
+            response = stream.get_final_message()
+        return "".join(chunks), response
 
-    def _call_gemini(self, use_model: str, system_prompt: str, user_message: str, image_parts: list[tuple[bytes, str]] | None = None, max_retries: int = 3) -> tuple:
-        """呼叫 Gemini API，回傳 (generated_text, response)。圖片失敗時自動 fallback 為純文字。超時/暫時性錯誤自動重試。"""
+    @staticmethod
+    def _gemini_contents(user_message: str, image_parts: list[tuple[bytes, str]] | None) -> list:
         contents = [user_message]
         if image_parts:
             for img_bytes, mime_type in image_parts:
                 contents.append(types.Part.from_bytes(data=img_bytes, mime_type=mime_type))
+        return contents
 
-        retry_history = []
-        for attempt in range(max_retries):
-            # 每次重試都建立新的 config，帶上 per-request http_options 強制 timeout
-            config = types.GenerateContentConfig(
-                system_instruction=system_prompt,
+    @staticmethod
+    def _gemini_config(system_prompt: str, cache_name: str | None):
+        if cache_name:
+            # system prompt 已在 cached content 中，不可再帶 system_instruction
+            return types.GenerateContentConfig(
+                cached_content=cache_name,
                 temperature=settings.LLM_TEMPERATURE,
                 max_output_tokens=settings.LLM_MAX_TOKENS,
-                http_options=types.HttpOptions(timeout=300_000),  # 毫秒，300秒
+                http_options=types.HttpOptions(timeout=300_000),
             )
-            attempt_start = time.time()
+        return types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            temperature=settings.LLM_TEMPERATURE,
+            max_output_tokens=settings.LLM_MAX_TOKENS,
+            http_options=types.HttpOptions(timeout=300_000),  # 毫秒，300秒
+        )
+
+    def _call_gemini(self, use_model: str, system_prompt: str, user_message: str, image_parts: list[tuple[bytes, str]] | None = None, max_retries: int = 3, on_delta=None, template_id: str | None = None) -> tuple:
+        """呼叫 Gemini API，回傳 (generated_text, response)。圖片失敗時自動 fallback 為純文字。超時/暫時性錯誤自動重試（見 llm_retry）。
+
+        on_delta: 提供時改用串流模式，每個文字片段呼叫 on_delta(text)；
+                  串流中途失敗要重試時先呼叫 on_delta(None)，通知呼叫端丟棄已收到的部分內容
+        template_id: 提供時 system prompt 走 Gemini 上下文快取（見 gemini_context_cache），不可用時自動改回一般請求
+        """
+        cache_name = None
+        if template_id:
+            cache_name = gemini_context_cache.get(self.gemini_client, use_model, template_id, system_prompt)
+        request = _GeminiRequest(use_model, system_prompt, user_message, image_parts, template_id, cache_name)
+
+        policy = RetryPolicy("Gemini", circuit_breakers.get("google", use_model), GEMINI_TRANSIENT_ERRORS, max_retries, on_delta)
+        for attempt in range(max_retries):
             try:
-                response = self.gemini_client.models.generate_content(
-                    model=use_model, contents=contents, config=config,
-                )
-                if retry_history:
-                    logger.info(f"Gemini API 第 {attempt+1} 次嘗試成功（前 {len(retry_history)} 次失敗）")
-                return response.text, response
+                rate_limiter.acquire(f"gemini:{use_model}")
+            except RateLimitTimeout as e:
+                raise policy.with_history(e)
+            policy.start(attempt)
+            # 每次重試都建立新的 config，帶上 per-request http_options 強制 timeout
+            config = request.config()
+            try:
+                if on_delta:
+                    generated_text, response = self._stream_gemini(use_model, request.contents, config, on_delta)
+                else:
+                    response = self.gemini_client.models.generate_content(
+                        model=use_model, contents=request.contents, config=config,
+                    )
+                    generated_text = response.text
             except Exception as e:
-                elapsed = round(time.time() - attempt_start, 1)
-                error_str = str(e).lower()
-                retry_history.append(f"第{attempt+1}次({elapsed}s): {type(e).__name__}: {str(e)[:200]}")
-                # 圖片錯誤：fallback 純文字（不重試）
-                if image_parts and "image" in error_str:
-                    logger.warning(f"Gemini 圖片處理失敗，改用純文字模式重試: {e}")
-                    contents = [user_message]
-                    image_parts = None
-                    continue
-                # 超時或暫時性錯誤：重試
-                if any(kw in error_str for kw in ["timed out", "timeout", "503", "500", "overloaded", "unavailable"]):
-                    wait = 2 ** attempt * 5  # 5s, 10s, 20s
-                    logger.warning(f"Gemini API 暫時性錯誤（第 {attempt+1}/{max_retries} 次），{wait}s 後重試: {e}")
-                    time.sleep(wait)
-                    continue
-                # 不可重試的錯誤
-                error = RuntimeError(f"Gemini API 錯誤: {e}")
-                error.retry_history = retry_history
-                raise error
-        error = RuntimeError(f"Gemini API {max_retries} 次重試均失敗")
-        error.retry_history = retry_history
-        raise error
-
-    def _extract_image_info(self, image_parts: list[tuple[bytes, str]], user_id: int | None = None, max_images: int = 8) -> str:
+                time.sleep(policy.failed(e, request.recover))
+                continue
+            except BaseException:
+                policy.abandon()
+                raise
+            # 同步路徑（Celery worker）沒有首個片段時間，以完整回應時間記錄
+            generation_telemetry.note_llm_call(use_model, policy.elapsed(), policy.elapsed())
+            policy.succeeded()
+            return generated_text, response
+        raise policy.exhausted()
+
+    def _extract_image_info(self, image_groups: list[list[tuple[bytes, str]]], user_id: int | None = None, max_images: int = 8) -> str:
         """用 Gemini Flash 提取圖片中的文字資訊（成本極低）
 
         當使用 Claude 模型時，先用此方法讀圖，再把純文字傳給 Claude，
         避免 Claude 的高額圖片 token 費用。
-        逐張處理，跳過 Gemini 無法解析的圖片。
-        限制最多處理 max_images 張，避免超時。
+        image_groups 為每張原圖一組的前處理結果（見 _download_images）。
+        圖片每 OCR_IMAGES_PER_REQUEST 張打包成一次請求，最多 OCR_CONCURRENCY 個請求並行；
+        打包結果無法按圖片切分時，該組改為逐張處理。跳過 Gemini 無法解析的圖片。
+        限制最多處理 max_images 張原圖（長圖的所有切片算同一張），避免超時。
+        """
+        if len(image_groups) > max_images:
+            logger.info(f"圖片數量 {len(image_groups)} 超過上限 {max_images}，僅處理前 {max_images} 張")
+            image_groups = image_groups[:max_images]
+        image_parts = self._flatten(image_groups)
+        if not image_parts:
+            return ""
+        texts, responses, hits = self._ocr_chunk(image_parts)
+        return self._finish_ocr(texts, responses, len(image_parts), hits, user_id)
+
+    def _ocr_chunk(self, image_parts: list[tuple[bytes, str]], offset: int = 0) -> tuple[dict, list, int]:
+        """提取一段連續圖片的文字（先查 OCR 快取，未命中者打包呼叫 Flash）
+
+        offset 為這段圖片在整篇文章圖片中的起始索引；
+        回傳 ({圖片索引: 文字}, [response...], 快取命中張數)，用量由呼叫端以 _finish_ocr 統一記錄
+        """
+        # 先查 OCR 快取（圖片內容雜湊 + prompt 版本），只對未命中的圖片呼叫 Flash
+        hashes = [image_hash(img_bytes) for img_bytes, _ in image_parts]
+        cached = ocr_cache.lookup(hashes, IMAGE_EXTRACT_PROMPT_VERSION)
+        texts: dict[int, str] = {offset + i: cached[h] for i, h in enumerate(hashes) if h in cached}
+        pending = [(offset + i, part) for i, part in enumerate(image_parts) if offset + i not in texts]
+
+        per_request = max(1, settings.OCR_IMAGES_PER_REQUEST)
+        groups = [pending[i:i + per_request] for i in range(0, len(pending), per_request)]
+
+        responses = []
+        workers = max(1, min(settings.OCR_CONCURRENCY, len(groups)))
+        if groups:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for group_texts, group_responses in executor.map(self._extract_image_group, groups):
+                    texts.update(group_texts)
+                    responses.extend(group_responses)
+
+        ocr_cache.store(
+            {hashes[i - offset]: texts[i] for i, _ in pending if i in texts},
+            IMAGE_EXTRACT_PROMPT_VERSION,
+            model="gemini-2.5-flash",
+        )
+        return texts, responses, len(image_parts) - len(pending)
+
+    @staticmethod
+    def _finish_ocr(texts: dict[int, str], responses: list, image_count: int, hits: int, user_id: int | None) -> str:
+        """記錄 OCR 用量並組合提取結果文字"""
+        # 用量追蹤在同一執行緒依序寫入，避免並行建立同一筆每日紀錄
+        for response in responses:
+            track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
+
+        generation_telemetry.note_ocr(image_count, len(responses), hits)
+        results = [f"【圖片 {i+1}】\n{texts[i]}" for i in sorted(texts)]
+        logger.info(
+            f"Gemini Flash 圖片文字提取完成：{len(results)}/{image_count} 張成功"
+            f"（快取命中 {hits} 張，{len(responses)} 次請求）"
+        )
+        return "\n\n".join(results)
+
+    async def _astream_ocr(self, queue: asyncio.Queue, user_id: int | None, report, executor, max_images: int = 8) -> str:
+        """邊下載邊讀圖：從 queue 依序取得每張原圖的前處理結果（None 表示下載結束），湊滿一組就送出 OCR
+
+        結果與 _extract_image_info 相同（同樣的分組、快取與前 max_images 張原圖上限），
+        只是第一組 OCR 不必等最後一張圖片下載完成
         """
-        # 限制圖片數量，避免逐張呼叫 API 超時（每張約 5-10 秒）
-        if len(image_parts) > max_images:
-            logger.info(f"圖片數量 {len(image_parts)} 超過上限 {max_images}，僅處理前 {max_images} 張")
-            image_parts = image_parts[:max_images]
-
-        extract_prompt = (
-            "請仔細閱讀這張商品圖片，提取所有有用的文字資訊，包括但不限於：\n"
-            "- 商品規格、尺寸、重量\n"
-            "- 成分表、材質說明\n"
-            "- 使用方式、注意事項\n"
-            "- 賣點文案、促銷資訊\n"
-            "- 任何圖片中可見的文字\n\n"
-            "請以條列方式整理，保留原始文字，不要加入你的評論。如果圖片中沒有文字，簡短描述圖片內容。"
+        loop = asyncio.get_running_loop()
+        per_request = max(1, settings.OCR_IMAGES_PER_REQUEST)
+        slots = asyncio.Semaphore(max(1, settings.OCR_CONCURRENCY))
+        chunks: list[asyncio.Task] = []
+        batch: list[tuple[bytes, str]] = []
+        count = 0  # 已排入的圖片片段數（OCR 結果索引）
+        sources = 0  # 已排入的原圖數（max_images 上限以原圖計）
+
+        async def run_chunk(parts, offset):
+            async with slots:
+                return await loop.run_in_executor(executor, self._ocr_chunk, parts, offset)
+
+        def submit():
+            nonlocal batch
+            if not chunks:
+                logger.info("兩階段圖片分析：圖片下載中，先用 Gemini Flash 提取已到達圖片的文字...")
+                report("ocr", streaming=True)
+            chunks.append(asyncio.ensure_future(run_chunk(batch, count - len(batch))))
+            batch = []
+
+        try:
+            while (parts := await queue.get()) is not None:
+                if sources >= max_images:
+                    continue
+                sources += 1
+                for part in parts:
+                    batch.append(part)
+                    count += 1
+                    if len(batch) == per_request:
+                        submit()
+            if batch:
+                submit()
+            if not chunks:
+                return ""
+
+            texts, responses, hits = {}, [], 0
+            for chunk_texts, chunk_responses, chunk_hits in await asyncio.gather(*chunks):
+                texts.update(chunk_texts)
+                responses.extend(chunk_responses)
+                hits += chunk_hits
+        finally:
+            for task in chunks:
+                task.cancel()
+        return await generation_telemetry.run_in_executor(
+            executor, self._finish_ocr, texts, responses, count, hits, user_id,
         )
 
-        results = []
-        for i, (img_bytes, mime_type) in enumerate(image_parts):
+    def _extract_image_group(self, group: list[tuple[int, tuple[bytes, str]]]) -> tuple[dict, list]:
+        """提取一組圖片的文字，回傳 ({圖片索引: 文字}, [response...])"""
+        if len(group) > 1:
+            responses = []
             try:
-                contents = [
-                    extract_prompt,
+                contents = [IMAGE_EXTRACT_MULTI_PROMPT.format(count=len(group))]
+                for _, (img_bytes, mime_type) in group:
+                    contents.append(types.Part.from_bytes(data=img_bytes, mime_type=mime_type))
+                response = self._ocr_request(contents, max_output_tokens=2048 * len(group))
+                responses.append(response)
+                sections = self._split_ocr_sections(response.text or "", len(group))
+                if sections is not None:
+                    return {idx: sections[k] for k, (idx, _) in enumerate(group) if sections[k]}, responses
+                logger.warning(f"多圖提取結果無法切分（{len(group)} 張），改為逐張處理")
+            except Exception as e:
+                logger.warning(f"多圖提取失敗（{len(group)} 張），改為逐張處理: {e}")
+            texts, single_responses = self._extract_image_singles(group)
+            return texts, responses + single_responses
+        return self._extract_image_singles(group)
+
+    def _extract_image_singles(self, group: list[tuple[int, tuple[bytes, str]]]) -> tuple[dict, list]:
+        """逐張提取圖片文字，失敗的圖片跳過"""
+        texts = {}
+        responses = []
+        for idx, (img_bytes, mime_type) in group:
+            try:
+                response = self._ocr_request([
+                    IMAGE_EXTRACT_PROMPT,
                     types.Part.from_bytes(data=img_bytes, mime_type=mime_type),
-                ]
-                response = self.gemini_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=contents,
-                    config=types.GenerateContentConfig(
-                        temperature=0.1,
-                        max_output_tokens=2048,
-                    ),
-                )
+                ])
+                responses.append(response)
                 if response.text:
-                    results.append(f"【圖片 {i+1}】\n{response.text}")
-                track_gemini_usage(response, model="gemini-2.5-flash", user_id=user_id)
+                    texts[idx] = response.text
             except Exception as e:
-                logger.warning(f"圖片 {i+1}/{len(image_parts)} 提取失敗（跳過）: {e}")
+                logger.warning(f"圖片 {idx+1} 提取失敗（跳過）: {e}")
+        return texts, responses
 
-        logger.info(f"Gemini Flash 圖片文字提取完成：{len(results)}/{len(image_parts)} 張成功")
-        return "\n\n".join(results)
+    def _ocr_request(self, contents: list, max_output_tokens: int = 2048):
+        rate_limiter.acquire("gemini:gemini-2.5-flash")
+        return self.gemini_client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=contents,
+            config=types.GenerateContentConfig(
+                temperature=0.1,
+                max_output_tokens=max_output_tokens,
+            ),
+        )
+
+    @staticmethod
+    def _split_ocr_sections(text: str, count: int) -> list[str] | None:
+        """依「=== 圖片 N ===」分隔行切分多圖提取結果；編號不完整時回傳 None"""
+        matches = list(OCR_SECTION_RE.finditer(text))
+        numbers = [int(m.group(1)) for m in matches]
+        if numbers != list(range(1, count + 1)):
+            return None
+        sections = []
+        for k, m in enumerate(matches):
+            end = matches[k + 1].start() if k + 1 < len(matches) else len(text)
+            sections.append(text[m.end():end].strip())
+        return sections
+
+    @classmethod
+    def _anthropic_request(cls, use_model: str, system_prompt: str | list[dict], user_message: str, image_parts: list[tuple[bytes, str]] | None) -> dict:
+        return dict(
+            model=use_model,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            system=system_prompt,
+            messages=[{"role": "user", "content": cls._anthropic_content(user_message, image_parts)}],
+        )
 
-    def _call_anthropic(self, use_model: str, system_prompt: str, user_message: str, image_parts: list[tuple[bytes, str]] | None = None, max_retries: int = 3) -> tuple:
-        """呼叫 Anthropic Claude API，回傳 (generated_text, response)。超時/暫時性錯誤自動重試。"""
+    @staticmethod
+    def _anthropic_content(user_message: str, image_parts: list[tuple[bytes, str]] | None) -> list[dict]:
         content = [{"type": "text", "text": user_message}]
         if image_parts:
             for img_bytes, mime_type in image_parts:
@@ -207,162 +512,699 @@ class LLMService:
                         "data": base64.b64encode(img_bytes).decode("utf-8"),
                     },
                 })
+        return content
+
+    def _call_anthropic(self, use_model: str, system_prompt: str | list[dict], user_message: str, image_parts: list[tuple[bytes, str]] | None = None, max_retries: int = 3, on_delta=None) -> tuple:
+        """呼叫 Anthropic Claude API，回傳 (generated_text, response)。超時/暫時性錯誤自動重試（見 llm_retry）。
+
+        system_prompt: 字串或 system blocks（見 anthropic_system_blocks，含 prompt 快取斷點）
+        on_delta: 同 _call_gemini，提供時改用串流模式
+        """
+        request = self._anthropic_request(use_model, system_prompt, user_message, image_parts)
+
+        policy = RetryPolicy("Claude", circuit_breakers.get("anthropic", use_model), ANTHROPIC_TRANSIENT_ERRORS, max_retries, on_delta)
+        for attempt in range(max_retries):
+            try:
+                rate_limiter.acquire(f"anthropic:{use_model}")
+            except RateLimitTimeout as e:
+                raise policy.with_history(e)
+            policy.start(attempt)
+            try:
+                if on_delta:
+                    generated_text, response = self._stream_anthropic(request, on_delta)
+                else:
+                    response = self.anthropic_client.messages.create(**request)
+                    generated_text = response.content[0].text
+            except Exception as e:
+                time.sleep(policy.failed(e))
+                continue
+            except BaseException:
+                policy.abandon()
+                raise
+            generation_telemetry.note_llm_call(use_model, policy.elapsed(), policy.elapsed())
+            policy.succeeded()
+            return generated_text, response
+        raise policy.exhausted()
+
+    # ── async 版本（FastAPI handler 直接 await，不佔用執行緒；重試以 asyncio.sleep 退避）──
+
+    async def _astream_gemini(self, use_model: str, contents: list, config, on_delta) -> tuple:
+        chunks = []
+        last_chunk = None
+        async for chunk in await self.async_gemini_client.models.generate_content_stream(
+            model=use_model, contents=contents, config=config,
+        ):
+            last_chunk = chunk
+            text = chunk.text
+            if text:
+                chunks.append(text)
+                on_delta(text)
+        return "".join(chunks), last_chunk
+
+    async def _astream_anthropic(self, request: dict, on_delta) -> tuple:
+        chunks = []
+        async with self.async_anthropic_client.messages.stream(**request) as stream:
+            async for text in stream.text_stream:
+                chunks.append(text)
+                on_delta(text)
+            response = await stream.get_final_message()
+        return "".join(chunks), response
+
+    async def _agemini_once(self, use_model: str, contents: list, config, on_delta) -> tuple:
+        if on_delta:
+            return await self._astream_gemini(use_model, contents, config, on_delta)
+        response = await self.async_gemini_client.models.generate_content(
+            model=use_model, contents=contents, config=config,
+        )
+        return response.text, response
+
+    async def _aanthropic_once(self, request: dict, on_delta) -> tuple:
+        if on_delta:
+            return await self._astream_anthropic(request, on_delta)
+        response = await self.async_anthropic_client.messages.create(**request)
+        return response.content[0].text, response
+
+    async def _ahedged(self, provider: str, use_model: str, attempt, on_delta, user_id: int | None, limit_key: str) -> tuple:
+        """執行單次 LLM 呼叫，必要時送出對沖請求（LLM_HEDGE_ENABLED）
+
+        attempt(delta_callback) 回傳一次呼叫的 coroutine。呼叫超過該模型近期延遲的
+        LLM_HEDGE_PERCENTILE 仍無輸出（串流：第一個片段；非串流：完整回應）且在對沖預算內時，
+        送出第二個相同請求，先有輸出者勝出、另一個取消；被取消的請求以相同輸入 token 記入用量。
+        對沖請求不等待速率額度（limit_key 的桶沒有餘額時放棄對沖）
+        """
+        mode = "stream" if on_delta else "full"
+        delay = hedge_policy.hedge_delay(use_model, mode)
+        hedge_policy.note_request()
+
+        starts: list[float] = []
+        tasks: list[asyncio.Task] = []
+        winner: Optional[int] = None
+        first_output: Optional[float] = None
+
+        def claim(i: int) -> bool:
+            """第 i 個請求產生輸出：第一個產生輸出者勝出，取消其他請求"""
+            nonlocal winner, first_output
+            if winner is None:
+                winner = i
+                first_output = time.time() - starts[i]
+                for j, task in enumerate(tasks):
+                    if j != i:
+                        task.cancel()
+            return winner == i
+
+        def delta_for(i: int):
+            def delta(text):
+                if claim(i):
+                    on_delta(text)
+            return delta
+
+        def launch():
+            starts.append(time.time())
+            i = len(tasks)
+            tasks.append(asyncio.ensure_future(attempt(delta_for(i) if on_delta else None)))
+
+        launch()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if (
+                    not done and winner is None and hedge_policy.try_acquire()
+                    and await rate_limiter.atry_acquire(limit_key)
+                ):
+                    logger.info(f"{use_model} 超過 {delay:.1f}s 無輸出，送出對沖請求")
+                    launch()
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    # 非串流（或串流但沒有任何片段）：完成即為輸出
+                    i = tasks.index(task)
+                    if not claim(i):
+                        continue
+                    generated_text, response = task.result()
+                    hedge_policy.record_latency(use_model, mode, first_output)
+                    generation_telemetry.note_llm_call(use_model, first_output, time.time() - starts[i], hedged=len(tasks) > 1)
+                    if len(tasks) > 1:
+                        if i > 0:
+                            hedge_policy.note_hedge_win()
+                        await asyncio.to_thread(self._record_hedge_losers, provider, use_model, response, len(tasks) - 1, user_id)
+                    return generated_text, response
+            raise error
+        finally:
+            # 呼叫端被取消（如任務中止）時一併取消尚未結束的請求
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _record_hedge_losers(provider: str, model: str, response, count: int, user_id: int | None):
+        """被取消的對沖請求輸入仍會計費：以勝出請求的輸入 token 數記入用量（輸出以 0 計）"""
+        try:
+            from app.services.usage_tracker import usage_tracker
+
+            if provider == "google":
+                meta = getattr(response, "usage_metadata", None)
+                input_tokens = (getattr(meta, "prompt_token_count", 0) or 0) if meta else 0
+            else:
+                usage = getattr(response, "usage", None)
+                input_tokens = (getattr(usage, "input_tokens", 0) or 0) if usage else 0
+            for _ in range(count):
+                usage_tracker.record_usage(
+                    provider=provider, model=model, input_tokens=input_tokens, output_tokens=0, user_id=user_id,
+                )
+        except Exception as e:
+            logger.warning(f"對沖請求用量記錄失敗: {e}")
+
+    async def _acall_gemini(self, use_model: str, system_prompt: str, user_message: str, image_parts: list[tuple[bytes, str]] | None = None, max_retries: int = 3, on_delta=None, template_id: str | None = None, user_id: int | None = None) -> tuple:
+        """_call_gemini 的 async 版本（相同的重試策略，另支援對沖請求，見 _ahedged）"""
+        cache_name = None
+        if template_id:
+            # 建立 / 延長上下文快取是少見的同步呼叫，丟到執行緒避免卡住 event loop
+            cache_name = await asyncio.to_thread(
+                gemini_context_cache.get, self.gemini_client, use_model, template_id, system_prompt,
+            )
+        request = _GeminiRequest(use_model, system_prompt, user_message, image_parts, template_id, cache_name)
 
-        retry_history = []
+        policy = RetryPolicy("Gemini", circuit_breakers.get("google", use_model), GEMINI_TRANSIENT_ERRORS, max_retries, on_delta)
         for attempt in range(max_retries):
-            attempt_start = time.time()
             try:
-                response = self.anthropic_client.messages.create(
-                    model=use_model,
-                    max_tokens=settings.LLM_MAX_TOKENS,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": content}],
+                await rate_limiter.aacquire(f"gemini:{use_model}")
+            except RateLimitTimeout as e:
+                raise policy.with_history(e)
+            policy.start(attempt)
+            contents, config = request.contents, request.config()
+            try:
+                generated_text, response = await self._ahedged(
+                    "google", use_model,
+                    lambda delta: self._agemini_once(use_model, contents, config, delta),
+                    on_delta, user_id, f"gemini:{use_model}",
                 )
-                generated_text = response.content[0].text
-                if retry_history:
-                    logger.info(f"Claude API 第 {attempt+1} 次嘗試成功（前 {len(retry_history)} 次失敗）")
-                return generated_text, response
             except Exception as e:
-                elapsed = round(time.time() - attempt_start, 1)
-                error_str = str(e).lower()
-                retry_history.append(f"第{attempt+1}次({elapsed}s): {type(e).__name__}: {str(e)[:200]}")
-                if any(kw in error_str for kw in ["timed out", "timeout", "529", "503", "500", "overloaded", "unavailable"]):
-                    wait = 2 ** attempt * 5
-                    logger.warning(f"Claude API 暫時性錯誤（第 {attempt+1}/{max_retries} 次），{wait}s 後重試: {e}")
-                    time.sleep(wait)
-                    continue
-                error = RuntimeError(f"Claude API 錯誤: {e}")
-                error.retry_history = retry_history
-                raise error
-        error = RuntimeError(f"Claude API {max_retries} 次重試均失敗")
-        error.retry_history = retry_history
-        raise error
+                await asyncio.sleep(policy.failed(e, request.recover))
+                continue
+            except BaseException:
+                policy.abandon()
+                raise
+            policy.succeeded()
+            return generated_text, response
+        raise policy.exhausted()
 
-    def generate_article(self, products, db: Session, article_type: str = "comparison", target_forum: str = "goodthings", prompt_template_id: Optional[int] = None, model: Optional[str] = None, user_id: Optional[int] = None, include_images: bool = False, image_sources: list[str] | None = None, disable_system_instructions: bool = False, keyword_strategy: dict | None = None) -> dict:
-        """生成文章"""
-        product_ids = [p.id for p in products]
+    async def _acall_anthropic(self, use_model: str, system_prompt: str | list[dict], user_message: str, image_parts: list[tuple[bytes, str]] | None = None, max_retries: int = 3, on_delta=None, user_id: int | None = None) -> tuple:
+        """_call_anthropic 的 async 版本（相同的重試策略，另支援對沖請求，見 _ahedged）"""
+        request = self._anthropic_request(use_model, system_prompt, user_message, image_parts)
 
-        # 準備商品資訊
-        products_info = self._format_products_info(products)
+        policy = RetryPolicy("Claude", circuit_breakers.get("anthropic", use_model), ANTHROPIC_TRANSIENT_ERRORS, max_retries, on_delta)
+        for attempt in range(max_retries):
+            try:
+                await rate_limiter.aacquire(f"anthropic:{use_model}")
+            except RateLimitTimeout as e:
+                raise policy.with_history(e)
+            policy.start(attempt)
+            try:
+                generated_text, response = await self._ahedged(
+                    "anthropic", use_model,
+                    lambda delta: self._aanthropic_once(request, delta),
+                    on_delta, user_id, f"anthropic:{use_model}",
+                )
+            except Exception as e:
+                await asyncio.sleep(policy.failed(e))
+                continue
+            except BaseException:
+                policy.abandon()
+                raise
+            policy.succeeded()
+            return generated_text, response
+        raise policy.exhausted()
 
-        # 載入 system prompt（從 DB 或預設）
+    @staticmethod
+    def _load_system_parts(db: Session, prompt_template_id: Optional[int], user_id: Optional[int], disable_system_instructions: bool) -> tuple[list[str], str]:
+        """載入 system prompt（從 DB 或預設）並組合系統指示，回傳 (system_parts, template_key)"""
+        template = None
         if prompt_template_id:
             template = db.query(PromptTemplate).filter(PromptTemplate.id == prompt_template_id).first()
-            system_prompt = template.content if template else get_default_prompt(db, user_id=user_id)
+        system_prompt = template.content if template else get_default_prompt(db, user_id=user_id)
+
+        # 組合系統指示（程式碼層級）+ 使用者範本
+        if disable_system_instructions:
+            system_parts = [system_prompt]
         else:
-            system_prompt = get_default_prompt(db, user_id=user_id)
+            # 分兩段：SYSTEM_INSTRUCTIONS 全站共用、範本依使用者不同（Claude 各自設快取斷點）
+            system_parts = [
+                f"{SYSTEM_INSTRUCTIONS}\n\n",
+                f"---\n\n以下是使用者的寫作風格範本：\n\n{system_prompt}",
+            ]
+        # Gemini 上下文快取的範本識別（內容雜湊另外計算，範本修改後自動換新快取）
+        template_key = f"template-{template.id}" if template else f"default-{user_id or 0}"
+        if disable_system_instructions:
+            template_key += "-raw"
+        return system_parts, template_key
 
-        # 組合使用者訊息（商品資料），注入當前年份
+    @staticmethod
+    def _format_keyword_context(keyword_strategy: dict | None) -> Optional[str]:
+        if not keyword_strategy:
+            return None
+        from app.services.keyword_research_service import keyword_research_service
+        return keyword_research_service.format_keyword_context(keyword_strategy)
+
+    @staticmethod
+    def _build_user_message(target_forum: str, products_info: str, keyword_context: Optional[str]) -> str:
+        """組合使用者訊息（商品資料），注入當前年份；有關鍵字策略時注入到商品資料之前"""
         from datetime import datetime
         current_year = datetime.now().year
         year_reminder = f"⚠️ 當前年份是 {current_year} 年，標題和文章中提到年份時必須使用 {current_year}。\n\n目標看板：{target_forum}"
 
-        # 若有關鍵字策略，注入到商品資料之前
-        if keyword_strategy:
-            from app.services.keyword_research_service import keyword_research_service
-            keyword_context = keyword_research_service.format_keyword_context(keyword_strategy)
-            user_message = f"{year_reminder}\n\n{keyword_context}\n{products_info}"
+        if keyword_context:
+            return f"{year_reminder}\n\n{keyword_context}\n{products_info}"
+        return f"{year_reminder}\n\n以下是商品資料，請根據這些資訊撰寫文章：\n\n{products_info}"
+
+    def _compose_user_message(self, products, target_forum: str, keyword_context: Optional[str], image_parts, description_chars: int = prompt_budget.DESCRIPTION_CHARS) -> str:
+        user_message = self._build_user_message(target_forum, self._format_products_info(products, description_chars), keyword_context)
+        if image_parts:
+            user_message += "\n\n（以下附有商品圖片，請仔細閱讀圖片中的文字資訊，融入文章內容）"
+        return user_message
+
+    @staticmethod
+    def _with_extracted_text(user_message: str, extracted_text: Optional[str]) -> str:
+        """附加 Claude 兩階段讀圖提取的圖片文字"""
+        if extracted_text:
+            return f"{user_message}\n\n以下是從商品圖片中提取的詳細資訊：\n{extracted_text}"
+        return user_message
+
+    def _count_tokens(self, use_model: str, system_parts: list[str], user_message: str, image_parts) -> int:
+        """供應商 count_tokens 精算輸入 token（不計費，但多一次往返）"""
+        if is_anthropic_model(use_model):
+            client = self.anthropic_client.with_options(timeout=prompt_budget.COUNT_TOKENS_TIMEOUT, max_retries=0)
+            return client.messages.count_tokens(
+                model=use_model,
+                system=anthropic_system_blocks(*system_parts),
+                messages=[{"role": "user", "content": user_message}],
+            ).input_tokens
+        # Gemini API 的 count_tokens 不接受 system_instruction，系統提示當作內容一併計數
+        response = self.gemini_client.models.count_tokens(
+            model=use_model,
+            contents=["".join(system_parts)] + self._gemini_contents(user_message, image_parts),
+            config=types.CountTokensConfig(http_options=types.HttpOptions(timeout=int(prompt_budget.COUNT_TOKENS_TIMEOUT * 1000))),
+        )
+        return response.total_tokens
+
+    def _fit_prompt(self, use_model: str, system_parts: list[str], products, target_forum: str, keyword_context: Optional[str], image_parts, extracted_text: Optional[str]) -> tuple[str, list | None, Optional[str]]:
+        """生成前 token 預算（見 prompt_budget）：組合使用者訊息，超出預算時依 TRIM_STEPS 裁減
+
+        Returns:
+            (user_message, image_parts, extracted_text)；user_message 不含讀圖文字（由 _run_model 附加）
+        """
+        limit = prompt_budget.budget(use_model)
+        system_text = "".join(system_parts)
+        description_chars = prompt_budget.DESCRIPTION_CHARS
+
+        def measure() -> tuple[str, int]:
+            message = self._compose_user_message(products, target_forum, keyword_context, image_parts, description_chars)
+            return message, prompt_budget.estimate(use_model, system_text, self._with_extracted_text(message, extracted_text), image_parts)
+
+        user_message, estimated = measure()
+        # 精算 / 估算的比例，用來校正裁減後的估算值
+        scale, source = 1.0, "estimate"
+        if prompt_budget.needs_precise_count(estimated, limit):
+            try:
+                counted = self._count_tokens(use_model, system_parts, self._with_extracted_text(user_message, extracted_text), image_parts)
+                scale, source = counted / max(estimated, 1), "provider"
+            except Exception as e:
+                logger.warning(f"count_tokens 失敗（{use_model}），改用本地估算: {e}")
+        initial = tokens = round(estimated * scale)
+
+        trimmed = []
+        for field, value in prompt_budget.TRIM_STEPS:
+            if tokens <= limit:
+                break
+            if field == "description":
+                if description_chars <= value:
+                    continue
+                description_chars = value
+            elif field == "images":
+                # Claude 不傳圖片（以讀圖文字代替），裁圖片無效
+                if not image_parts or is_anthropic_model(use_model):
+                    continue
+                image_parts = image_parts[:int(len(image_parts) * value)] or None
+            elif field == "ocr":
+                if not extracted_text:
+                    continue
+                extracted_text = extracted_text[:int(len(extracted_text) * value)]
+            trimmed.append(f"{field}:{value}")
+            user_message, estimated = measure()
+            tokens = round(estimated * scale)
+
+        if trimmed:
+            logger.warning(f"prompt 約 {initial} tokens 超出預算 {limit}（{use_model}），已裁減 {trimmed} → 約 {tokens}")
+        if tokens > limit:
+            logger.warning(f"prompt 裁減後仍約 {tokens} tokens，超出預算 {limit}（{use_model}）")
+        generation_telemetry.note_prompt(budget=limit, initial=initial, estimated=tokens, source=source, trimmed=trimmed)
+        return user_message, image_parts, extracted_text
+
+    @staticmethod
+    def _generation_error(e: Exception, use_model: str, products, image_parts) -> RuntimeError:
+        logger.error(f"LLM API 呼叫失敗 ({use_model}), 商品數={len(products)}, 附圖={bool(image_parts)}: {type(e).__name__}: {e}")
+        new_error = RuntimeError(f"文章生成失敗: {e}")
+        # 保留 retry_history 供錯誤報告使用
+        if hasattr(e, "retry_history"):
+            new_error.retry_history = e.retry_history
+        return new_error
+
+    def _ocr_for(self, use_model: str, extracted_text: Optional[str], image_groups: list, user_id: Optional[int], report) -> Optional[str]:
+        """Claude 兩階段讀圖：尚未提取圖片文字時先用 Gemini Flash 讀圖（極低成本），
+        再把提取的純文字傳給 Claude，避免 Claude 高額的圖片 token 費用。Gemini 模型直接讀圖，回傳 None
+        """
+        if not is_anthropic_model(use_model):
+            return None
+        if extracted_text is None and image_groups:
+            logger.info(f"兩階段圖片分析：先用 Gemini Flash 提取 {len(image_groups)} 張圖片文字...")
+            report("ocr", images=len(image_groups))
+            extracted_text = self._extract_image_info(image_groups, user_id=user_id)
+        return extracted_text
+
+    async def _aocr_for(self, use_model: str, extracted_text: Optional[str], image_groups: list, user_id: Optional[int], report, executor) -> Optional[str]:
+        """_ocr_for 的 async 版本（OCR 在 executor 執行）"""
+        if not is_anthropic_model(use_model):
+            return None
+        if extracted_text is not None or not image_groups:
+            return extracted_text
+        return await generation_telemetry.run_in_executor(
+            executor, self._ocr_for, use_model, None, image_groups, user_id, report,
+        )
+
+    def _run_model(self, use_model: str, system_parts: list[str], user_message: str, image_parts, template_key: str, user_id: Optional[int], report, on_delta, cache_key: Optional[str] = None, extracted_text: Optional[str] = None) -> str:
+        """以指定模型生成一次，回傳 LLM 原始輸出
+
+        cache_key: 生成結果寫入 LLM 回應快取的鍵（見 _request_key，呼叫端已先查過快取），None 時不寫入
+        extracted_text: Claude 模型附加的圖片文字（見 _ocr_for），Claude 不直接收圖片
+        """
+        if is_anthropic_model(use_model):
+            user_message = self._with_extracted_text(user_message, extracted_text)
+
+            # 不傳圖片給 Claude，只傳純文字
+            report("llm", model=use_model)
+            generated_text, response = self._call_anthropic(
+                use_model, anthropic_system_blocks(*system_parts), user_message,
+                image_parts=None, on_delta=on_delta,
+            )
+            logger.info(f"Claude API 回應成功，文字長度: {len(generated_text)}")
+            track_anthropic_usage(response, model=use_model, user_id=user_id)
         else:
-            user_message = f"{year_reminder}\n\n以下是商品資料，請根據這些資訊撰寫文章：\n\n{products_info}"
+            # Gemini 模型直接傳圖片（成本已經很低）
+            report("llm", model=use_model)
+            generated_text, response = self._call_gemini(
+                use_model, "".join(system_parts), user_message,
+                image_parts=image_parts, on_delta=on_delta, template_id=template_key,
+            )
+            logger.info(f"Gemini API 回應成功，文字長度: {len(generated_text)}")
+            track_gemini_usage(response, model=use_model, user_id=user_id)
+        if cache_key:
+            llm_response_cache.put(cache_key, generated_text)
+        return generated_text
 
-        # 組合系統指示（程式碼層級）+ 使用者範本
-        if disable_system_instructions:
-            full_system_prompt = system_prompt
+    async def _arun_model(self, use_model: str, system_parts: list[str], user_message: str, image_parts, template_key: str, user_id: Optional[int], report, on_delta, executor, cache_key: Optional[str] = None, extracted_text: Optional[str] = None) -> str:
+        """_run_model 的 async 版本（OCR 在 executor 執行）
+
+        有 cache_key 時另合併同一使用者進行中的相同請求（single_flight）：後到者回報 llm 階段（coalesced=True），
+        等待第一個請求完成後取得相同結果，串流模式一次送出完整內容。
+        合併鍵含 user_id：用量只記在實際呼叫者名下，不同使用者的請求不能互相搭便車
+        extracted_text: Claude 模型附加的圖片文字（流水線 / _aocr_for 已先完成的讀圖）
+        """
+        if not cache_key:
+            return await self._agenerate_text(use_model, system_parts, user_message, image_parts, template_key, user_id, report, on_delta, executor, extracted_text)
+
+        flight_key = ("article_llm", user_id, cache_key)
+        joined = single_flight.in_flight(flight_key)
+        if joined:
+            report("llm", model=use_model, coalesced=True)
+        generated_text = await single_flight.ado(flight_key, lambda: self._agenerate_text(
+            use_model, system_parts, user_message, image_parts, template_key, user_id, report, on_delta, executor, extracted_text,
+        ))
+        if joined and on_delta:
+            on_delta(generated_text)
+        llm_response_cache.put(cache_key, generated_text)
+        return generated_text
+
+    async def _agenerate_text(self, use_model: str, system_parts: list[str], user_message: str, image_parts, template_key: str, user_id: Optional[int], report, on_delta, executor, extracted_text: Optional[str] = None) -> str:
+        """實際呼叫 LLM 生成一次（_arun_model 未命中快取時）"""
+        if is_anthropic_model(use_model):
+            user_message = self._with_extracted_text(user_message, extracted_text)
+
+            report("llm", model=use_model)
+            generated_text, response = await self._acall_anthropic(
+                use_model, anthropic_system_blocks(*system_parts), user_message,
+                on_delta=on_delta, user_id=user_id,
+            )
+            logger.info(f"Claude API 回應成功，文字長度: {len(generated_text)}")
+            # 用量寫入 DB，丟到 executor
+            await generation_telemetry.run_in_executor(
+                executor, functools.partial(track_anthropic_usage, response, model=use_model, user_id=user_id),
+            )
         else:
-            full_system_prompt = f"{SYSTEM_INSTRUCTIONS}\n\n---\n\n以下是使用者的寫作風格範本：\n\n{system_prompt}"
+            report("llm", model=use_model)
+            generated_text, response = await self._acall_gemini(
+                use_model, "".join(system_parts), user_message,
+                image_parts=image_parts, on_delta=on_delta, template_id=template_key, user_id=user_id,
+            )
+            logger.info(f"Gemini API 回應成功，文字長度: {len(generated_text)}")
+            await generation_telemetry.run_in_executor(
+                executor, functools.partial(track_gemini_usage, response, model=use_model, user_id=user_id),
+            )
+        return generated_text
+
+    def _request_key(self, use_model: str, system_parts: list[str], products, target_forum: str, keyword_context: Optional[str], image_parts, use_cache: bool) -> Optional[str]:
+        """LLM 回應快取鍵：以 token 預算裁減前的完整輸入計算，讀圖與預算計算之前就能查快取（use_cache=False 時為 None）"""
+        if not use_cache:
+            return None
+        user_message = self._compose_user_message(products, target_forum, keyword_context, image_parts)
+        return llm_response_cache.make_key(use_model, "".join(system_parts), user_message, image_parts)
+
+    @staticmethod
+    def _cached_response(cache_key: Optional[str], use_model: str, report, on_delta) -> Optional[str]:
+        """查詢 LLM 回應快取；命中時回報 llm 階段（cached=True），串流模式一次送出完整內容"""
+        if not cache_key:
+            return None
+        cached = llm_response_cache.get(cache_key)
+        if cached is None:
+            return None
+        logger.info(f"LLM 回應快取命中（{use_model}），略過 LLM 呼叫，文字長度: {len(cached)}")
+        report("llm", model=use_model, cached=True)
+        if on_delta:
+            on_delta(cached)
+        return cached
+
+    @staticmethod
+    def _failover_model(use_model: str, error: Exception) -> Optional[str]:
+        """供應商暫時性故障（斷路器開啟 / 重試用盡）時回傳設定的備援模型，否則 None"""
+        fallback = settings.LLM_FAILOVER_MODELS.get(use_model)
+        if not fallback or fallback == use_model or not getattr(error, "transient", False):
+            return None
+        logger.warning(f"{use_model} 暫時不可用，改用備援模型 {fallback}: {error}")
+        return fallback
+
+    @staticmethod
+    def _merge_retry_history(primary: Exception, fallback: Exception, primary_model: str):
+        """備援也失敗時，把主模型的重試紀錄併入錯誤報告"""
+        history = [f"[{primary_model}] {r}" for r in getattr(primary, "retry_history", [])]
+        fallback.retry_history = history + list(getattr(fallback, "retry_history", []))
+
+    def generate_article(self, products, db: Session, article_type: str = "comparison", target_forum: str = "goodthings", prompt_template_id: Optional[int] = None, model: Optional[str] = None, user_id: Optional[int] = None, include_images: bool = False, image_sources: list[str] | None = None, disable_system_instructions: bool = False, keyword_strategy: dict | None = None, progress=None, on_delta=None, use_cache: bool = True, extracted_text: Optional[str] = None, image_groups: Optional[list] = None) -> dict:
+        """生成文章
+
+        progress: 選用的階段回報 callback（stage: str），供任務進度事件使用
+        on_delta: 選用的串流文字片段 callback（見 _call_gemini），提供時以串流模式呼叫 LLM
+        use_cache: False 時不使用 LLM 回應快取（刻意重新生成不同版本）
+        extracted_text: 已先完成的圖片文字提取（Celery chain 的 OCR 步驟），Claude 模型不再重複 OCR
+        image_groups: 已下載並前處理的圖片（Celery chain 的 fetch_images 步驟），不再重新下載
+        """
+        report = progress or (lambda stage, **data: None)
+        use_model = model or settings.LLM_MODEL
+        system_parts, template_key = self._load_system_parts(db, prompt_template_id, user_id, disable_system_instructions)
 
         # 下載圖片供 LLM 多模態分析
         image_parts = None
-        if include_images:
-            sources = image_sources or ["description"]
-            image_parts = self._download_images(products, sources)
-            if image_parts:
-                user_message += "\n\n（以下附有商品圖片，請仔細閱讀圖片中的文字資訊，融入文章內容）"
-            else:
+        if not include_images:
+            image_groups = []
+        else:
+            if image_groups is None:
+                report("images")
+                image_groups = self._download_images(products, image_sources or ["description"])
+            image_parts = self._flatten(image_groups) or None
+            if not image_parts:
                 logger.warning("所有圖片下載失敗，將以純文字模式生成")
+        keyword_context = self._format_keyword_context(keyword_strategy)
+        request_image_parts = image_parts
 
-        use_model = model or settings.LLM_MODEL
-        try:
-            if is_anthropic_model(use_model):
-                # 兩階段策略：Claude 模型 + 有圖片時，先用 Gemini Flash 讀圖（極低成本），
-                # 再把提取的純文字傳給 Claude，避免 Claude 高額的圖片 token 費用
-                if image_parts:
-                    logger.info(f"兩階段圖片分析：先用 Gemini Flash 提取 {len(image_parts)} 張圖片文字...")
-                    extracted_text = self._extract_image_info(image_parts, user_id=user_id)
-                    if extracted_text:
-                        user_message += f"\n\n以下是從商品圖片中提取的詳細資訊：\n{extracted_text}"
-                    # 不傳圖片給 Claude，只傳純文字
-                    image_parts = None
-
-                generated_text, response = self._call_anthropic(use_model, full_system_prompt, user_message, image_parts=None)
-                logger.info(f"Claude API 回應成功，文字長度: {len(generated_text)}")
-                track_anthropic_usage(response, model=use_model, user_id=user_id)
-            else:
-                # Gemini 模型直接傳圖片（成本已經很低）
-                generated_text, response = self._call_gemini(use_model, full_system_prompt, user_message, image_parts=image_parts)
-                logger.info(f"Gemini API 回應成功，文字長度: {len(generated_text)}")
-                track_gemini_usage(response, model=use_model, user_id=user_id)
+        # 先查 LLM 回應快取：命中時不必讀圖、不必計算 token 預算
+        cache_key = self._request_key(use_model, system_parts, products, target_forum, keyword_context, image_parts, use_cache)
+        generated_text = self._cached_response(cache_key, use_model, report, on_delta)
+        if generated_text is not None:
+            return self._build_result(generated_text, products, article_type)
+
+        # 先讀圖，token 預算才算得到讀圖文字
+        extracted_text = self._ocr_for(use_model, extracted_text, image_groups, user_id, report)
 
+        user_message, image_parts, extracted_text = self._fit_prompt(
+            use_model, system_parts, products, target_forum, keyword_context, image_parts, extracted_text,
+        )
+        try:
+            generated_text = self._run_model(
+                use_model, system_parts, user_message, image_parts, template_key, user_id, report, on_delta, cache_key, extracted_text,
+            )
         except Exception as e:
-            logger.error(f"LLM API 呼叫失敗 ({use_model}), 商品數={len(products)}, 附圖={bool(image_parts)}: {type(e).__name__}: {e}")
-            new_error = RuntimeError(f"文章生成失敗: {e}")
-            # 保留 retry_history 供錯誤報告使用
-            if hasattr(e, "retry_history"):
-                new_error.retry_history = e.retry_history
-            raise new_error from e
+            generation_telemetry.note_retries(len(getattr(e, "retry_history", ())))
+            fallback = self._failover_model(use_model, e)
+            if fallback is None:
+                raise self._generation_error(e, use_model, products, image_parts) from e
+            report("failover", model=fallback, failover_from=use_model)
+            fallback_key = self._request_key(fallback, system_parts, products, target_forum, keyword_context, request_image_parts, use_cache)
+            try:
+                generated_text = self._cached_response(fallback_key, fallback, report, on_delta)
+                if generated_text is None:
+                    generated_text = self._run_model(
+                        fallback, system_parts, user_message, image_parts, template_key, user_id, report, on_delta, fallback_key,
+                        self._ocr_for(fallback, extracted_text, image_groups, user_id, report),
+                    )
+            except Exception as e2:
+                generation_telemetry.note_retries(len(getattr(e2, "retry_history", ())))
+                self._merge_retry_history(e, e2, use_model)
+                raise self._generation_error(e2, fallback, products, image_parts) from e2
 
-        # 保存原始 Markdown 版本（方格子需要標題層級結構 → 自動目錄 → SEO）
-        raw_markdown = generated_text
+        return self._build_result(generated_text, products, article_type)
 
-        # 清除 Markdown 語法（Dcard 不支援）
-        generated_text = strip_markdown(generated_text)
+    async def agenerate_article(self, products, db: Session, article_type: str = "comparison", target_forum: str = "goodthings", prompt_template_id: Optional[int] = None, model: Optional[str] = None, user_id: Optional[int] = None, include_images: bool = False, image_sources: list[str] | None = None, disable_system_instructions: bool = False, keyword_strategy: dict | None = None, progress=None, on_delta=None, executor=None, use_cache: bool = True, llm_slot=None) -> dict:
+        """生成文章（async 版本，參數同 generate_article）
 
-        # 解析標題和內容
-        title, content = self._parse_title_content(generated_text, products, article_type)
+        各準備步驟以流水線（見 generation_pipeline）並行：範本載入、商品資料 / 關鍵字格式化、
+        圖片下載同時開始，Claude 模型的讀圖隨圖片到達逐組進行，全部完成後才呼叫 LLM。
+        LLM 呼叫走原生 async client，不佔用執行緒；圖片下載 / OCR 這類阻塞步驟
+        丟到 executor（未指定時為預設執行緒池）執行
 
-        # 建立圖片標記對應，並在 content_with_images 中嵌入實際圖片
-        image_map = {}
-        content_with_images = content
-        for p in products:
-            if p.images:
-                for idx, img_url in enumerate(p.images[:3]):
-                    marker = f"IMAGE:{p.id}:{idx}"
-                    image_map[marker] = img_url
-                    # 替換標記為 markdown 圖片語法
-                    content_with_images = content_with_images.replace(
-                        f"{{{{{marker}}}}}",
-                        f"\n\n![商品圖片]({img_url})\n\n"
-                    )
+        llm_slot: 選用的 async context manager，只在 LLM 呼叫期間佔用（如供應商並行額度），
+                  準備步驟不必排隊
+        結果另含 timings：{"stages": {階段: {"start_ms", "duration_ms"}}, "total_ms"}
+        """
+        report = progress or (lambda stage, **data: None)
+        use_model = model or settings.LLM_MODEL
+        pipeline = Pipeline()
 
-        # 清除殘留的 {{IMAGE:...}} 標記（LLM 可能產生不存在的索引或自創格式）
-        content = re.sub(r'\{\{IMAGE:[^}]*\}\}', '', content)
-        content_with_images = re.sub(r'\{\{IMAGE:[^}]*\}\}', '', content_with_images)
-
-        # 解析 Markdown 版本的標題和內容（保留 Markdown 語法）
-        _, content_markdown = self._parse_title_content(raw_markdown, products, article_type)
-        # 替換 {{IMAGE:...}} 標記為 Markdown 圖片語法（方格子支援圖片內嵌）
-        for marker, img_url in image_map.items():
-            content_markdown = content_markdown.replace(
-                f"{{{{{marker}}}}}",
-                f"\n\n![商品圖片]({img_url})\n\n"
+        async def load_template(_):
+            # 同步 DB 查詢丟到 executor，不佔用 event loop
+            return await generation_telemetry.run_in_executor(
+                executor, self._load_system_parts, db, prompt_template_id, user_id, disable_system_instructions,
             )
-        # 清除殘留的 {{IMAGE:...}} 標記（LLM 自創的不存在索引）
-        content_markdown = re.sub(r'\{\{IMAGE:[^}]*\}\}', '', content_markdown)
-
-        return {
-            "title": title,
-            "content": content,
-            "content_markdown": content_markdown,
-            "content_with_images": content_with_images,
-            "image_map": image_map,
+
+        async def format_keywords(_):
+            return self._format_keyword_context(keyword_strategy)
+
+        # 圖片先排入，下載工作最先送出，其餘準備步驟在下載期間完成
+        ocr_queue = None
+        if include_images:
+            sources = image_sources or ["description"]
+            if is_anthropic_model(use_model):
+                ocr_queue = asyncio.Queue()
+
+            async def download_images(_):
+                report("images")
+                try:
+                    return await self._adownload_images(
+                        products, sources, executor, on_parts=ocr_queue.put_nowait if ocr_queue else None,
+                    )
+                finally:
+                    if ocr_queue:
+                        ocr_queue.put_nowait(None)
+
+            pipeline.add("images", download_images)
+            if ocr_queue:
+                pipeline.add("ocr", lambda _: self._astream_ocr(ocr_queue, user_id, report, executor))
+        pipeline.add("template", load_template)
+        pipeline.add("keywords", format_keywords)
+
+        async def call_llm(results):
+            system_parts, template_key = results["template"]
+            image_groups = results.get("images") or []
+            image_parts = self._flatten(image_groups) or None
+            if include_images and not image_parts:
+                logger.warning("所有圖片下載失敗，將以純文字模式生成")
+            request_image_parts = image_parts
+            # 先查 LLM 回應快取：命中時不必計算 token 預算、不必排隊等 llm_slot
+            cache_key = self._request_key(use_model, system_parts, products, target_forum, results["keywords"], image_parts, use_cache)
+            cached = self._cached_response(cache_key, use_model, report, on_delta)
+            if cached is not None:
+                return cached
+            # token 預算（可能呼叫供應商 count_tokens）在佔用 llm_slot 之前完成
+            budget_started = time.perf_counter()
+            user_message, image_parts, extracted_text = await generation_telemetry.run_in_executor(executor, functools.partial(
+                self._fit_prompt, use_model, system_parts, products, target_forum, results["keywords"], image_parts, results.get("ocr"),
+            ))
+            pipeline.record("budget", budget_started)
+
+            queued = time.perf_counter()
+            async with llm_slot or contextlib.nullcontext():
+                pipeline.record("llm_queue", queued)
+                try:
+                    return await self._arun_model(
+                        use_model, system_parts, user_message, image_parts, template_key, user_id, report, on_delta, executor, cache_key, extracted_text,
+                    )
+                except Exception as e:
+                    generation_telemetry.note_retries(len(getattr(e, "retry_history", ())))
+                    fallback = self._failover_model(use_model, e)
+                    if fallback is None:
+                        raise self._generation_error(e, use_model, products, image_parts) from e
+                    report("failover", model=fallback, failover_from=use_model)
+                    fallback_key = self._request_key(fallback, system_parts, products, target_forum, results["keywords"], request_image_parts, use_cache)
+                    try:
+                        cached = self._cached_response(fallback_key, fallback, report, on_delta)
+                        if cached is not None:
+                            return cached
+                        return await self._arun_model(
+                            fallback, system_parts, user_message, image_parts, template_key, user_id, report, on_delta, executor, fallback_key,
+                            await self._aocr_for(fallback, extracted_text, image_groups, user_id, report, executor),
+                        )
+                    except Exception as e2:
+                        generation_telemetry.note_retries(len(getattr(e2, "retry_history", ())))
+                        self._merge_retry_history(e, e2, use_model)
+                        raise self._generation_error(e2, fallback, products, image_parts) from e2
+
+        pipeline.add("llm", call_llm, deps=[name for name in ("template", "keywords", "images", "ocr") if name in pipeline])
+        try:
+            generated_text = (await pipeline.run())["llm"]
+            render_started = time.perf_counter()
+            result = self._build_result(generated_text, products, article_type)
+            pipeline.record("render", render_started)
+        finally:
+            # 失敗時也保留已完成階段的時間供遙測
+            generation_telemetry.note_stages(pipeline.started, pipeline.timings)
+        result["timings"] = {"stages": pipeline.timings, "total_ms": pipeline.elapsed_ms()}
+        return result
+
+    def _build_result(self, generated_text: str, products, article_type: str) -> dict:
+        """LLM 原始輸出 → 純文字 / Markdown / 含圖片版本（一次掃描，見 article_renderer）"""
+        # 圖片標記對應：每個商品前 3 張圖
+        image_map = {
+            f"IMAGE:{p.id}:{idx}": img_url
+            for p in products if p.images
+            for idx, img_url in enumerate(p.images[:3])
         }
+        result = render_llm_output(generated_text, image_map)
+        if not result["title"]:
+            result["title"] = self._default_title(products, article_type)
+        result["image_map"] = image_map
+        return result
 
-    def _format_products_info(self, products) -> str:
-        """格式化商品資訊供 prompt 使用"""
+    def _format_products_info(self, products, description_chars: int = prompt_budget.DESCRIPTION_CHARS) -> str:
+        """格式化商品資訊供 prompt 使用（description_chars 為商品描述截取字數，0 則不附描述）"""
         info_parts = []
         for i, p in enumerate(products):
             price_str = f"NT${p.price:,.0f}" if p.price else "價格未知"
             original_price_str = f"NT${p.original_price:,.0f}" if p.original_price else ""
+            description_line = f"- 商品描述: {(p.description or '')[:description_chars]}\n" if description_chars else ""
             info = f"""---
 商品 {i+1}:
 - 商品 ID: {p.id}
@@ -374,46 +1216,53 @@ class LLMService:
 - 銷量: {p.sold or 'N/A'}
 - 店家: {p.shop_name or '未知'}
 - 商品連結: {p.product_url or '無'}
-- 商品描述: {(p.description or '')[:500]}
-- 可用圖片標記: {', '.join([f'{{{{IMAGE:{p.id}:{idx}}}}}' for idx in range(min(3, len(p.images) if p.images else 0))])}
+{description_line}- 可用圖片標記: {', '.join([f'{{{{IMAGE:{p.id}:{idx}}}}}' for idx in range(min(3, len(p.images) if p.images else 0))])}
 """
             info_parts.append(info)
         return "\n".join(info_parts)
 
-    def _parse_title_content(self, text: str, products, article_type: str) -> tuple:
-        """從生成文字中解析標題和內容"""
-        lines = text.strip().split('\n')
-        title = ""
-        content_start = 0
-
-        # 跳過分隔線（---、===、***），找第一個有意義的標題行
-        skip_patterns = {'---', '===', '***', '- - -', '* * *'}
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if not stripped or stripped in skip_patterns:
-                continue
-            # 找到 markdown 標題或實質內容
-            if stripped.startswith('#'):
-                title = stripped.lstrip('#').strip()
-            else:
-                title = stripped
-            content_start = i + 1
-            break
-
-        # 如果沒提取到標題，用預設
-        if not title:
-            product_names = [p.name for p in products]
-            if article_type == "comparison":
-                title = f"【比較】{' vs '.join([n[:15] for n in product_names[:3]])} 哪個值得買？"
-            elif article_type == "review":
-                title = f"【開箱】{product_names[0][:30]} 使用心得分享"
-            else:
-                title = f"【推薦】{product_names[0][:30]} 完整評測與購買指南"
+    @staticmethod
+    def _default_title(products, article_type: str) -> str:
+        """LLM 輸出沒有可用標題時的預設標題"""
+        product_names = [p.name for p in products]
+        if article_type == "comparison":
+            return f"【比較】{' vs '.join([n[:15] for n in product_names[:3]])} 哪個值得買？"
+        if article_type == "review":
+            return f"【開箱】{product_names[0][:30]} 使用心得分享"
+        return f"【推薦】{product_names[0][:30]} 完整評測與購買指南"
+
+
+
+class _GeminiRequest:
+    """一次 Gemini 生成請求的內容（重試間可能改為不帶上下文快取 / 不帶圖片）"""
 
-        content = '\n'.join(lines[content_start:]).strip()
+    def __init__(self, use_model: str, system_prompt: str, user_message: str, image_parts, template_id: str | None, cache_name: str | None):
+        self.use_model = use_model
+        self.system_prompt = system_prompt
+        self.user_message = user_message
+        self.image_parts = image_parts
+        self.template_id = template_id
+        self.cache_name = cache_name
+        self.contents = LLMService._gemini_contents(user_message, image_parts)
 
-        return title, content
+    def config(self):
+        return LLMService._gemini_config(self.system_prompt, self.cache_name)
 
+    def recover(self, e: Exception) -> bool:
+        """可改寫請求後立即重試的錯誤（見 RetryPolicy.failed）"""
+        # 上下文快取已過期 / 被刪除：改回一般請求
+        if self.cache_name and is_cache_error(e, self.cache_name):
+            logger.warning(f"Gemini 上下文快取無法使用，改帶完整 system prompt 重試: {e}")
+            gemini_context_cache.invalidate(self.use_model, self.template_id, self.cache_name)
+            self.cache_name = None
+            return True
+        # 圖片錯誤：fallback 純文字
+        if self.image_parts and "image" in str(e).lower():
+            logger.warning(f"Gemini 圖片處理失敗，改用純文字模式重試: {e}")
+            self.contents = [self.user_message]
+            self.image_parts = None
+            return True
+        return False
 
 
 # 單例
@@ -0,0 +1,115 @@
+"""
+圖片 OCR 結果快取服務 — 以圖片內容雜湊 + 提取 prompt 版本查詢，重複生成時略過 Gemini Flash
+"""
+import hashlib
+import logging
+import threading
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import SessionLocal
+from app.models.image_ocr_cache import ImageOcrCache
+from app.utils.timezone import taipei_now
+
+logger = logging.getLogger(__name__)
+
+
+def image_hash(img_bytes: bytes) -> str:
+    """圖片內容 sha256"""
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+def prompt_version(*prompts: str) -> str:
+    """由提取 prompt 內容計算版本（prompt 修改後舊快取自動失效）"""
+    return hashlib.sha256("\n".join(prompts).encode("utf-8")).hexdigest()[:16]
+
+
+class OcrCache:
+    """OCR 結果快取（DB 持久化 + 程序內命中統計）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, hashes: list[str], version: str) -> dict[str, str]:
+        """批次查詢，回傳 {image_hash: text}（僅命中者），並累加命中次數"""
+        if not hashes:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = db.query(ImageOcrCache).filter(
+                ImageOcrCache.image_hash.in_(set(hashes)),
+                ImageOcrCache.prompt_version == version,
+            ).all()
+            found = {r.image_hash: r.text for r in rows}
+            if rows:
+                now = taipei_now()
+                for r in rows:
+                    r.hit_count = (r.hit_count or 0) + 1
+                    r.last_used_at = now
+                db.commit()
+        except Exception as e:
+            logger.warning(f"OCR 快取查詢失敗（略過）: {e}")
+            db.rollback()
+            found = {}
+        finally:
+            db.close()
+
+        hits = sum(1 for h in hashes if h in found)
+        with self._lock:
+            self._hits += hits
+            self._misses += len(hashes) - hits
+        return found
+
+    def store(self, entries: dict[str, str], version: str, model: str):
+        """寫入新的 OCR 結果（並行生成重複寫入時忽略）"""
+        if not entries:
+            return
+        db = SessionLocal()
+        try:
+            db.add_all([
+                ImageOcrCache(image_hash=h, prompt_version=version, text=text, model=model)
+                for h, text in entries.items()
+            ])
+            db.commit()
+        except IntegrityError:
+            # 其他請求已寫入部分結果：逐筆補寫
+            db.rollback()
+            for h, text in entries.items():
+                try:
+                    db.add(ImageOcrCache(image_hash=h, prompt_version=version, text=text, model=model))
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+        except Exception as e:
+            logger.warning(f"OCR 快取寫入失敗（略過）: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def get_stats(self) -> dict:
+        """命中統計：程序內 hits/misses + DB 累計"""
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        db = SessionLocal()
+        try:
+            entries, total_hits = db.query(
+                func.count(ImageOcrCache.id),
+                func.coalesce(func.sum(ImageOcrCache.hit_count), 0),
+            ).one()
+        finally:
+            db.close()
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "total_hits": int(total_hits),
+        }
+
+
+# 單例
+ocr_cache = OcrCache()
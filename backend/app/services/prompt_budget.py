@@ -0,0 +1,97 @@
+"""
+生成前的 prompt token 預算 — 呼叫 LLM 前先估算輸入 token，超出預算時依價值由低到高裁減
+
+商品多時 prompt（每個商品的描述、關鍵字策略、圖片、完整寫作範本）可能大到 prefill 很慢，
+也會擠壓輸出空間（Gemini 2.5 的 thinking token 同樣計入 LLM_MAX_TOKENS），
+等呼叫回來才發現文章被截斷。生成前先算好預算可避免浪費數分鐘的呼叫。
+
+- 預算：min(PROMPT_TOKEN_BUDGET, 模型 context window - LLM_MAX_TOKENS)
+- 計數：本地估算（CJK 每字約 1 token、其他約 4 字元 1 token、Gemini 圖片依尺寸計 tile 數）；
+  估算超過預算的 PROMPT_COUNT_TOKENS_RATIO 時才呼叫供應商 count_tokens 精算一次，
+  以精算 / 估算的比例校正後續裁減的估算值（精算失敗時直接用估算）
+- 裁減順序見 TRIM_STEPS；系統指示、寫作範本、關鍵字策略與商品基本資料（名稱 / 價格 / 連結 / 圖片標記）不裁減
+- 預算、估算值、計數來源與裁減步驟記入生成遙測，與實際 input token 對照（見 generation_telemetry）
+"""
+import io
+import math
+import re
+
+from app.config import settings
+from app.services.gemini_utils import is_anthropic_model
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - 依部署環境而定
+    Image = None
+
+# 商品描述預設截取字數（裁減前）
+DESCRIPTION_CHARS = 500
+
+# 裁減步驟（價值由低到高）：(欄位, 參數)
+# description：商品描述截到 N 字；images：圖片保留比例；ocr：讀圖文字保留比例
+TRIM_STEPS = [
+    ("description", 200),
+    ("images", 0.5),
+    ("ocr", 0.5),
+    ("description", 0),
+    ("images", 0),
+    ("ocr", 0),
+]
+
+# 供應商 count_tokens 逾時秒數（不重試，失敗即改用估算）
+COUNT_TOKENS_TIMEOUT = 5.0
+
+# 模型輸入 context window（token）
+CLAUDE_CONTEXT_WINDOW = 200_000
+GEMINI_CONTEXT_WINDOW = 1_048_576
+
+# Gemini 圖片 token：兩邊都 ≤ 384px 為 258，否則依 768×768 tile 數計（每 tile 258）
+GEMINI_IMAGE_TILE_TOKENS = 258
+GEMINI_IMAGE_TILE_SIZE = 768
+GEMINI_IMAGE_SMALL_EDGE = 384
+
+_CJK_RE = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+
+
+def context_window(model: str) -> int:
+    return CLAUDE_CONTEXT_WINDOW if is_anthropic_model(model) else GEMINI_CONTEXT_WINDOW
+
+
+def budget(model: str) -> int:
+    """模型可用的輸入 token 預算"""
+    return min(settings.PROMPT_TOKEN_BUDGET, context_window(model) - settings.LLM_MAX_TOKENS)
+
+
+def estimate_text_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def estimate_image_tokens(img_bytes: bytes) -> int:
+    """Gemini 單張圖片 token（讀不到尺寸時以 IMAGE_MAX_EDGE 的正方形估算）"""
+    width = height = settings.IMAGE_MAX_EDGE
+    if Image is not None:
+        try:
+            # 只讀檔頭，不解碼像素
+            width, height = Image.open(io.BytesIO(img_bytes)).size
+        except Exception:
+            pass
+    if width <= GEMINI_IMAGE_SMALL_EDGE and height <= GEMINI_IMAGE_SMALL_EDGE:
+        return GEMINI_IMAGE_TILE_TOKENS
+    tiles = math.ceil(width / GEMINI_IMAGE_TILE_SIZE) * math.ceil(height / GEMINI_IMAGE_TILE_SIZE)
+    return tiles * GEMINI_IMAGE_TILE_TOKENS
+
+
+def estimate(model: str, system_text: str, user_message: str, image_parts: list[tuple[bytes, str]] | None) -> int:
+    """本地估算輸入 token（Claude 不傳圖片，圖片以讀圖文字計入 user_message）"""
+    tokens = estimate_text_tokens(system_text) + estimate_text_tokens(user_message)
+    if image_parts and not is_anthropic_model(model):
+        tokens += sum(estimate_image_tokens(img_bytes) for img_bytes, _ in image_parts)
+    return tokens
+
+
+def needs_precise_count(estimated: int, limit: int) -> bool:
+    """估算接近預算時才值得花一次 API 呼叫精算"""
+    return settings.PROMPT_COUNT_TOKENS_ENABLED and estimated > limit * settings.PROMPT_COUNT_TOKENS_RATIO
@@ -0,0 +1,229 @@
+"""
+對外 API 速率限制 — token bucket，所有外部呼叫（Gemini / Claude / 蝦皮 / Google Autocomplete）送出前先取得額度
+
+- 額度設定：settings.RATE_LIMITS（每分鐘請求數），鍵為 "provider" 或 "provider:model"
+  查詢 "gemini:gemini-2.5-pro" 時先找完整鍵，再找 "gemini"；未設定者不限速。
+  以 provider 設定時每個 model 各自一個桶（Gemini / Claude 的配額本來就是依模型計算）
+- 桶容量（允許的瞬間突發量）：settings.RATE_LIMIT_BURST，預設為 1 秒的量
+- 後端：
+  memory — 單一程序內共用（預設）
+  redis  — 多 worker / 多實例共用同一個桶（Lua script 原子操作，以 Redis 伺服器時間計算補充量）；
+           Redis 無法連線時暫時退回 memory 後端，避免外部呼叫全部卡住
+- 額度不足時等待補充；等待超過 RATE_LIMIT_MAX_WAIT 秒拋出 RateLimitTimeout
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis 連線失敗後，退回 memory 後端的秒數
+_REDIS_RETRY_AFTER = 30
+
+# KEYS[1] = 桶鍵；ARGV = 每秒補充量, 桶容量
+# 回傳需等待的秒數（字串，避免 Lua number 轉整數），"0" 表示已取得額度
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+
+class RateLimitTimeout(RuntimeError):
+    """等待速率限制額度超時，請求未送出"""
+
+    transient = True  # 額度暫時用完，可改用備援模型
+
+
+class _MemoryBackend:
+    """單一程序內的 token bucket"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 桶鍵 → (剩餘 token, 上次更新時間)
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def reserve(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+class RateLimiter:
+    """速率限制器（執行緒安全，單例）"""
+
+    KEY_PREFIX = "ratelimit:"
+
+    def __init__(self):
+        self._memory = _MemoryBackend()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._aredis = None
+        self._script = None
+        self._ascript = None
+        self._redis_down_until = 0.0
+        # 桶鍵 → {"acquired", "waited", "wait_seconds", "timeouts"}
+        self._stats: dict[str, dict] = {}
+
+    # ── 公開方法 ──
+
+    def acquire(self, key: str):
+        """取得一次請求額度（同步，額度不足時 sleep 等待）"""
+        limit = self._limit_for(key)
+        if limit is None:
+            return
+        bucket, rate, burst = limit
+        deadline = time.monotonic() + settings.RATE_LIMIT_MAX_WAIT
+        waited = 0.0
+        while True:
+            wait = self._reserve(bucket, rate, burst)
+            if wait <= 0:
+                self._note(bucket, waited)
+                return
+            wait = self._check_deadline(bucket, wait, deadline)
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, key: str):
+        """取得一次請求額度（async 版本，以 asyncio.sleep 等待）"""
+        limit = self._limit_for(key)
+        if limit is None:
+            return
+        bucket, rate, burst = limit
+        deadline = time.monotonic() + settings.RATE_LIMIT_MAX_WAIT
+        waited = 0.0
+        while True:
+            wait = await self._areserve(bucket, rate, burst)
+            if wait <= 0:
+                self._note(bucket, waited)
+                return
+            wait = self._check_deadline(bucket, wait, deadline)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    async def atry_acquire(self, key: str) -> bool:
+        """有額度時立即取得並回傳 True，否則不等待直接回傳 False（供對沖等可省略的請求使用）"""
+        limit = self._limit_for(key)
+        if limit is None:
+            return True
+        bucket, rate, burst = limit
+        if await self._areserve(bucket, rate, burst) > 0:
+            return False
+        self._note(bucket, 0.0)
+        return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            buckets = {key: dict(s) for key, s in self._stats.items()}
+        return {
+            "enabled": settings.RATE_LIMIT_ENABLED,
+            "backend": self._active_backend(),
+            "limits_per_minute": settings.RATE_LIMITS,
+            "buckets": buckets,
+        }
+
+    # ── 內部方法 ──
+
+    @staticmethod
+    def _limit_for(key: str) -> Optional[tuple[str, float, float]]:
+        """回傳 (桶鍵, 每秒補充量, 桶容量)，未設定限制時回傳 None"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return None
+        config_key = key if key in settings.RATE_LIMITS else key.split(":", 1)[0]
+        per_minute = settings.RATE_LIMITS.get(config_key)
+        if not per_minute or per_minute <= 0:
+            return None
+        rate = per_minute / 60
+        burst = settings.RATE_LIMIT_BURST.get(config_key) or max(1.0, rate)
+        return key, rate, float(burst)
+
+    def _check_deadline(self, bucket: str, wait: float, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            with self._lock:
+                self._bucket_stats(bucket)["timeouts"] += 1
+            raise RateLimitTimeout(f"{bucket} 速率限制額度不足（等待超過 {settings.RATE_LIMIT_MAX_WAIT:.0f}s）")
+        # 多個等待者同時醒來會再次搶同一個 token，加少量抖動錯開
+        return wait * (1 + random.random() * 0.1)
+
+    def _note(self, bucket: str, waited: float):
+        with self._lock:
+            s = self._bucket_stats(bucket)
+            s["acquired"] += 1
+            if waited > 0:
+                s["waited"] += 1
+                s["wait_seconds"] = round(s["wait_seconds"] + waited, 3)
+
+    def _bucket_stats(self, bucket: str) -> dict:
+        s = self._stats.get(bucket)
+        if s is None:
+            s = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "timeouts": 0}
+            self._stats[bucket] = s
+        return s
+
+    def _active_backend(self) -> str:
+        if settings.RATE_LIMIT_BACKEND != "redis":
+            return "memory"
+        return "memory (redis 無法連線)" if self._redis_down_until > time.time() else "redis"
+
+    def _use_redis(self) -> bool:
+        return settings.RATE_LIMIT_BACKEND == "redis" and self._redis_down_until <= time.time()
+
+    def _redis_failed(self, e: Exception):
+        self._redis_down_until = time.time() + _REDIS_RETRY_AFTER
+        logger.warning(f"速率限制 Redis 後端無法使用，{_REDIS_RETRY_AFTER}s 內改用程序內限制: {e}")
+
+    def _reserve(self, bucket: str, rate: float, burst: float) -> float:
+        if self._use_redis():
+            try:
+                if self._script is None:
+                    import redis
+
+                    self._redis = redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL, socket_timeout=2)
+                    self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+                return float(self._script(keys=[self.KEY_PREFIX + bucket], args=[rate, burst]))
+            except Exception as e:
+                self._redis_failed(e)
+        return self._memory.reserve(bucket, rate, burst)
+
+    async def _areserve(self, bucket: str, rate: float, burst: float) -> float:
+        if self._use_redis():
+            try:
+                if self._ascript is None:
+                    from redis import asyncio as aioredis
+
+                    self._aredis = aioredis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL, socket_timeout=2)
+                    self._ascript = self._aredis.register_script(_TOKEN_BUCKET_LUA)
+                return float(await self._ascript(keys=[self.KEY_PREFIX + bucket], args=[rate, burst]))
+            except Exception as e:
+                self._redis_failed(e)
+        return self._memory.reserve(bucket, rate, burst)
+
+
+# 單例
+rate_limiter = RateLimiter()
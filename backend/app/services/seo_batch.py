@@ -0,0 +1,291 @@
+"""
+SEO 批量評分 — 一次為大量文章重新計算 SEO 分數（調整 WEIGHTS / 評分規則後全站重算）
+
+- 評分是 CPU 密集的正規表示式運算，受 GIL 限制多執行緒無效，改用程序池（spawn）平行；
+  SEO_BATCH_WORKERS=1 時在呼叫端執行緒直接計算（不開程序池）
+- 讀取：依 id 遞增分頁（keyset），每頁以 yield_per 串流、只載入評分需要的欄位（id / 標題 / 內容 / 圖片表）。
+  每頁讀完才寫入 —— 不在同一交易上長時間開著游標邊讀邊寫（SQLite 讀鎖會擋住寫入，PgBouncer 交易模式也不保留跨交易游標）
+- 每 SEO_BATCH_CHUNK_SIZE 篇送進程序池一次，完成的區塊以主鍵批量 UPDATE seo_score / seo_suggestions 並 commit
+- 生成中 / 生成失敗的文章不評分（內容不是文章本文）
+- 整個流程是同步阻塞的，API 端以 asyncio.to_thread 執行，不佔用 event loop；
+  全站重算（start_rescore）為背景任務，同一時間只跑一個，進度以 RescoreJob 查詢
+- 重算任務狀態只存在於啟動它的 web 程序記憶體中：多 worker 部署時其他 worker 查不到（404）、
+  也不會擋住其他 worker 再啟動一次；程序重啟後紀錄消失（已寫回的分數不受影響）
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional
+
+from sqlalchemy import update
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 不評分的文章狀態
+SKIP_STATUSES = ("generating", "failed")
+
+# 保留的重算紀錄數
+MAX_JOBS = 20
+
+# (id, 標題, 內容, 圖片數)
+BatchItem = tuple[int, str, str, int]
+
+# 執行中的背景重算 task（event loop 只保留弱參照，沒有強參照的 task 可能在完成前被回收）
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _analyze_chunk(items: list[BatchItem]) -> list[tuple[int, Optional[dict], Optional[str]]]:
+    """評分一個區塊（程序池 worker 內執行），回傳 [(id, 結果, 錯誤訊息)]；不經過 seo_cache（結果直接寫回 DB，不會再被查詢）"""
+    from app.services.seo_service import seo_service
+
+    results = []
+    for article_id, title, content, image_count in items:
+        try:
+            results.append((article_id, seo_service.analyze(title=title, content=content, image_count=image_count, use_cache=False), None))
+        except Exception as e:
+            results.append((article_id, None, str(e)[:200]))
+    return results
+
+
+class RescoreJob:
+    """全站重算任務狀態"""
+
+    def __init__(self, user_id: Optional[int] = None):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = "running"  # running / done / failed
+        self.processed = 0
+        self.updated = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "processed": self.processed,
+            "updated": self.updated,
+            "failed": self.failed,
+            "error": self.error,
+            "elapsed": round(elapsed, 1),
+            "per_second": round(self.processed / elapsed, 1) if elapsed > 0 else 0,
+        }
+
+
+class SeoBatchService:
+    """SEO 批量評分服務（單例）"""
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs: dict[str, RescoreJob] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        return settings.SEO_BATCH_WORKERS or os.cpu_count() or 1
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        """評分用程序池（workers ≤ 1 時為 None，直接在目前執行緒計算）"""
+        if self.workers <= 1:
+            return None
+        with self._lock:
+            if self._pool is None:
+                # spawn：不 fork 帶著 event loop / DB 連線的 web 程序
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _pages(self, db, user_id: Optional[int] = None, article_ids: Optional[list[int]] = None) -> Iterator[list[BatchItem]]:
+        """依 id 分頁讀取可評分的文章，每頁 workers × CHUNK_SIZE 篇"""
+        from app.models.article import Article
+
+        chunk_size = settings.SEO_BATCH_CHUNK_SIZE
+        page_size = chunk_size * max(self.workers, 1)
+        query = db.query(Article.id, Article.title, Article.content, Article.image_map).filter(
+            Article.content.isnot(None),
+            Article.status.notin_(SKIP_STATUSES),
+        )
+        if user_id is not None:
+            query = query.filter(Article.user_id == user_id)
+        if article_ids is not None:
+            query = query.filter(Article.id.in_(article_ids))
+
+        last_id = 0
+        while True:
+            page_query = query.filter(Article.id > last_id).order_by(Article.id).limit(page_size)
+            page = [
+                (row.id, row.title or "", row.content, len(row.image_map) if row.image_map else 0)
+                for row in page_query.yield_per(chunk_size)
+            ]
+            # 讀完即結束讀取交易，寫入不會被自己的讀鎖擋住
+            db.commit()
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1][0]
+
+    def _score_page(self, page: list[BatchItem]) -> Iterator[list[tuple[int, Optional[dict], Optional[str]]]]:
+        """將一頁切成區塊評分，依完成順序 yield 各區塊結果"""
+        chunk_size = settings.SEO_BATCH_CHUNK_SIZE
+        chunks = [page[i:i + chunk_size] for i in range(0, len(page), chunk_size)]
+        pool: Optional[Executor] = self.pool
+        if pool is None:
+            for chunk in chunks:
+                yield _analyze_chunk(chunk)
+            return
+        for future in as_completed([pool.submit(_analyze_chunk, chunk) for chunk in chunks]):
+            yield future.result()
+
+    @staticmethod
+    def _write(db, results: list[tuple[int, Optional[dict], Optional[str]]]) -> tuple[int, int]:
+        """以主鍵批量更新分數，回傳 (更新數, 失敗數)"""
+        from app.models.article import Article
+
+        rows = [
+            {"id": article_id, "seo_score": result["score"], "seo_suggestions": result}
+            for article_id, result, _ in results if result is not None
+        ]
+        for article_id, _, error in results:
+            if error is not None:
+                logger.warning(f"文章 {article_id} SEO 評分失敗: {error}")
+        if rows:
+            db.execute(update(Article), rows)
+            db.commit()
+        return len(rows), len(results) - len(rows)
+
+    def _run(self, db, on_chunk, user_id: Optional[int] = None, article_ids: Optional[list[int]] = None, persist: bool = True):
+        for page in self._pages(db, user_id=user_id, article_ids=article_ids):
+            for results in self._score_page(page):
+                updated, failed = self._write(db, results) if persist else (0, 0)
+                on_chunk(results, updated, failed)
+
+    def analyze_articles(self, user_id: int, article_ids: list[int], persist: bool = True, include_details: bool = False) -> dict:
+        """批量評分用戶自己的文章（阻塞，API 端以 asyncio.to_thread 呼叫）"""
+        from app.db.database import get_db_session
+
+        started = time.perf_counter()
+        scored: dict[int, dict] = {}
+        errors: dict[int, str] = {}
+        totals = {"updated": 0}
+
+        def on_chunk(results, updated, _failed):
+            totals["updated"] += updated
+            for article_id, result, error in results:
+                if result is not None:
+                    scored[article_id] = result
+                else:
+                    errors[article_id] = error
+
+        with get_db_session() as db:
+            self._run(db, on_chunk, user_id=user_id, article_ids=sorted(set(article_ids)), persist=persist)
+
+        results = []
+        for article_id in article_ids:
+            if article_id in scored:
+                result = scored[article_id]
+                item = {"article_id": article_id, "score": result["score"], "grade": result["grade"]}
+                if include_details:
+                    item["analysis"] = result
+            elif article_id in errors:
+                item = {"article_id": article_id, "error": errors[article_id]}
+            else:
+                item = {"article_id": article_id, "error": "文章不存在或無法評分"}
+            results.append(item)
+
+        return {
+            "count": len(scored),
+            "updated": totals["updated"],
+            "failed": len(errors),
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000),
+        }
+
+    def start_rescore(self, user_id: Optional[int] = None) -> tuple[RescoreJob, bool]:
+        """在背景重算全站（或指定用戶）文章，回傳 (任務, 是否為已在執行的任務)"""
+        with self._lock:
+            running = next((j for j in self._jobs.values() if j.status == "running"), None)
+            if running is not None:
+                return running, True
+            job = RescoreJob(user_id)
+            self._jobs[job.job_id] = job
+            self._prune()
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._run_rescore, job), name=f"seo-rescore-{job.job_id}")
+        _background_tasks.add(task)
+        task.add_done_callback(lambda t: self._on_rescore_done(job, t))
+        return job, False
+
+    @staticmethod
+    def _on_rescore_done(job: RescoreJob, task: asyncio.Task):
+        """_run_rescore 已自行處理一般例外；被取消（程序關閉）或 BaseException 時任務仍是 running，在這裡改為 failed"""
+        _background_tasks.discard(task)
+        error = "已取消" if task.cancelled() else task.exception()
+        if error is None:
+            return
+        logger.error(f"SEO 重算背景任務異常結束（job={job.job_id}）: {error!r}")
+        if job.status == "running":
+            job.status = "failed"
+            job.error = str(error)[:200] or type(error).__name__
+            job.finished_at = time.time()
+
+    def _run_rescore(self, job: RescoreJob):
+        from app.db.database import get_db_session
+
+        def on_chunk(results, updated, failed):
+            job.processed += len(results)
+            job.updated += updated
+            job.failed += failed
+
+        logger.info(f"SEO 重算開始（job={job.job_id}, user={job.user_id}, workers={self.workers}）")
+        try:
+            with get_db_session() as db:
+                self._run(db, on_chunk, user_id=job.user_id)
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"SEO 重算失敗（job={job.job_id}）: {e}")
+            job.status = "failed"
+            job.error = str(e)[:200]
+        finally:
+            job.finished_at = time.time()
+        logger.info(f"SEO 重算結束（job={job.job_id}）: {job.to_dict()}")
+
+    def _prune(self):
+        """只保留最近 MAX_JOBS 筆（呼叫端持有 _lock）"""
+        finished = sorted((j for j in self._jobs.values() if j.status != "running"), key=lambda j: j.started_at)
+        for job in finished[:max(0, len(self._jobs) - MAX_JOBS)]:
+            del self._jobs[job.job_id]
+
+    def get_job(self, job_id: str) -> Optional[RescoreJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list[dict]:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.started_at, reverse=True)
+        return [j.to_dict() for j in jobs]
+
+
+# 單例
+seo_batch = SeoBatchService()
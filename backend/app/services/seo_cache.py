@@ -0,0 +1,177 @@
+"""
+SEO 分析結果快取 — 標題 / 內容 / 關鍵字 / 圖片數都沒變時直接回傳上次的評分
+
+前端 SEO 面板每次打開都重新分析、optimize_with_llm 前後各分析一次、生成後又分析一次，
+內容沒改時結果必然相同，不必重跑 8 項評分。
+
+- 快取鍵：sha256(評分器版本, 標題, 內容, 關鍵字, 圖片數, 直方圖區間數)
+- 評分器版本：WEIGHTS 與評分程式（seo_service / seo_index / keyword_matcher 原始碼）的雜湊，
+  調整權重或評分規則後舊結果自動失效（與 OCR 快取的 prompt 版本相同做法）
+- 記憶體層：程序內 LRU，超過 SEO_CACHE_MAX_ENTRIES 筆或 SEO_CACHE_MAX_BYTES 時淘汰最久未用者
+- 持久層（選用）：設定 SEO_CACHE_REDIS_URL 時寫入 Redis（SEO_CACHE_TTL 秒過期），多 worker / 重啟後共用；
+  Redis 無法連線時暫時只用記憶體層
+- 存放 JSON 字串，每次命中都解析出新的 dict，呼叫端修改結果不會污染快取
+"""
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis 連線失敗後，只用記憶體層的秒數
+_REDIS_RETRY_AFTER = 30
+
+
+@functools.lru_cache(maxsize=1)
+def scorer_version() -> str:
+    """評分器版本（權重或評分程式修改後改變）"""
+    from app.services import keyword_matcher, seo_index, seo_service
+
+    parts = [json.dumps(seo_service.SeoService.WEIGHTS, sort_keys=True)]
+    for module in (seo_service, seo_index, keyword_matcher):
+        try:
+            parts.append(inspect.getsource(module))
+        except (OSError, TypeError):
+            # 沒有原始碼（如只部署 .pyc）：退回模組路徑，改版需重啟程序
+            parts.append(module.__name__)
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class SeoCache:
+    """SEO 分析結果快取（執行緒安全，單例）"""
+
+    KEY_PREFIX = "seo:"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 快取鍵 → 分析結果 JSON
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._bytes = 0
+        self._redis = None
+        self._redis_down_until = 0.0
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(title: str, content: str, keywords: Optional[list], image_count: Optional[int], histogram_bins: int) -> str:
+        payload = json.dumps(
+            [scorer_version(), title, content, keywords or None, image_count, histogram_bins],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        if not settings.SEO_CACHE_ENABLED:
+            return None
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return json.loads(data)
+
+        data = self._redis_get(key)
+        with self._lock:
+            if data is None:
+                self._misses += 1
+                return None
+            self._redis_hits += 1
+            self._put_memory(key, data)
+        return json.loads(data)
+
+    def put(self, key: str, result: dict):
+        if not settings.SEO_CACHE_ENABLED:
+            return
+        data = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._put_memory(key, data)
+        self._redis_set(key, data)
+
+    def clear(self):
+        """清空記憶體層（Redis 層依 TTL 過期）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits, redis_hits, misses = self._hits, self._redis_hits, self._misses
+            entries, size = len(self._entries), self._bytes
+        lookups = hits + redis_hits + misses
+        return {
+            "enabled": settings.SEO_CACHE_ENABLED,
+            "scorer_version": scorer_version(),
+            "persistent": self._active_backend(),
+            "hits": hits,
+            "redis_hits": redis_hits,
+            "misses": misses,
+            "hit_rate": round((hits + redis_hits) / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _put_memory(self, key: str, data: str):
+        """寫入記憶體層（呼叫端持有 _lock）"""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = data
+        self._bytes += len(data.encode("utf-8"))
+        while self._entries and (
+            len(self._entries) > settings.SEO_CACHE_MAX_ENTRIES
+            or self._bytes > settings.SEO_CACHE_MAX_BYTES
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        data = self._entries.pop(key)
+        self._bytes -= len(data.encode("utf-8"))
+
+    # ── 持久層 ──
+
+    def _active_backend(self) -> Optional[str]:
+        if not settings.SEO_CACHE_REDIS_URL:
+            return None
+        return "redis (無法連線)" if self._redis_down_until > time.time() else "redis"
+
+    def _client(self):
+        if not settings.SEO_CACHE_REDIS_URL or self._redis_down_until > time.time():
+            return None
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(settings.SEO_CACHE_REDIS_URL, socket_timeout=1)
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        self._redis_down_until = time.time() + _REDIS_RETRY_AFTER
+        logger.warning(f"SEO 快取 Redis 無法使用，{_REDIS_RETRY_AFTER}s 內只用記憶體層: {e}")
+
+    def _redis_get(self, key: str) -> Optional[str]:
+        try:
+            client = self._client()
+            data = client.get(self.KEY_PREFIX + key) if client is not None else None
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        return data.decode("utf-8") if data is not None else None
+
+    def _redis_set(self, key: str, data: str):
+        try:
+            client = self._client()
+            if client is not None:
+                client.set(self.KEY_PREFIX + key, data, ex=settings.SEO_CACHE_TTL)
+        except Exception as e:
+            self._redis_failed(e)
+
+
+# 單例
+seo_cache = SeoCache()
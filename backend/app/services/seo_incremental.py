@@ -0,0 +1,159 @@
+"""
+SEO 增量分析 — 編輯中的文章以段落為單位送出修改，只重新掃描改動的段落
+
+前端 SeoPanel / 文章編輯時每打幾個字就要更新分數，每次送整篇全文重跑分析太浪費：
+
+- 開始編輯（start）時送一次全文，伺服器將內容以空行（\\n\\n）切成段落、建立各段特徵，回傳 session_id 與版本號
+- 之後每次只送段落層級的修改（patch）：[{"start": 段落索引, "delete": 刪除段數, "insert": [新段落文字, ...]}]，
+  依序套用在目前的段落清單上；插入的文字含空行時自動拆成多段
+- 段落特徵（長度、關鍵字命中、emoji、句子、FAQ 標記…）依段落文字 + 關鍵字快取（seo_index.paragraph_features），
+  未改動的段落直接重用，再以 DocumentIndex.from_paragraphs 組回整篇索引重新計算 8 項分數（結果與整篇分析相同）
+- 版本號防止亂序：patch 需帶目前版本，不符時回傳衝突，前端重新 start
+- 工作階段存在程序記憶體（LRU，SEO_LIVE_MAX_SESSIONS 個、閒置 SEO_LIVE_SESSION_TTL 秒過期）；
+  多 worker 部署時請求落到其他 worker 會找不到工作階段，前端同樣重新 start
+- 標題改變且未指定關鍵字時，關鍵字會重新從標題提取，所有段落以新關鍵字重建特徵
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+from app.services.seo_index import DocumentIndex, paragraph_features
+from app.services.seo_service import seo_service
+
+
+class StaleSessionVersion(Exception):
+    """patch 的版本號與工作階段目前版本不符"""
+
+
+def _split(text: str) -> list[str]:
+    return text.split("\n\n")
+
+
+class SeoEditSession:
+    """單一編輯工作階段（段落文字；各段特徵由 paragraph_features 快取）"""
+
+    def __init__(self, user_id: int, title: str, content: str, keywords: Optional[list], image_count: Optional[int], histogram_bins: int):
+        self.session_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.requested_keywords = keywords or None
+        self.image_count = image_count
+        self.histogram_bins = histogram_bins
+        self.version = 0
+        self.lock = threading.Lock()
+        self.touched_at = time.time()
+        self.blocks = _split(content)
+        self.set_title(title)
+
+    def set_title(self, title: str):
+        self.title = title
+        self.keywords = tuple(seo_service.resolve_keywords(title, self.requested_keywords))
+
+    def apply(self, ops: list[dict]) -> int:
+        """依序套用段落修改，回傳插入的段落數（非法範圍時拋出 ValueError，不做任何修改）"""
+        blocks = list(self.blocks)
+        inserted = 0
+        for op in ops:
+            start, delete = op["start"], op.get("delete", 0)
+            if start < 0 or delete < 0 or start + delete > len(blocks):
+                raise ValueError(f"段落範圍超出文章（共 {len(blocks)} 段）: start={start}, delete={delete}")
+            new_blocks = [part for text in op.get("insert") or [] for part in _split(text)]
+            blocks[start:start + delete] = new_blocks
+            inserted += len(new_blocks)
+        self.blocks = blocks or [""]
+        return inserted
+
+    def analyze(self) -> dict:
+        paragraphs = [paragraph_features(text, self.keywords) for text in self.blocks]
+        index = DocumentIndex.from_paragraphs(self.title, list(self.keywords), paragraphs)
+        return seo_service.analyze_index(index, self.image_count, self.histogram_bins)
+
+
+class SeoIncrementalService:
+    """SEO 增量分析服務（單例）"""
+
+    def __init__(self):
+        self._sessions: OrderedDict[str, SeoEditSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, user_id: int, title: str, content: str, keywords: Optional[list] = None,
+              image_count: Optional[int] = None, histogram_bins: int = seo_service.HISTOGRAM_BINS) -> dict:
+        """建立編輯工作階段並回傳第一次分析結果"""
+        started = time.perf_counter()
+        session = SeoEditSession(user_id, title, content, keywords, image_count, histogram_bins)
+        analysis = session.analyze()
+        with self._lock:
+            self._prune()
+            self._sessions[session.session_id] = session
+        return self._response(session, analysis, len(session.blocks), started)
+
+    def get(self, user_id: int, session_id: str) -> Optional[SeoEditSession]:
+        """取得用戶自己的工作階段（不存在 / 已過期回傳 None）"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return None
+            if time.time() - session.touched_at > settings.SEO_LIVE_SESSION_TTL:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def patch(self, session: SeoEditSession, version: int, ops: list[dict],
+              title: Optional[str] = None, image_count: Optional[int] = None) -> dict:
+        """套用段落修改並重新評分，版本號不符時拋出 StaleSessionVersion"""
+        started = time.perf_counter()
+        with session.lock:
+            if version != session.version:
+                raise StaleSessionVersion(f"版本不符（目前 {session.version}，收到 {version}）")
+            changed = session.apply(ops)
+            if title is not None and title != session.title:
+                session.set_title(title)
+            if image_count is not None:
+                session.image_count = image_count
+            session.version += 1
+            session.touched_at = time.time()
+            analysis = session.analyze()
+        return self._response(session, analysis, changed, started)
+
+    def close(self, user_id: int, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return False
+            del self._sessions[session_id]
+            return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            sessions = len(self._sessions)
+        cache = paragraph_features.cache_info()
+        return {
+            "sessions": sessions,
+            "paragraph_cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize},
+        }
+
+    @staticmethod
+    def _response(session: SeoEditSession, analysis: dict, changed: int, started: float) -> dict:
+        return {
+            "session_id": session.session_id,
+            "version": session.version,
+            "paragraph_count": len(session.blocks),
+            "changed_paragraphs": changed,
+            "analysis": analysis,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def _prune(self):
+        """移除過期與超出上限的工作階段（呼叫端持有 _lock）"""
+        now = time.time()
+        for session_id in [sid for sid, s in self._sessions.items() if now - s.touched_at > settings.SEO_LIVE_SESSION_TTL]:
+            del self._sessions[session_id]
+        while len(self._sessions) >= settings.SEO_LIVE_MAX_SESSIONS:
+            self._sessions.popitem(last=False)
+
+
+# 單例
+seo_incremental = SeoIncrementalService()
@@ -0,0 +1,227 @@
+"""
+SEO 文件索引 — analyze 一開始掃描一次內容，記下各評分項需要的位置資訊，所有評分項只讀索引
+
+索引內容（位置皆為 content 的字元索引 (start, end)）：
+- paragraphs：以空行分隔、去頭尾空白後的段落；logical_paragraphs 為過濾裝飾行並合併短行後的邏輯段落數
+- sentences：以。！？!? 與換行斷句、去空白後 ≥ 5 字的句子
+- keyword_matches / title_matches：關鍵字比對結果（見 keyword_matcher）
+- emoji、images（{{IMAGE:…}} 標記與 Markdown 圖片）、list_items（項目符號行）、separators（分隔線）
+- FAQ：qa_markers（Q1:）、emoji_questions（❓ 開頭）、question_lines（問號結尾的行）、has_faq_section
+
+索引建立後不再修改（欄位皆為 tuple），可安全地跨評分項 / 執行緒共用；
+新增評分項時從索引讀取，不必再對原文跑正規表示式。
+
+增量模式（編輯中即時評分，見 seo_incremental）：各項特徵都不會跨越段落分隔（\\n\\n），
+因此可逐段建立 ParagraphFeatures（位置相對於段落開頭，依段落文字 + 關鍵字快取），
+再以 DocumentIndex.from_paragraphs 平移位置組回整篇索引，只有改動過的段落需要重新掃描。
+"""
+import functools
+import re
+from typing import Optional
+
+from app.services.keyword_matcher import KeywordMatches, compile_keywords
+
+Span = tuple[int, int]
+
+EMOJI_RE = re.compile(r'[\U0001F300-\U0001F9FF\U00002600-\U000027BF\U0000FE00-\U0000FEFF]')
+# 邏輯段落計數時忽略的字元（空白 + emoji）
+_DECORATION_RE = re.compile(r'[\s\U0001F300-\U0001F9FF\U00002600-\U000027BF\U0000FE00-\U0000FEFF]')
+_SEPARATOR_BLOCK_RE = re.compile(r'^[=\-─—\s]{3,}$')
+_SEPARATOR_RE = re.compile(r'={3,}|—{3,}|─{3,}')
+_LIST_ITEM_RE = re.compile(r'^[-*●👉➡️✅✨❤️😁💰🔍❓]\s*', re.MULTILINE)
+# 以。！？!? 與換行斷句後、去頭尾空白且 ≥ 5 字的句子（首尾非空白、中間至少 3 字）
+_SENTENCE_RE = re.compile(r'[^。！？!?\s][^。！？!?\n]{3,}[^。！？!?\s]')
+_IMAGE_MARKER_RE = re.compile(r'\{\{IMAGE:\d+:\d+\}\}')
+_MARKDOWN_IMAGE_RE = re.compile(r'!\[.*?\]\(.*?\)')
+_QA_MARKER_RE = re.compile(r'Q\d+[:：]', re.IGNORECASE)
+_EMOJI_QUESTION_RE = re.compile(r'❓\s*.+')
+_FAQ_SECTION_RE = re.compile(r'(FAQ|常見問題|Q&A|問答)', re.IGNORECASE)
+_QUESTION_LINE_RE = re.compile(r'^.{5,}[？?]\s*$', re.MULTILINE)
+# 段落結尾是 ❓ + 空白：整篇掃描時 _EMOJI_QUESTION_RE 會跨段落比對到下一段
+_OPEN_EMOJI_QUESTION_RE = re.compile(r'❓\s*\Z')
+
+
+def _spans(pattern: re.Pattern, text: str) -> tuple[Span, ...]:
+    return tuple(m.span() for m in pattern.finditer(text))
+
+
+def _stripped_span(text: str, start: int, end: int) -> Optional[Span]:
+    """text[start:end] 去頭尾空白後的範圍，全為空白時回傳 None"""
+    piece = text[start:end]
+    stripped = piece.lstrip()
+    if not stripped:
+        return None
+    start += len(piece) - len(stripped)
+    return start, start + len(stripped.rstrip())
+
+
+def _paragraph_kind(block: str) -> Optional[str]:
+    """段落類型："short"（每行都 < 30 字）/ "long"；分隔線與純裝飾行回傳 None（不計入）"""
+    if _SEPARATOR_BLOCK_RE.match(block):
+        return None
+    # 純 emoji / 符號的短行（< 5 個可見中文 / 英數字元）
+    if len(_DECORATION_RE.sub('', block)) < 5:
+        return None
+    if all(len(line.strip()) < 30 for line in block.split('\n')):
+        return "short"
+    return "long"
+
+
+def _count_logical_paragraphs(kinds) -> int:
+    """智慧段落計數：過濾分隔線與純裝飾行，連續的短行區塊合併為一個邏輯段落"""
+    logical_count = 0
+    consecutive_short = 0
+    for kind in kinds:
+        if kind is None:
+            continue
+        if kind == "short":
+            consecutive_short += 1
+        else:
+            if consecutive_short > 0:
+                logical_count += 1
+                consecutive_short = 0
+            logical_count += 1
+    if consecutive_short > 0:
+        logical_count += 1
+    return max(logical_count, 1)
+
+
+# 組回整篇索引時需要平移位置的範圍欄位
+_SPAN_FIELDS = ("sentences", "images", "list_items", "separators", "qa_markers", "emoji_questions", "question_lines")
+
+
+class ParagraphFeatures:
+    """單一段落（content 以 \\n\\n 分隔的一段）的索引，位置相對於段落開頭（建立後不可變）"""
+
+    def __init__(self, text: str, keywords: tuple[str, ...]):
+        self.text = text
+        self.keyword_matches: KeywordMatches = compile_keywords(keywords).scan(text)
+        self.paragraph = _stripped_span(text, 0, len(text))
+        self.kind = _paragraph_kind(text[self.paragraph[0]:self.paragraph[1]]) if self.paragraph else None
+        self.sentences = _spans(_SENTENCE_RE, text)
+        self.emoji = tuple(m.start() for m in EMOJI_RE.finditer(text))
+        self.images = _spans(_IMAGE_MARKER_RE, text) + _spans(_MARKDOWN_IMAGE_RE, text)
+        self.list_items = _spans(_LIST_ITEM_RE, text)
+        self.separators = _spans(_SEPARATOR_RE, text)
+        self.qa_markers = _spans(_QA_MARKER_RE, text)
+        self.emoji_questions = _spans(_EMOJI_QUESTION_RE, text)
+        self.question_lines = _spans(_QUESTION_LINE_RE, text)
+        self.has_faq_section = _FAQ_SECTION_RE.search(text) is not None
+        self.open_question = _OPEN_EMOJI_QUESTION_RE.search(text) is not None
+        self.span_fields = tuple(getattr(self, name) for name in _SPAN_FIELDS)
+
+
+@functools.lru_cache(maxsize=4096)
+def paragraph_features(text: str, keywords: tuple[str, ...]) -> ParagraphFeatures:
+    """段落特徵（快取，未改動的段落直接重用）"""
+    return ParagraphFeatures(text, keywords)
+
+
+class DocumentIndex:
+    """單篇文章的 SEO 索引（建立後不可變）"""
+
+    def __init__(self, title: str, content: str, keywords: list[str]):
+        self.title = title
+        self.content = content
+        self.keywords = tuple(keywords)
+
+        matcher = compile_keywords(self.keywords)
+        self.keyword_matches: KeywordMatches = matcher.scan(content)
+        self.title_matches: KeywordMatches = matcher.scan(title)
+
+        self.paragraphs = self._split_paragraphs(content)
+        self.logical_paragraphs = self._count_logical_paragraphs()
+        self.sentences = _spans(_SENTENCE_RE, content)
+
+        self.emoji = tuple(m.start() for m in EMOJI_RE.finditer(content))
+        self.images = _spans(_IMAGE_MARKER_RE, content) + _spans(_MARKDOWN_IMAGE_RE, content)
+        self.list_items = _spans(_LIST_ITEM_RE, content)
+        self.separators = _spans(_SEPARATOR_RE, content)
+
+        self.qa_markers = _spans(_QA_MARKER_RE, content)
+        self.emoji_questions = _spans(_EMOJI_QUESTION_RE, content)
+        self.question_lines = _spans(_QUESTION_LINE_RE, content)
+        self.has_faq_section = _FAQ_SECTION_RE.search(content) is not None
+
+    @staticmethod
+    def _split_paragraphs(content: str) -> tuple[Span, ...]:
+        """等同 [p.strip() for p in content.split("\\n\\n") if p.strip()] 的範圍"""
+        spans = []
+        start = 0
+        while True:
+            end = content.find("\n\n", start)
+            span = _stripped_span(content, start, len(content) if end == -1 else end)
+            if span:
+                spans.append(span)
+            if end == -1:
+                return tuple(spans)
+            start = end + 2
+
+    @classmethod
+    def from_paragraphs(cls, title: str, keywords: list[str], paragraphs: list[ParagraphFeatures]) -> "DocumentIndex":
+        """由各段落特徵組出整篇索引（結果與直接以 "\\n\\n".join 後的內容建立相同）
+
+        關鍵字含換行、或非最後一段以 ❓ 結尾時，整篇掃描的比對結果會跨段落，改為整篇重建
+        """
+        keywords = tuple(keywords)
+        content = "\n\n".join(p.text for p in paragraphs)
+        if any("\n" in kw for kw in keywords) or any(p.open_question for p in paragraphs[:-1]):
+            return cls(title, content, list(keywords))
+
+        index = cls.__new__(cls)
+        index.title = title
+        index.content = content
+        index.keywords = keywords
+        index.title_matches = compile_keywords(keywords).scan(title)
+
+        spans, occurrences, paragraph_spans, emoji = [], [], [], []
+        fields = [[] for _ in _SPAN_FIELDS]
+        offset = 0
+        for p in paragraphs:
+            # 大部分段落多數欄位為空，只平移有內容的欄位
+            if p.keyword_matches.spans:
+                spans += [(start + offset, end + offset, i) for start, end, i in p.keyword_matches.spans]
+                occurrences += [(start + offset, end + offset, i) for start, end, i in p.keyword_matches.occurrences]
+            if p.paragraph:
+                paragraph_spans.append((p.paragraph[0] + offset, p.paragraph[1] + offset))
+            for values, field_spans in zip(fields, p.span_fields):
+                if field_spans:
+                    values += [(start + offset, end + offset) for start, end in field_spans]
+            if p.emoji:
+                emoji += [pos + offset for pos in p.emoji]
+            offset += len(p.text) + 2
+
+        index.keyword_matches = KeywordMatches(list(keywords), spans, occurrences)
+        index.paragraphs = tuple(paragraph_spans)
+        for name, values in zip(_SPAN_FIELDS, fields):
+            setattr(index, name, tuple(values))
+        index.emoji = tuple(emoji)
+        index.logical_paragraphs = _count_logical_paragraphs(p.kind for p in paragraphs)
+        index.has_faq_section = any(p.has_faq_section for p in paragraphs)
+        return index
+
+    def _count_logical_paragraphs(self) -> int:
+        return _count_logical_paragraphs(_paragraph_kind(self.content[start:end]) for start, end in self.paragraphs)
+
+    def paragraph_lengths(self) -> list[int]:
+        return [end - start for start, end in self.paragraphs]
+
+    def sentence_lengths(self) -> list[int]:
+        return [end - start for start, end in self.sentences]
+
+    def keyword_histogram(self, bins: int) -> list[int]:
+        """關鍵字命中（不重疊）依位置分到 bins 個等長區間的次數"""
+        counts = [0] * bins
+        length = len(self.content)
+        if not length:
+            return counts
+        for start, _, _ in self.keyword_matches.spans:
+            counts[min(bins - 1, start * bins // length)] += 1
+        return counts
+
+    def keyword_counts(self) -> dict[str, int]:
+        """各關鍵字出現次數（含被包在較長關鍵字內的出現）"""
+        counts = {kw: 0 for kw in self.keywords if kw}
+        for _, _, index in self.keyword_matches.occurrences:
+            counts[self.keywords[index]] += 1
+        return counts
@@ -2,6 +2,7 @@
 SEO 分析與優化服務
 8 項評分引擎，針對 Dcard 平台 SEO 特性設計
 """
+import asyncio
 import re
 import logging
 from typing import Optional
@@ -10,7 +11,11 @@ from google import genai
 from google.genai import types
 
 from app.config import settings
-from app.services.gemini_utils import strip_markdown, track_gemini_usage, track_anthropic_usage, is_anthropic_model
+from app.services.article_renderer import parse_title_content
+from app.services.seo_cache import seo_cache
+from app.services.seo_index import DocumentIndex
+from app.services.gemini_utils import track_gemini_usage, track_anthropic_usage, is_anthropic_model, anthropic_system_blocks
+from app.services.rate_limiter import rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -83,9 +88,13 @@ class SeoService:
         "readability": 5,         # 可讀性
     }
 
+    # 關鍵字分佈直方圖預設區間數（analyze 回傳的 diagnostics）
+    HISTOGRAM_BINS = 10
+
     def __init__(self):
         self._gemini_client = None
         self._anthropic_client = None
+        self._async_anthropic_client = None
 
     @property
     def gemini_client(self):
@@ -104,6 +113,15 @@ class SeoService:
             self._anthropic_client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
         return self._anthropic_client
 
+    @property
+    def async_anthropic_client(self):
+        if self._async_anthropic_client is None:
+            if not settings.ANTHROPIC_API_KEY:
+                raise ValueError("ANTHROPIC_API_KEY 未設定，請在 .env 中設定")
+            import anthropic
+            self._async_anthropic_client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        return self._async_anthropic_client
+
     @staticmethod
     def _extract_keywords_from_title(title: str) -> list:
         """從標題自動提取關鍵字（改進版）"""
@@ -137,16 +155,36 @@ class SeoService:
 
         return keywords[:10]
 
-    def analyze(self, title: str, content: str, keywords: Optional[list] = None, image_count: Optional[int] = None) -> dict:
-        """分析文章 SEO 分數（8 項指標）"""
+    def resolve_keywords(self, title: str, keywords: Optional[list] = None) -> list:
+        """評分用的關鍵字（未指定時從標題提取）"""
+        return keywords or self._extract_keywords_from_title(title)
+
+    def build_index(self, title: str, content: str, keywords: Optional[list] = None) -> DocumentIndex:
+        """建立文件索引（未指定關鍵字時從標題提取）"""
+        return DocumentIndex(title, content, self.resolve_keywords(title, keywords))
+
+    def analyze(self, title: str, content: str, keywords: Optional[list] = None, image_count: Optional[int] = None, histogram_bins: int = HISTOGRAM_BINS, use_cache: bool = True) -> dict:
+        """分析文章 SEO 分數（8 項指標）；相同輸入直接回傳快取結果（見 seo_cache）
+
+        use_cache=False 時不讀也不寫快取（全站重算等一次性的大量評分，避免把快取塞滿沒人會讀的結果）
+        """
+        if not use_cache:
+            return self.analyze_index(self.build_index(title, content, keywords), image_count, histogram_bins)
+        key = seo_cache.make_key(title, content, keywords, image_count, histogram_bins)
+        result = seo_cache.get(key)
+        if result is None:
+            result = self.analyze_index(self.build_index(title, content, keywords), image_count, histogram_bins)
+            seo_cache.put(key, result)
+        return result
+
+    def analyze_index(self, index: DocumentIndex, image_count: Optional[int] = None, histogram_bins: int = HISTOGRAM_BINS) -> dict:
+        """以已建立的文件索引評分，各評分項只讀索引"""
         breakdown = {}
         suggestions = []
-
-        if not keywords:
-            keywords = self._extract_keywords_from_title(title)
+        title, content, keywords = index.title, index.content, list(index.keywords)
 
         # ===== 1. 標題 SEO (15 分) =====
-        title_score = self._score_title_seo(title, keywords, suggestions)
+        title_score = self._score_title_seo(index, suggestions)
         breakdown["title_seo"] = {
             "score": title_score,
             "max": self.WEIGHTS["title_seo"],
@@ -154,7 +192,7 @@ class SeoService:
         }
 
         # ===== 2. 關鍵字密度 (20 分) =====
-        density_score, density_val = self._score_keyword_density(content, keywords, suggestions)
+        density_score, density_val = self._score_keyword_density(index, suggestions)
         breakdown["keyword_density"] = {
             "score": density_score,
             "max": self.WEIGHTS["keyword_density"],
@@ -162,7 +200,7 @@ class SeoService:
         }
 
         # ===== 3. 關鍵字分佈 (15 分) =====
-        placement_score = self._score_keyword_placement(content, keywords, suggestions)
+        placement_score = self._score_keyword_placement(index, suggestions)
         breakdown["keyword_placement"] = {
             "score": placement_score,
             "max": self.WEIGHTS["keyword_placement"],
@@ -170,7 +208,7 @@ class SeoService:
         }
 
         # ===== 4. 內容結構 (15 分) =====
-        structure_score = self._score_content_structure(content, suggestions)
+        structure_score = self._score_content_structure(index, suggestions)
         breakdown["content_structure"] = {
             "score": structure_score,
             "max": self.WEIGHTS["content_structure"],
@@ -178,7 +216,7 @@ class SeoService:
         }
 
         # ===== 5. 內容長度 (15 分) =====
-        length_score = self._score_content_length(content, suggestions)
+        length_score = self._score_content_length(index, suggestions)
         breakdown["content_length"] = {
             "score": length_score,
             "max": self.WEIGHTS["content_length"],
@@ -186,7 +224,7 @@ class SeoService:
         }
 
         # ===== 6. FAQ 結構 (10 分) =====
-        faq_score = self._score_faq_quality(content, suggestions)
+        faq_score = self._score_faq_quality(index, suggestions)
         breakdown["faq_quality"] = {
             "score": faq_score,
             "max": self.WEIGHTS["faq_quality"],
@@ -194,7 +232,7 @@ class SeoService:
         }
 
         # ===== 7. 圖片使用 (5 分) =====
-        media_score, image_count = self._score_media_usage(content, suggestions, known_image_count=image_count)
+        media_score, image_count = self._score_media_usage(index, suggestions, known_image_count=image_count)
         breakdown["media_usage"] = {
             "score": media_score,
             "max": self.WEIGHTS["media_usage"],
@@ -202,7 +240,7 @@ class SeoService:
         }
 
         # ===== 8. 可讀性 (5 分) =====
-        read_score = self._score_readability(content, suggestions)
+        read_score = self._score_readability(index, suggestions)
         breakdown["readability"] = {
             "score": read_score,
             "max": self.WEIGHTS["readability"],
@@ -225,7 +263,7 @@ class SeoService:
         stats = {
             "title_length": len(title),
             "content_length": len(content),
-            "paragraph_count": self._count_logical_paragraphs(content),
+            "paragraph_count": index.logical_paragraphs,
             "image_count": image_count,
             "keyword_density": round(density_val, 2),
         }
@@ -238,15 +276,23 @@ class SeoService:
             "suggestions": suggestion_texts,
             "keywords": keywords,
             "stats": stats,
+            # 細部診斷：關鍵字在全文的分佈（histogram_bins 個等長區間的命中次數）與各關鍵字出現次數
+            "diagnostics": {
+                "keyword_histogram": index.keyword_histogram(histogram_bins),
+                "keyword_hits": index.keyword_counts(),
+                "sentence_count": len(index.sentences),
+                "emoji_count": len(index.emoji),
+                "faq_questions": self._faq_count(index),
+            },
         }
 
     # ── 各項評分子函數 ──
 
-    def _score_title_seo(self, title: str, keywords: list, suggestions: list) -> float:
+    def _score_title_seo(self, index: DocumentIndex, suggestions: list) -> float:
         """標題 SEO 評分：長度 20-35 字 + 含關鍵字"""
         max_score = self.WEIGHTS["title_seo"]
         score = 0.0
-        title_len = len(title)
+        title_len = len(index.title)
 
         # 長度分（佔 60%）
         if 20 <= title_len <= 35:
@@ -265,9 +311,8 @@ class SeoService:
             })
 
         # 關鍵字分（佔 40%）
-        if keywords:
-            has_keyword = any(kw in title for kw in keywords[:3])
-            if has_keyword:
+        if index.keywords:
+            if index.title_matches.contains(0, title_len, top=3):
                 score += max_score * 0.4
             else:
                 score += max_score * 0.1
@@ -280,34 +325,20 @@ class SeoService:
 
         return round(score, 1)
 
-    def _score_keyword_density(self, content: str, keywords: list, suggestions: list) -> tuple:
+    def _score_keyword_density(self, index: DocumentIndex, suggestions: list) -> tuple:
         """關鍵字密度評分：修正公式，1-2% 滿分"""
         max_score = self.WEIGHTS["keyword_density"]
-        total_chars = len(content)
+        total_chars = len(index.content)
 
-        if not keywords or total_chars == 0:
+        if not index.keywords or total_chars == 0:
             suggestions.append({
                 "text": "無法分析關鍵字密度，建議在標題加入【關鍵字】標記",
                 "priority": 2,
             })
             return max_score * 0.3, 0.0
 
-        # 最長匹配優先：避免重疊子串重複計算同一段文字
-        keywords_sorted = sorted(keywords, key=len, reverse=True)
-        counted = [False] * total_chars
-        keyword_chars = 0
-        for kw in keywords_sorted:
-            start = 0
-            while True:
-                pos = content.find(kw, start)
-                if pos == -1:
-                    break
-                if not any(counted[pos:pos + len(kw)]):
-                    keyword_chars += len(kw)
-                    for i in range(pos, pos + len(kw)):
-                        counted[i] = True
-                start = pos + 1
-        density = (keyword_chars / total_chars) * 100
+        # 最長匹配優先、不重疊：避免重疊子串重複計算同一段文字
+        density = (index.keyword_matches.matched_chars / total_chars) * 100
 
         if 1.0 <= density <= 2.0:
             score = max_score
@@ -338,19 +369,18 @@ class SeoService:
 
         return round(score, 1), density
 
-    def _score_keyword_placement(self, content: str, keywords: list, suggestions: list) -> float:
+    def _score_keyword_placement(self, index: DocumentIndex, suggestions: list) -> float:
         """關鍵字分佈評分：首段 100 字含關鍵字 + 分佈均勻度"""
         max_score = self.WEIGHTS["keyword_placement"]
 
-        if not keywords:
+        if not index.keywords:
             return max_score * 0.3
 
+        content, matches = index.content, index.keyword_matches
         score = 0.0
 
         # 首段 100 字包含關鍵字（佔 50%）
-        first_100 = content[:100]
-        has_early_keyword = any(kw in first_100 for kw in keywords[:3])
-        if has_early_keyword:
+        if matches.contains(0, 100, top=3):
             score += max_score * 0.5
         else:
             suggestions.append({
@@ -365,8 +395,7 @@ class SeoService:
             for i in range(4):
                 start = i * quarter
                 end = (i + 1) * quarter if i < 3 else len(content)
-                segment = content[start:end]
-                if any(kw in segment for kw in keywords[:5]):
+                if matches.contains(start, end, top=5):
                     quarters_with_kw += 1
 
             spread_ratio = quarters_with_kw / 4
@@ -381,52 +410,13 @@ class SeoService:
 
         return round(score, 1)
 
-    @staticmethod
-    def _count_logical_paragraphs(content: str) -> int:
-        """智慧段落計數：過濾裝飾行，合併連續短行為邏輯段落"""
-        raw_blocks = [p.strip() for p in content.split("\n\n") if p.strip()]
-
-        # 過濾分隔線和純裝飾行
-        separator_re = re.compile(r'^[=\-─—\s]{3,}$')
-        meaningful = []
-        for block in raw_blocks:
-            # 跳過分隔線
-            if separator_re.match(block):
-                continue
-            # 跳過純 emoji/符號的短行（< 5 個非空白可見中文/英數字元）
-            text_chars = re.sub(r'[\s\U0001F300-\U0001F9FF\U00002600-\U000027BF\U0000FE00-\U0000FEFF]', '', block)
-            if len(text_chars) < 5:
-                continue
-            meaningful.append(block)
-
-        # 合併連續短行為邏輯段落（列表區塊視為一個段落）
-        logical_count = 0
-        consecutive_short = 0
-        for block in meaningful:
-            lines = block.split('\n')
-            # 整個 block 的所有行都 < 30 字 → 視為列表/短行區塊
-            if all(len(line.strip()) < 30 for line in lines):
-                consecutive_short += 1
-            else:
-                # 前面有累積的短行區塊，算一個邏輯段落
-                if consecutive_short > 0:
-                    logical_count += 1
-                    consecutive_short = 0
-                logical_count += 1
-
-        # 收尾：剩餘的短行區塊
-        if consecutive_short > 0:
-            logical_count += 1
-
-        return max(logical_count, 1)
-
-    def _score_content_structure(self, content: str, suggestions: list) -> float:
+    def _score_content_structure(self, index: DocumentIndex, suggestions: list) -> float:
         """內容結構評分：段落數量 + 長度控制 + 列表使用 + 分隔線"""
         max_score = self.WEIGHTS["content_structure"]
         score = 0.0
 
-        paragraphs = [p.strip() for p in content.split("\n\n") if p.strip()]
-        para_count = self._count_logical_paragraphs(content)
+        paragraph_lengths = index.paragraph_lengths()
+        para_count = index.logical_paragraphs
 
         # 段落數量（佔 35%）
         if 8 <= para_count <= 25:
@@ -445,9 +435,9 @@ class SeoService:
             })
 
         # 段落長度控制（佔 25%）：無超長段落
-        if paragraphs:
-            avg_len = sum(len(p) for p in paragraphs) / len(paragraphs)
-            long_paras = sum(1 for p in paragraphs if len(p) > 300)
+        if paragraph_lengths:
+            avg_len = sum(paragraph_lengths) / len(paragraph_lengths)
+            long_paras = sum(1 for length in paragraph_lengths if length > 300)
             if long_paras == 0 and 30 <= avg_len <= 200:
                 score += max_score * 0.25
             elif long_paras <= 2:
@@ -460,7 +450,7 @@ class SeoService:
                 })
 
         # 列表/項目符號使用（佔 20%）
-        list_items = len(re.findall(r'^[-*●👉➡️✅✨❤️😁💰🔍❓]\s*', content, re.MULTILINE))
+        list_items = len(index.list_items)
         if list_items >= 3:
             score += max_score * 0.2
         elif list_items >= 1:
@@ -472,7 +462,7 @@ class SeoService:
             })
 
         # 分隔線使用（佔 20%）
-        separator_count = len(re.findall(r'={3,}|—{3,}|─{3,}', content))
+        separator_count = len(index.separators)
         if separator_count >= 2:
             score += max_score * 0.2
         elif separator_count >= 1:
@@ -482,10 +472,10 @@ class SeoService:
 
         return round(score, 1)
 
-    def _score_content_length(self, content: str, suggestions: list) -> float:
+    def _score_content_length(self, index: DocumentIndex, suggestions: list) -> float:
         """內容長度評分：1500-2500 字滿分"""
         max_score = self.WEIGHTS["content_length"]
-        content_len = len(content)
+        content_len = len(index.content)
 
         if 1500 <= content_len <= 2500:
             return max_score
@@ -512,23 +502,17 @@ class SeoService:
             })
             return round(max_score * 0.15, 1)
 
-    def _score_faq_quality(self, content: str, suggestions: list) -> float:
+    @staticmethod
+    def _faq_count(index: DocumentIndex) -> int:
+        """FAQ 題數：Q1:/A1: 成對標記、❓ 開頭的問題、問號結尾的行，取最多者"""
+        return max(len(index.qa_markers) // 2, len(index.emoji_questions), len(index.question_lines))
+
+    def _score_faq_quality(self, index: DocumentIndex, suggestions: list) -> float:
         """FAQ 結構評分：偵測 Q/A 格式、問答題數"""
         max_score = self.WEIGHTS["faq_quality"]
+        faq_count = self._faq_count(index)
 
-        # 偵測 FAQ 模式
-        # Q1: / A1: 格式
-        qa_pattern = re.findall(r'Q\d+[:：]', content, re.IGNORECASE)
-        # ❓ 開頭的問題
-        emoji_q = re.findall(r'❓\s*.+', content)
-        # 「常見問題」「FAQ」區塊
-        has_faq_section = bool(re.search(r'(FAQ|常見問題|Q&A|問答)', content, re.IGNORECASE))
-        # 問號結尾的行（可能是問題）
-        question_lines = re.findall(r'^.{5,}[？?]\s*$', content, re.MULTILINE)
-
-        faq_count = max(len(qa_pattern) // 2, len(emoji_q), len(question_lines))
-
-        if faq_count >= 3 and has_faq_section:
+        if faq_count >= 3 and index.has_faq_section:
             return max_score
         elif faq_count >= 3:
             return round(max_score * 0.8, 1)
@@ -545,15 +529,10 @@ class SeoService:
             })
             return 0.0
 
-    def _score_media_usage(self, content: str, suggestions: list, known_image_count: Optional[int] = None) -> tuple:
-        """圖片使用評分"""
+    def _score_media_usage(self, index: DocumentIndex, suggestions: list, known_image_count: Optional[int] = None) -> tuple:
+        """圖片使用評分（未提供圖片數時以內容中的圖片標記與 Markdown 圖片計數）"""
         max_score = self.WEIGHTS["media_usage"]
-        if known_image_count is not None:
-            image_count = known_image_count
-        else:
-            image_count = len(re.findall(r'\{\{IMAGE:\d+:\d+\}\}', content))
-            # 也計算已替換的 markdown 圖片
-            image_count += len(re.findall(r'!\[.*?\]\(.*?\)', content))
+        image_count = known_image_count if known_image_count is not None else len(index.images)
 
         if image_count >= 3:
             return max_score, image_count
@@ -570,16 +549,15 @@ class SeoService:
             })
             return 0.0, image_count
 
-    def _score_readability(self, content: str, suggestions: list) -> float:
+    def _score_readability(self, index: DocumentIndex, suggestions: list) -> float:
         """可讀性評分：真實分析句長 + emoji 使用"""
         max_score = self.WEIGHTS["readability"]
         score = 0.0
 
         # 句長分析（佔 60%）：以句號/問號/驚嘆號為斷句
-        sentences = re.split(r'[。！？!?\n]+', content)
-        sentences = [s.strip() for s in sentences if len(s.strip()) >= 5]
-        if sentences:
-            avg_sentence_len = sum(len(s) for s in sentences) / len(sentences)
+        sentence_lengths = index.sentence_lengths()
+        if sentence_lengths:
+            avg_sentence_len = sum(sentence_lengths) / len(sentence_lengths)
             if 15 <= avg_sentence_len <= 50:
                 score += max_score * 0.6
             elif 10 <= avg_sentence_len <= 70:
@@ -594,10 +572,7 @@ class SeoService:
             score += max_score * 0.2
 
         # Emoji 使用（佔 40%）：Dcard 風格鼓勵適度使用 emoji
-        emoji_pattern = re.compile(
-            r'[\U0001F300-\U0001F9FF\U00002600-\U000027BF\U0000FE00-\U0000FEFF]'
-        )
-        emoji_count = len(emoji_pattern.findall(content))
+        emoji_count = len(index.emoji)
         if 3 <= emoji_count <= 30:
             score += max_score * 0.4
         elif emoji_count > 0:
@@ -618,8 +593,8 @@ class SeoService:
         else:
             return "D"
 
-    def optimize_with_llm(self, article, model: Optional[str] = None, user_id: Optional[int] = None, disable_seo_prompt: bool = False) -> dict:
-        """使用 LLM 進行 SEO 優化"""
+    def _prepare_optimize(self, article, disable_seo_prompt: bool) -> tuple[dict, int, str, str]:
+        """SEO 優化前置：分析現狀並組合 prompt，回傳 (before_analysis, image_count, seo_prompt, user_message)"""
         content = article.content or ""
 
         # 先分析現狀
@@ -657,70 +632,112 @@ class SeoService:
 - 關鍵字密度目標 1-2%
 - FAQ 用 Q1:/A1: 結構化格式
 """
+        seo_prompt = ("請優化以下文章的 SEO，保持文章風格不變，"
+                      "重點改善標題（20-35字）和關鍵字分佈。") if disable_seo_prompt else SEO_OPTIMIZE_PROMPT
+        return before_analysis, article_image_count, seo_prompt, user_message
+
+    def _finish_optimize(self, article, optimized_content: str, before_analysis: dict, article_image_count: int) -> dict:
+        """解析 LLM 輸出（標題 + 內容）並重新分析"""
+        # 清除可能殘留的 Markdown，第一個有意義的行為優化後標題（沒有時保留原標題）
+        optimized_title, optimized_content = parse_title_content(optimized_content)
+        optimized_title = optimized_title or article.title
+
+        # 優化後重新分析（使用新標題，圖片數量不變）
+        after_analysis = self.analyze(title=optimized_title, content=optimized_content, image_count=article_image_count)
+
+        return {
+            "optimized_title": optimized_title,
+            "optimized_content": optimized_content,
+            "score": after_analysis["score"],
+            "suggestions": after_analysis["suggestions"],
+            "before_score": before_analysis["score"],
+            "before_analysis": before_analysis,
+            "after_analysis": after_analysis,
+        }
+
+    def optimize_with_llm(self, article, model: Optional[str] = None, user_id: Optional[int] = None, disable_seo_prompt: bool = False) -> dict:
+        """使用 LLM 進行 SEO 優化"""
+        before_analysis, article_image_count, seo_prompt, user_message = self._prepare_optimize(article, disable_seo_prompt)
 
         # SEO 優化強制使用最便宜的模型（節省成本，SEO 改寫不需要高階模型）
         use_model = "gemini-2.5-flash"
-        seo_prompt = ("請優化以下文章的 SEO，保持文章風格不變，"
-                      "重點改善標題（20-35字）和關鍵字分佈。") if disable_seo_prompt else SEO_OPTIMIZE_PROMPT
         try:
             if is_anthropic_model(use_model):
+                rate_limiter.acquire(f"anthropic:{use_model}")
                 response = self.anthropic_client.messages.create(
                     model=use_model,
                     max_tokens=settings.LLM_MAX_TOKENS,
-                    system=seo_prompt,
+                    system=anthropic_system_blocks(seo_prompt),
                     messages=[{"role": "user", "content": user_message}],
                 )
                 optimized_content = response.content[0].text
                 logger.info(f"Claude SEO 優化完成，文字長度: {len(optimized_content)}")
                 track_anthropic_usage(response, model=use_model, user_id=user_id)
             else:
+                rate_limiter.acquire(f"gemini:{use_model}")
                 response = self.gemini_client.models.generate_content(
                     model=use_model,
                     contents=user_message,
-                    config=types.GenerateContentConfig(
-                        system_instruction=seo_prompt,
-                        temperature=0.5,
-                        max_output_tokens=settings.LLM_MAX_TOKENS,
-                        http_options=types.HttpOptions(timeout=300_000),  # 毫秒，300秒
-                    ),
+                    config=self._optimize_config(seo_prompt),
                 )
                 optimized_content = response.text
                 logger.info(f"Gemini SEO 優化完成，文字長度: {len(optimized_content)}")
                 track_gemini_usage(response, model=use_model, user_id=user_id)
 
-            # 清除可能殘留的 Markdown
-            optimized_content = strip_markdown(optimized_content)
-
-            # 從 LLM 輸出中解析優化後的標題（第一個非空行）
-            optimized_title = article.title  # 預設保留原標題
-            lines = optimized_content.strip().split('\n')
-            skip_patterns = {'---', '===', '***', '- - -', '* * *'}
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-                if not stripped or stripped in skip_patterns:
-                    continue
-                # 第一個有意義的行作為標題
-                optimized_title = stripped.lstrip('#').strip()
-                optimized_content = '\n'.join(lines[i + 1:]).strip()
-                break
-
-            # 優化後重新分析（使用新標題，圖片數量不變）
-            after_analysis = self.analyze(title=optimized_title, content=optimized_content, image_count=article_image_count)
-
-            return {
-                "optimized_title": optimized_title,
-                "optimized_content": optimized_content,
-                "score": after_analysis["score"],
-                "suggestions": after_analysis["suggestions"],
-                "before_score": before_analysis["score"],
-                "before_analysis": before_analysis,
-                "after_analysis": after_analysis,
-            }
+            return self._finish_optimize(article, optimized_content, before_analysis, article_image_count)
+
+        except Exception as e:
+            logger.error(f"SEO LLM 優化失敗 ({use_model}): {e}")
+            raise RuntimeError(f"SEO 優化失敗: {e}")
+
+    async def aoptimize_with_llm(self, article, model: Optional[str] = None, user_id: Optional[int] = None, disable_seo_prompt: bool = False) -> dict:
+        """使用 LLM 進行 SEO 優化（async 版本，走原生 async client）
+
+        優化前後的評分（可能查詢 Redis 評分快取）與用量寫入 DB 都是阻塞操作，丟到執行緒執行
+        """
+        before_analysis, article_image_count, seo_prompt, user_message = await asyncio.to_thread(
+            self._prepare_optimize, article, disable_seo_prompt,
+        )
+
+        use_model = "gemini-2.5-flash"
+        try:
+            if is_anthropic_model(use_model):
+                await rate_limiter.aacquire(f"anthropic:{use_model}")
+                response = await self.async_anthropic_client.messages.create(
+                    model=use_model,
+                    max_tokens=settings.LLM_MAX_TOKENS,
+                    system=anthropic_system_blocks(seo_prompt),
+                    messages=[{"role": "user", "content": user_message}],
+                )
+                optimized_content = response.content[0].text
+                logger.info(f"Claude SEO 優化完成，文字長度: {len(optimized_content)}")
+                await asyncio.to_thread(track_anthropic_usage, response, model=use_model, user_id=user_id)
+            else:
+                await rate_limiter.aacquire(f"gemini:{use_model}")
+                response = await self.gemini_client.aio.models.generate_content(
+                    model=use_model,
+                    contents=user_message,
+                    config=self._optimize_config(seo_prompt),
+                )
+                optimized_content = response.text
+                logger.info(f"Gemini SEO 優化完成，文字長度: {len(optimized_content)}")
+                await asyncio.to_thread(track_gemini_usage, response, model=use_model, user_id=user_id)
+
+            return await asyncio.to_thread(self._finish_optimize, article, optimized_content, before_analysis, article_image_count)
 
         except Exception as e:
             logger.error(f"SEO LLM 優化失敗 ({use_model}): {e}")
             raise RuntimeError(f"SEO 優化失敗: {e}")
 
+    @staticmethod
+    def _optimize_config(seo_prompt: str):
+        return types.GenerateContentConfig(
+            system_instruction=seo_prompt,
+            temperature=0.5,
+            max_output_tokens=settings.LLM_MAX_TOKENS,
+            http_options=types.HttpOptions(timeout=300_000),  # 毫秒，300秒
+        )
+
 
 # 單例
 seo_service = SeoService()
@@ -14,6 +14,8 @@ from google import genai
 from google.genai import types
 
 from app.config import settings
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import single_flight
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +62,7 @@ class ShopeeService:
         }
 
         try:
+            rate_limiter.acquire("shopee")
             resp = requests.post(
                 self.BASE_URL, headers=headers, data=payload, timeout=15
             )
@@ -156,7 +159,35 @@ class ShopeeService:
         min_rating: float = None,
         min_results: int = 20,
     ) -> dict:
-        """彈性查詢商品，支援後端過濾 + 自動分頁填滿"""
+        """彈性查詢商品，支援後端過濾 + 自動分頁填滿
+
+        參數完全相同的查詢進行中時合併為一次（見 single_flight）
+        """
+        params = dict(
+            keyword=keyword, sort_type=sort_type, list_type=list_type,
+            is_ams_offer=is_ams_offer, is_key_seller=is_key_seller, page=page, limit=limit,
+            min_commission_rate=min_commission_rate, min_sales=min_sales, max_sales=max_sales,
+            min_price=min_price, max_price=max_price, min_rating=min_rating, min_results=min_results,
+        )
+        return single_flight.do(("shopee_explore", *params.items()), self._explore_products, **params)
+
+    def _explore_products(
+        self,
+        keyword: str,
+        sort_type: int,
+        list_type: int,
+        is_ams_offer: bool,
+        is_key_seller: bool,
+        page: int,
+        limit: int,
+        min_commission_rate: float,
+        min_sales: int,
+        max_sales: int,
+        min_price: float,
+        max_price: float,
+        min_rating: float,
+        min_results: int,
+    ) -> dict:
         # sort_type 6 = 銷量+佣金率（自訂複合排序），API 用 sort_type=2（銷量）
         api_sort_type = 2 if sort_type == 6 else sort_type
 
@@ -327,12 +358,19 @@ shopee_service = ShopeeService()
 # ─── 競品搜尋輔助函數 ───
 
 def extract_search_keywords(product_name: str, user_id: int = None) -> list[str]:
-    """用 Gemini Flash 從商品名稱提取 2-3 個搜尋關鍵字"""
+    """用 Gemini Flash 從商品名稱提取 2-3 個搜尋關鍵字（同一用戶相同商品名稱進行中時合併為一次）"""
+    return single_flight.do(
+        ("search_keywords", user_id, product_name), _extract_search_keywords, product_name, user_id,
+    )
+
+
+def _extract_search_keywords(product_name: str, user_id: int = None) -> list[str]:
     from app.services.gemini_utils import track_gemini_usage
 
     model = "gemini-2.5-flash"
     try:
         client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+        rate_limiter.acquire(f"gemini:{model}")
         response = client.models.generate_content(
             model=model,
             contents=f"商品名稱：{product_name}",
@@ -0,0 +1,118 @@
+"""
+相同工作合併執行（single-flight）— 同一個鍵的計算進行中時，後到的呼叫端等待同一份結果
+
+多個分頁同時對相同商品做關鍵字研究、對同一商品名稱找競品時，只送出一組 LLM / Autocomplete / 蝦皮請求。
+
+- do(key, fn, ...)：同步版本（FastAPI 執行緒池 / Celery），以 threading.Event 等待
+- ado(key, factory)：async 版本，共用同一個 asyncio.Task；
+  單一呼叫端被取消不影響其他等待者，所有等待者都取消時才取消該工作
+- 只合併「進行中」的呼叫，完成後立即移除（結果快取另見 llm_response_cache）
+- 後到者拿到的是結果的深複製，呼叫端可自行修改（如替商品加上競品分數）而不互相影響
+- 領頭的呼叫失敗時，等待中的呼叫端收到同一個例外
+"""
+import asyncio
+import copy
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """進行中的同步呼叫"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class _Flight:
+    """進行中的 async 工作"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """相同鍵的並行呼叫合併（單例）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._flights: dict[Hashable, _Flight] = {}
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            logger.info(f"合併進行中的相同請求: {key[0] if isinstance(key, tuple) else key}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable]):
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _t: self._pop_flight(key, flight))
+        else:
+            with self._lock:
+                self._coalesced += 1
+            logger.info(f"合併進行中的相同請求: {key[0] if isinstance(key, tuple) else key}")
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done():
+                flight.waiters -= 1
+                if flight.waiters == 0:
+                    # 之後的新呼叫端重新開始，不再加入即將取消的工作
+                    self._pop_flight(key, flight)
+                    flight.task.cancel()
+            raise
+        return result if leader else copy.deepcopy(result)
+
+    def in_flight(self, key: Hashable) -> bool:
+        """async 工作是否進行中（呼叫 ado 前判斷自己是否為加入者）"""
+        return key in self._flights
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._flights),
+                "coalesced_total": self._coalesced,
+            }
+
+    def _pop_flight(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+# 單例
+single_flight = SingleFlight()
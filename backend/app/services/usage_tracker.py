@@ -27,6 +27,12 @@ MODEL_PRICING = {
     },
 }
 
+# Prompt 快取計價（相對於 input 單價的倍率）
+CACHE_PRICING = {
+    "google": {"read": 0.25, "write": 1.0},
+    "anthropic": {"read": 0.10, "write": 1.25},
+}
+
 USD_TO_TWD = 32.5
 
 
@@ -58,14 +64,16 @@ class UsageTracker:
             db.refresh(record)
         return record
 
-    def record_usage(self, provider: str, model: str, input_tokens: int, output_tokens: int, user_id: Optional[int] = None):
-        """記錄一次 API 使用"""
+    def record_usage(self, provider: str, model: str, input_tokens: int, output_tokens: int, user_id: Optional[int] = None, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
+        """記錄一次 API 使用（input_tokens 為未命中快取的輸入 token）"""
         db = SessionLocal()
         try:
             record = self._get_or_create_record(db, provider, model, user_id)
             record.requests += 1
             record.input_tokens += input_tokens
             record.output_tokens += output_tokens
+            record.cache_read_tokens = (record.cache_read_tokens or 0) + cache_read_tokens
+            record.cache_write_tokens = (record.cache_write_tokens or 0) + cache_write_tokens
             db.commit()
         except Exception as e:
             logger.error(f"記錄使用量失敗: {e}")
@@ -73,13 +81,17 @@ class UsageTracker:
         finally:
             db.close()
 
-    def _calc_cost(self, provider: str, model: str, input_tokens: int, output_tokens: int) -> float:
+    def _calc_cost(self, provider: str, model: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> float:
         pricing = MODEL_PRICING.get(provider, {}).get(model)
         if not pricing:
             return 0.0
+        cache_pricing = CACHE_PRICING.get(provider, {"read": 1.0, "write": 1.0})
         input_cost = (input_tokens / 1_000_000) * pricing["input"]
         output_cost = (output_tokens / 1_000_000) * pricing["output"]
-        return input_cost + output_cost
+        cache_cost = (
+            (cache_read_tokens or 0) * cache_pricing["read"] + (cache_write_tokens or 0) * cache_pricing["write"]
+        ) / 1_000_000 * pricing["input"]
+        return input_cost + output_cost + cache_cost
 
     def get_usage(self, user_id: Optional[int] = None) -> Dict:
         """取得完整使用統計（按模型分組 + 30 天歷史），可按 user_id 過濾"""
@@ -95,6 +107,8 @@ class UsageTracker:
                 func.sum(UsageRecord.requests).label("requests"),
                 func.sum(UsageRecord.input_tokens).label("input_tokens"),
                 func.sum(UsageRecord.output_tokens).label("output_tokens"),
+                func.coalesce(func.sum(UsageRecord.cache_read_tokens), 0).label("cache_read_tokens"),
+                func.coalesce(func.sum(UsageRecord.cache_write_tokens), 0).label("cache_write_tokens"),
             )
             if user_id is not None:
                 base_query = base_query.filter(UsageRecord.user_id == user_id)
@@ -102,7 +116,10 @@ class UsageTracker:
             model_stats = base_query.group_by(UsageRecord.provider, UsageRecord.model).all()
 
             for stat in model_stats:
-                cost = self._calc_cost(stat.provider, stat.model, stat.input_tokens, stat.output_tokens)
+                cost = self._calc_cost(
+                    stat.provider, stat.model, stat.input_tokens, stat.output_tokens,
+                    stat.cache_read_tokens or 0, stat.cache_write_tokens or 0,
+                )
                 total_cost_usd += cost
                 by_model.append({
                     "provider": stat.provider,
@@ -110,6 +127,8 @@ class UsageTracker:
                     "requests": stat.requests,
                     "input_tokens": stat.input_tokens,
                     "output_tokens": stat.output_tokens,
+                    "cache_read_tokens": stat.cache_read_tokens,
+                    "cache_write_tokens": stat.cache_write_tokens,
                     "cost_usd": round(cost, 6),
                 })
 
@@ -122,6 +141,8 @@ class UsageTracker:
                 UsageRecord.requests,
                 UsageRecord.input_tokens,
                 UsageRecord.output_tokens,
+                UsageRecord.cache_read_tokens,
+                UsageRecord.cache_write_tokens,
             ).filter(UsageRecord.usage_date >= thirty_days_ago)
             if user_id is not None:
                 history_query = history_query.filter(UsageRecord.user_id == user_id)
@@ -135,11 +156,16 @@ class UsageTracker:
                 if d not in history_map:
                     history_map[d] = {"date": d, "models": {}, "daily_total_usd": 0.0}
                 model_key = f"{rec.provider}/{rec.model}"
-                cost = self._calc_cost(rec.provider, rec.model, rec.input_tokens, rec.output_tokens)
+                cost = self._calc_cost(
+                    rec.provider, rec.model, rec.input_tokens, rec.output_tokens,
+                    rec.cache_read_tokens or 0, rec.cache_write_tokens or 0,
+                )
                 history_map[d]["models"][model_key] = {
                     "requests": rec.requests,
                     "input_tokens": rec.input_tokens,
                     "output_tokens": rec.output_tokens,
+                    "cache_read_tokens": rec.cache_read_tokens or 0,
+                    "cache_write_tokens": rec.cache_write_tokens or 0,
                     "cost_usd": round(cost, 6),
                 }
                 history_map[d]["daily_total_usd"] = round(history_map[d]["daily_total_usd"] + cost, 6)
@@ -194,6 +220,8 @@ class UsageTracker:
                 func.sum(UsageRecord.requests).label("requests"),
                 func.sum(UsageRecord.input_tokens).label("input_tokens"),
                 func.sum(UsageRecord.output_tokens).label("output_tokens"),
+                func.coalesce(func.sum(UsageRecord.cache_read_tokens), 0).label("cache_read_tokens"),
+                func.coalesce(func.sum(UsageRecord.cache_write_tokens), 0).label("cache_write_tokens"),
             )
             if start_date:
                 per_user_model_query = per_user_model_query.filter(UsageRecord.usage_date >= start_date)
@@ -212,13 +240,18 @@ class UsageTracker:
                         "models": [],
                         "total_cost_usd": 0.0,
                     }
-                cost = self._calc_cost(row.provider, row.model, row.input_tokens, row.output_tokens)
+                cost = self._calc_cost(
+                    row.provider, row.model, row.input_tokens, row.output_tokens,
+                    row.cache_read_tokens or 0, row.cache_write_tokens or 0,
+                )
                 by_user[uid]["models"].append({
                     "provider": row.provider,
                     "model": row.model,
                     "requests": row.requests,
                     "input_tokens": row.input_tokens,
                     "output_tokens": row.output_tokens,
+                    "cache_read_tokens": row.cache_read_tokens,
+                    "cache_write_tokens": row.cache_write_tokens,
                     "cost_usd": round(cost, 6),
                 })
                 by_user[uid]["total_cost_usd"] = round(by_user[uid]["total_cost_usd"] + cost, 6)
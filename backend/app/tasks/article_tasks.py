@@ -1,47 +1,345 @@
 """
-文章生成 Celery 任務
+文章生成 Celery 任務（GENERATION_BACKEND=celery）
+
+web 程序只建立 placeholder 文章並以 enqueue_generation() 排入 chain，各步驟由 worker 執行：
+
+    fetch_images → extract_image_text → generate_text → analyze_seo → persist_article
+
+- 步驟間以 JSON dict（job）傳遞請求參數與中間結果。圖片不經過 broker：
+  fetch_images 下載並前處理後寫入該次生成的暫存目錄（{IMAGE_CACHE_DIR}/jobs/{job_id}），
+  之後的步驟直接讀取前處理結果，不再重新下載 / 前處理；暫存目錄在寫入或失敗時刪除
+- 未附圖時沒有 fetch_images；只有 Claude 模型 + 附圖時才有 extract_image_text（Gemini 直接讀圖）
+- 整條 chain 送到用戶所屬的分片佇列（見 celery_app.generation_queue），用戶間公平分配 worker
+- acks_late（見 celery_app）：worker 中途死亡時步驟會重新投遞。
+  會呼叫 LLM 的步驟開始前確認文章仍在生成中（已刪除 / 已標記失敗時略過，job["skipped"]），
+  generate_text 重新投遞時若結果已寫入 result backend 直接沿用，不重複計費；
+  persist_article 只更新仍在生成中的文章，略過時回傳 {"skipped": True} 供 web 端回報
+- 步驟失敗（DB 連線錯誤重試用盡後）即將文章標記為 failed 並寫入遙測，chain 停止。
+  LLM 的暫時性錯誤由 llm_service 自行重試 / 切換備援模型；會呼叫 LLM 的步驟（extract_image_text / generate_text）
+  不做步驟層級重試（autoretry_for=()），LLM 回應後才發生的 DB 錯誤（記錄用量 / 遙測）也不會重新呼叫 LLM、重複計費
+- 各步驟耗時 / token 以 job["telemetry"] 串接，persist_article 寫入 Article.generation_timings 與 generation_telemetry
 """
+import json
 import logging
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from celery import chain
+from sqlalchemy.exc import OperationalError
+
+from app.celery_app import celery_app, generation_queue
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-try:
-    from app.celery_app import celery_app
 
-    @celery_app.task(bind=True, max_retries=2)
-    def generate_article_task(self, product_ids: list, article_type: str, target_forum: str):
-        """非同步生成文章"""
-        from app.db.database import get_db_session
-        from app.models.product import Product
-        from app.models.article import Article
-        from app.services.llm_service import llm_service
+class GenerationStep(celery_app.Task):
+    """生成 chain 的步驟基底：失敗時將文章標記為 failed；DB 連線錯誤自動重試（呼叫 LLM 的步驟除外）"""
+
+    autoretry_for = (OperationalError,)
+    max_retries = 2
+    retry_backoff = True
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        job = args[0] if args else kwargs.get("job")
+        if job:
+            _fail(job, exc, str(einfo))
 
+
+def _model(job: dict) -> str:
+    return job["params"]["model"] or settings.LLM_MODEL
+
+
+@contextmanager
+def _step(job: dict, stage: str):
+    """執行一個步驟：接續前面步驟的遙測資料並記錄本步驟耗時，yield (db, trace)"""
+    from app.db.database import get_db_session
+    from app.services.generation_telemetry import generation_telemetry
+
+    trace = generation_telemetry.start(job["article_id"], job["user_id"], _model(job))
+    trace.restore(job.get("telemetry") or {}, job["enqueued_at"])
+    if not trace.stages:
+        # 第一個步驟：排入佇列到 worker 開始執行的等待時間
+        trace.stage("queue", trace.started)
+    started = time.perf_counter()
+    try:
         with get_db_session() as db:
-            products = db.query(Product).filter(Product.id.in_(product_ids)).all()
-            if not products:
-                return {"error": "找不到指定的商品"}
-
-            result = llm_service.generate_article(
-                products=products,
-                article_type=article_type,
-                target_forum=target_forum,
-            )
+            yield db, trace
+    except Exception:
+        trace.stage(stage, started, failed=True)
+        raise
+    finally:
+        if stage not in trace.stages:
+            trace.stage(stage, started)
+        job["telemetry"] = trace.export()
+        generation_telemetry.clear()
+
+
+def _still_generating(db, job: dict) -> bool:
+    """文章仍在生成中；已刪除 / 已標記失敗（如 web 端逾時）時標記 job["skipped"]，後續步驟不再呼叫 LLM"""
+    from app.models.article import Article
+
+    if job.get("skipped"):
+        return False
+    status = db.query(Article.status).filter(Article.id == job["article_id"]).scalar()
+    if status != "generating":
+        logger.info(f"文章 {job['article_id']} 已不在生成中（{status}），略過後續步驟")
+        job["skipped"] = True
+        return False
+    return True
+
+
+def _load_products(db, job: dict) -> list:
+    """載入用戶自己的商品，依 product_ids 順序排列"""
+    from app.models.product import Product
+
+    product_ids = job["product_ids"]
+    products_map = {p.id: p for p in db.query(Product).filter(
+        Product.id.in_(product_ids),
+        Product.user_id == job["user_id"],
+    ).all()}
+    products = [products_map[pid] for pid in product_ids if pid in products_map]
+    if not products:
+        raise ValueError("找不到指定的商品")
+    return products
+
+
+def _image_sources(job: dict) -> list[str]:
+    return job["params"]["image_sources"] or ["description"]
+
+
+# ── 前處理後圖片的暫存（同一次生成的步驟間共用）──
+
+def _spool_dir(job: dict) -> Path:
+    return settings.IMAGE_CACHE_DIR / "jobs" / job["job_id"]
+
+
+def _save_images(job: dict, image_groups: list[list[tuple[bytes, str]]]):
+    """寫入前處理後的圖片（每張原圖一組），manifest 最後寫入，存在即代表完整"""
+    from app.services.image_cache import atomic_write
+
+    _sweep_spool()
+    directory = _spool_dir(job)
+    manifest = []
+    for i, group in enumerate(image_groups):
+        entries = []
+        for j, (data, mime_type) in enumerate(group):
+            name = f"{i}-{j}.bin"
+            atomic_write(directory / name, data)
+            entries.append({"file": name, "mime_type": mime_type})
+        manifest.append(entries)
+    atomic_write(directory / "manifest.json", json.dumps(manifest).encode("utf-8"))
+
+
+def _load_images(db, job: dict) -> list[list[tuple[bytes, str]]]:
+    """讀取 fetch_images 的前處理結果；暫存不存在（如 worker 不共用 IMAGE_CACHE_DIR）時重新下載"""
+    from app.services.llm_service import llm_service
 
-            article = Article(
-                title=result["title"],
-                content=result["content"],
-                content_with_images=result["content_with_images"],
-                article_type=article_type,
-                target_forum=target_forum,
-                product_ids=product_ids,
-                image_map=result.get("image_map"),
-                status="draft",
+    directory = _spool_dir(job)
+    try:
+        manifest = json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+        return [[((directory / e["file"]).read_bytes(), e["mime_type"]) for e in entries] for entries in manifest]
+    except (OSError, ValueError, KeyError):
+        logger.warning(f"文章 {job['article_id']} 的圖片暫存不存在，重新下載")
+        return llm_service._download_images(_load_products(db, job), _image_sources(job))
+
+
+def _discard_images(job: dict):
+    if job.get("job_id"):
+        shutil.rmtree(_spool_dir(job), ignore_errors=True)
+
+
+def _sweep_spool():
+    """清除超過生成時限仍未刪除的暫存（worker 在寫入 / 失敗處理前死亡時遺留）"""
+    cutoff = time.time() - settings.CELERY_GENERATION_DEADLINE_SECONDS * 2
+    for directory in (settings.IMAGE_CACHE_DIR / "jobs").glob("*"):
+        try:
+            if directory.stat().st_mtime < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+        except OSError:
+            continue
+
+
+@celery_app.task(base=GenerationStep, name="articles.fetch_images")
+def fetch_images(job: dict) -> dict:
+    """下載並前處理商品圖片，寫入暫存供後續步驟讀取（不經過 broker 傳遞）"""
+    from app.services.llm_service import llm_service
+
+    with _step(job, "images") as (db, _trace):
+        if _still_generating(db, job):
+            _save_images(job, llm_service._download_images(_load_products(db, job), _image_sources(job)))
+    return job
+
+
+@celery_app.task(base=GenerationStep, autoretry_for=(), name="articles.extract_image_text")
+def extract_image_text(job: dict) -> dict:
+    """Claude 兩階段讀圖：Gemini Flash 提取圖片文字，結果交給 generate_text"""
+    from app.services.llm_service import llm_service
+
+    with _step(job, "ocr") as (db, _trace):
+        if _still_generating(db, job):
+            job["extracted_text"] = llm_service._extract_image_info(_load_images(db, job), user_id=job["user_id"])
+    return job
+
+
+@celery_app.task(base=GenerationStep, bind=True, autoretry_for=(), name="articles.generate_text")
+def generate_text(self, job: dict) -> dict:
+    """呼叫 LLM 生成文章（含重試與備援模型切換），結果為純文字 / Markdown / 含圖片版本
+
+    acks_late 重新投遞（上次已完成但 worker 在 ack 前死亡）時，result backend 已有結果則直接沿用，不重複呼叫 LLM
+    """
+    from app.services.llm_service import llm_service
+
+    previous = self.AsyncResult(self.request.id)
+    if previous.state == "SUCCESS":
+        logger.info(f"文章 {job['article_id']} 的 generate_text 重新投遞，沿用已完成的結果")
+        return previous.result
+
+    params = job["params"]
+    with _step(job, "llm") as (db, _trace):
+        if not _still_generating(db, job):
+            return job
+        job["result"] = llm_service.generate_article(
+            products=_load_products(db, job),
+            db=db,
+            article_type=params["article_type"],
+            target_forum=params["target_forum"],
+            prompt_template_id=params["prompt_template_id"],
+            model=params["model"],
+            user_id=job["user_id"],
+            include_images=params["include_images"],
+            image_sources=_image_sources(job),
+            disable_system_instructions=params["disable_system_instructions"],
+            keyword_strategy=params["keyword_strategy"],
+            use_cache=params["use_cache"],
+            extracted_text=job.get("extracted_text"),
+            image_groups=_load_images(db, job) if params["include_images"] else None,
+        )
+    return job
+
+
+@celery_app.task(base=GenerationStep, name="articles.analyze_seo")
+def analyze_seo(job: dict) -> dict:
+    from app.services.seo_service import seo_service
+
+    if job.get("skipped"):
+        return job
+    result = job["result"]
+    with _step(job, "seo"):
+        job["seo"] = seo_service.analyze(
+            title=result["title"],
+            content=result["content"],
+            image_count=len(result.get("image_map") or {}),
+        )
+    return job
+
+
+@celery_app.task(base=GenerationStep, name="articles.persist_article")
+def persist_article(job: dict) -> dict:
+    """寫入文章；重複投遞或文章已不在生成中（已刪除 / 已標記失敗）時略過，回傳 {"skipped": True}"""
+    from app.models.article import Article
+    from app.services.generation_telemetry import generation_telemetry
+
+    _discard_images(job)
+    with _step(job, "persist") as (db, trace):
+        article = db.query(Article).filter(Article.id == job["article_id"]).first()
+        if job.get("skipped") or article is None or article.status != "generating":
+            logger.warning(f"文章 {job['article_id']} 已不在生成中，生成結果未寫入")
+            return {"article_id": job["article_id"], "skipped": True}
+        result, seo_result = job["result"], job["seo"]
+        article.title = result["title"]
+        article.content = result["content"]
+        article.content_markdown = result.get("content_markdown")
+        article.content_with_images = result["content_with_images"]
+        article.image_map = result.get("image_map")
+        article.seo_score = seo_result["score"]
+        article.seo_suggestions = seo_result
+        article.status = "draft"
+        article.generation_timings = {"stages": dict(trace.stages), "total_ms": trace.elapsed_ms()}
+        commit_started = time.perf_counter()
+        db.commit()
+        trace.stage("commit", commit_started)
+        logger.info(f"文章 {job['article_id']} 生成完成（{trace.elapsed_ms() / 1000:.1f}s, model={trace.model}, worker）")
+        generation_telemetry.save(db, trace, "success")
+    return {"article_id": job["article_id"], "title": result["title"]}
+
+
+def _fail(job: dict, exc: BaseException, tb: str):
+    """步驟失敗：文章改為錯誤報告並寫入遙測"""
+    from app.db.database import get_db_session
+    from app.models.article import Article
+    from app.models.product import Product
+    from app.services.generation_jobs import build_error_report, mark_article_failed
+    from app.services.generation_telemetry import generation_telemetry
+
+    params = job["params"]
+    elapsed = round(time.time() - job["enqueued_at"], 1)
+    logger.error(f"文章 {job['article_id']} 生成失敗（{elapsed}s, worker）: {exc}")
+    _discard_images(job)
+    trace = generation_telemetry.start(job["article_id"], job["user_id"], _model(job))
+    trace.restore(job.get("telemetry") or {}, job["enqueued_at"])
+    try:
+        with get_db_session() as db:
+            status = db.query(Article.status).filter(Article.id == job["article_id"]).scalar()
+            if status != "generating":
+                return
+            products_map = {p.id: p for p in db.query(Product).filter(
+                Product.id.in_(job["product_ids"]),
+                Product.user_id == job["user_id"],
+            ).all()}
+            error_report = build_error_report(
+                exc, tb, elapsed,
+                model=_model(job),
+                article_type=params["article_type"],
+                target_forum=params["target_forum"],
+                include_images=params["include_images"],
+                image_sources=_image_sources(job),
+                prompt_template_id=params["prompt_template_id"],
+                product_ids=job["product_ids"],
+                products_map=products_map,
             )
-            db.add(article)
-            db.commit()
-            db.refresh(article)
+            mark_article_failed(db, job["article_id"], exc, error_report)
+            generation_telemetry.save(db, trace, "failed", exc)
+    except Exception as e:
+        logger.error(f"文章 {job['article_id']} 失敗狀態寫入失敗: {e}")
+    finally:
+        generation_telemetry.clear()
+
+
+def enqueue_generation(article_id: int, user_id: int, product_ids: list[int], params: dict) -> list[tuple[str, str]]:
+    """將文章生成 chain 排入用戶的分片佇列，回傳 [(階段, task_id), ...]（供 web 追蹤進度）
+
+    params: article_type / target_forum / prompt_template_id / model / include_images / image_sources /
+            disable_system_instructions / keyword_strategy / use_cache
+    """
+    from app.services.gemini_utils import is_anthropic_model
 
-            return {"article_id": article.id, "title": article.title}
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "article_id": article_id,
+        "user_id": user_id,
+        "product_ids": product_ids,
+        "params": params,
+        "enqueued_at": time.time(),
+    }
+    steps = []
+    if params["include_images"]:
+        steps.append(("images", fetch_images))
+        if is_anthropic_model(params["model"] or settings.LLM_MODEL):
+            steps.append(("ocr", extract_image_text))
+    steps += [("llm", generate_text), ("seo", analyze_seo), ("saved", persist_article)]
 
-except Exception:
-    logger.warning("Celery 未啟動，文章生成將使用同步模式")
+    queue = generation_queue(user_id)
+    signatures = []
+    stages = []
+    for i, (stage, task) in enumerate(steps):
+        task_id = uuid.uuid4().hex
+        sig = task.s(job) if i == 0 else task.s()
+        signatures.append(sig.set(queue=queue, task_id=task_id))
+        stages.append((stage, task_id))
+    chain(*signatures).apply_async()
+    logger.info(f"文章 {article_id} 已排入 {queue}（{' → '.join(s for s, _ in stages)}）")
+    return stages
@@ -0,0 +1,68 @@
+"""
+文章後處理 micro-benchmark — 確認 render_llm_output 對文章長度與圖片標記數皆為線性
+
+執行（backend 目錄）：
+    python -m scripts.bench_article_renderer
+
+輸出每組參數的平均耗時與「每 KB 耗時」。線性時，文章長度加倍耗時約加倍、每 KB 耗時大致不變；
+標記數增加時每個標記的成本固定，不會隨 image_map 大小放大。
+另列出舊做法（逐個標記 str.replace）作為對照。
+"""
+import re
+import timeit
+
+from app.services.article_renderer import render_llm_output, strip_markdown
+
+PARAGRAPH = (
+    "## 實際使用 **一個月** 的心得\n"
+    "這款保溫杯的 *保冷效果* 真的很好，早上裝冰塊到下午還有一半 😀\n"
+    "- 容量：750ml\n"
+    "- 重量：**320g**\n"
+    "\n"
+)
+
+
+def make_article(paragraphs: int, markers: int) -> tuple[str, dict]:
+    image_map = {f"IMAGE:{i}:0": f"https://cf.shopee.tw/file/{i:08d}" for i in range(markers)}
+    parts = ["# 保溫杯推薦比較\n\n"]
+    for i in range(paragraphs):
+        parts.append(PARAGRAPH)
+        if markers and i % max(1, paragraphs // markers) == 0:
+            parts.append(f"{{{{IMAGE:{(i * 7) % markers}:0}}}}\n\n")
+    return "".join(parts), image_map
+
+
+def legacy_render(text: str, image_map: dict) -> str:
+    """舊做法：strip_markdown 後逐個標記 str.replace（O(標記數 × 長度)）"""
+    content = strip_markdown(text)
+    for marker, url in image_map.items():
+        content = content.replace(f"{{{{{marker}}}}}", f"\n\n![商品圖片]({url})\n\n")
+    return re.sub(r'\{\{IMAGE:[^}]*\}\}', '', content)
+
+
+def bench(fn, text: str, image_map: dict) -> float:
+    runs = 20
+    return min(timeit.repeat(lambda: fn(text, image_map), number=runs, repeat=3)) / runs
+
+
+def main():
+    print("── 文章長度（標記數 20）──")
+    print(f"{'段落':>6} {'KB':>8} {'renderer ms':>12} {'µs/KB':>8} {'legacy ms':>10}")
+    for paragraphs in (50, 100, 200, 400, 800, 1600):
+        text, image_map = make_article(paragraphs, 20)
+        kb = len(text.encode("utf-8")) / 1024
+        t = bench(render_llm_output, text, image_map)
+        t_legacy = bench(legacy_render, text, image_map)
+        print(f"{paragraphs:>6} {kb:>8.1f} {t * 1000:>12.3f} {t / kb * 1e6:>8.1f} {t_legacy * 1000:>10.3f}")
+
+    print("\n── 圖片標記數（段落 400）──")
+    print(f"{'標記':>6} {'renderer ms':>12} {'legacy ms':>10}")
+    for markers in (10, 50, 100, 200, 400):
+        text, image_map = make_article(400, markers)
+        t = bench(render_llm_output, text, image_map)
+        t_legacy = bench(legacy_render, text, image_map)
+        print(f"{markers:>6} {t * 1000:>12.3f} {t_legacy * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
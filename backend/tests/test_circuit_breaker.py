@@ -0,0 +1,83 @@
+"""
+斷路器半開狀態的探測名額：探測請求被取消或逾時未回報時，名額必須歸還，否則斷路器會一直拒絕請求
+"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm_retry import RetryPolicy
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_MIN_REQUESTS", 1)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_OPEN_SECONDS", 0)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_PROBE_TIMEOUT_SECONDS", 300)
+    breaker = CircuitBreaker("google", "test-model")
+    breaker.record_failure(1.0)
+    assert breaker.state == "open"
+    return breaker
+
+
+async def _call(breaker: CircuitBreaker, started: asyncio.Event):
+    """與 llm_service 的 async 呼叫迴圈相同的寫法（單次嘗試）"""
+    policy = RetryPolicy("Test", breaker, ["timeout"], 1)
+    policy.start(0)
+    try:
+        started.set()
+        await asyncio.sleep(3600)
+    except Exception as e:
+        await asyncio.sleep(policy.failed(e))
+    except BaseException:
+        policy.abandon()
+        raise
+    policy.succeeded()
+
+
+def test_cancelled_probe_releases_slot(breaker):
+    async def scenario():
+        started = asyncio.Event()
+        task = asyncio.create_task(_call(breaker, started))
+        await started.wait()
+        assert breaker.state == "half_open"
+        assert breaker.allow() is False  # 探測請求進行中，其他請求被拒絕
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert breaker.state == "half_open"
+    assert breaker.admit() == "probe"  # 名額已歸還，下一個請求成為新的探測請求
+
+
+def test_cancelled_normal_call_keeps_other_probe(breaker):
+    policy = RetryPolicy("Test", breaker, ["timeout"], 1)
+    breaker.state = "closed"
+    policy.start(0)  # 一般放行（非探測）
+    breaker.state = "open"
+    assert breaker.admit() == "probe"  # 另一個請求取得探測名額
+
+    policy.abandon()  # 一般請求被取消不應歸還別人的探測名額
+    assert breaker.allow() is False
+
+
+def test_lost_probe_expires(breaker, monkeypatch):
+    assert breaker.admit() == "probe"
+    assert breaker.allow() is False
+
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_PROBE_TIMEOUT_SECONDS", 0)
+    assert breaker.admit() == "probe"  # 逾時未回報的探測名額失效
+
+
+def test_probe_success_closes(breaker):
+    policy = RetryPolicy("Test", breaker, ["timeout"], 1)
+    policy.start(0)
+    assert policy.probe is True
+    policy.succeeded()
+    policy.abandon()  # 已回報結果後再呼叫不影響狀態
+    assert breaker.state == "closed"
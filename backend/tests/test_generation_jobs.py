@@ -0,0 +1,192 @@
+"""
+生成任務管理：新訂閱者重播歷史事件、delta 重播上限、任務名額排隊，以及結束時清除過期任務
+"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.generation_jobs import GenerationJobManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(settings, "GENERATION_DELTA_BACKLOG_CHARS", 10)
+    monkeypatch.setattr(settings, "GENERATION_MAX_CONCURRENT_JOBS", 1)
+    monkeypatch.setattr(settings, "GENERATION_JOB_TTL", 3600)
+    return GenerationJobManager()
+
+
+async def _collect(manager: GenerationJobManager, article_id: int) -> list[dict]:
+    return [e async for e in manager.stream(article_id) if e is not None]
+
+
+def test_late_subscriber_replays_events(manager):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate():
+            manager.report(1, "llm", model="m")
+            manager.publish(1, "delta", text="abc")
+            await gate.wait()
+            manager.publish(1, "delta", text="def")
+            manager.report(1, "saved")
+
+        manager.submit(1, 7, generate())
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(_collect(manager, 1))
+        await asyncio.sleep(0)
+        gate.set()
+        return await late
+
+    events = asyncio.run(scenario())
+    assert [(e["type"], e.get("stage") or e.get("text")) for e in events] == [
+        ("stage", "queued"), ("stage", "llm"), ("delta", "abc"), ("delta", "def"), ("stage", "saved"),
+    ]
+    assert len({e["job_id"] for e in events}) == 1
+
+
+def test_finished_job_replays_stages_only(manager):
+    async def scenario():
+        async def generate():
+            manager.publish(1, "delta", text="abc")
+            manager.report(1, "saved")
+
+        job = manager.submit(1, 7, generate())
+        await manager.wait(job)
+        return await _collect(manager, 1)
+
+    events = asyncio.run(scenario())
+    assert [e["type"] for e in events] == ["stage", "stage"]  # 完整內容已在 DB，不再重播 delta
+
+
+def test_delta_backlog_capped(manager):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate():
+            for text in ("aaaa", "bbbb", "cccc", "dddd"):
+                manager.publish(1, "delta", text=text)
+            await gate.wait()
+
+        job = manager.submit(1, 7, generate())
+        await asyncio.sleep(0)
+        backlog = list(manager.get(1).events)
+        job.future.cancel()
+        await asyncio.gather(job.future, return_exceptions=True)
+        return backlog
+
+    events = asyncio.run(scenario())
+    assert [e["type"] for e in events] == ["stage", "truncated", "delta", "delta"]
+    assert events[1]["dropped_chars"] == 8
+    assert [e["text"] for e in events[2:]] == ["cccc", "dddd"]
+
+
+def test_reset_discards_deltas(manager):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate():
+            manager.publish(1, "delta", text="aaaa")
+            manager.publish(1, "reset")
+            manager.publish(1, "delta", text="bb")
+            await gate.wait()
+
+        job = manager.submit(1, 7, generate())
+        await asyncio.sleep(0)
+        backlog = list(manager.get(1).events)
+        job.future.cancel()
+        await asyncio.gather(job.future, return_exceptions=True)
+        return backlog
+
+    events = asyncio.run(scenario())
+    assert [e["type"] for e in events] == ["stage", "reset", "delta"]
+    assert manager.get(1).stage == "failed"  # 取消的任務由 _finalize 標記失敗
+
+
+def test_jobs_wait_for_slot(manager):
+    async def scenario():
+        gate = asyncio.Event()
+        started = []
+
+        async def generate(article_id):
+            started.append(article_id)
+            await gate.wait()
+            manager.report(article_id, "saved")
+
+        first = manager.submit(1, 7, generate(1))
+        second = manager.submit(2, 7, generate(2))
+        assert first.events[0]["waiting"] == 0
+        assert second.events[0]["waiting"] == 1
+        await asyncio.sleep(0.01)
+        assert started == [1]
+        assert manager.get(2).stage == "queued"
+        gate.set()
+        await manager.wait(first)
+        await manager.wait(second)
+        assert started == [1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_while_queued_releases_slot(manager):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate(article_id):
+            await gate.wait()
+            manager.report(article_id, "saved")
+
+        first = manager.submit(1, 7, generate(1))
+        second = manager.submit(2, 7, generate(2))
+        await asyncio.sleep(0)
+        second.future.cancel()
+        await asyncio.gather(second.future, return_exceptions=True)
+        assert manager.get(2).stage == "failed"
+        gate.set()
+        await manager.wait(first)
+        third = manager.submit(3, 7, generate(3))
+        assert third.events[0]["waiting"] == 0
+        await manager.wait(third)
+        assert manager.get(3).stage == "saved"
+
+    asyncio.run(scenario())
+
+
+def test_unbounded_jobs_skip_slot(manager):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate(article_id):
+            await gate.wait()
+            manager.report(article_id, "saved")
+
+        manager.submit(1, 7, generate(1))
+        remote = manager.submit(2, 7, generate(2), bounded=False)
+        await asyncio.sleep(0)
+        gate.set()
+        await manager.wait(remote)
+        assert manager.get(2).stage == "saved"
+
+    asyncio.run(scenario())
+
+
+def test_completion_prunes_expired_jobs(manager, monkeypatch):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate(article_id):
+            if article_id == 2:
+                await gate.wait()
+            manager.report(article_id, "saved")
+
+        await manager.wait(manager.submit(1, 7, generate(1)))
+        second = manager.submit(2, 7, generate(2), bounded=False)
+        assert manager.get(1) is not None
+
+        monkeypatch.setattr(settings, "GENERATION_JOB_TTL", -1)
+        gate.set()
+        await manager.wait(second)
+        assert manager.get(1) is None  # 沒有新任務提交，任務結束時也清除過期任務
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+"""
+關鍵字比對：密度計算需與原本逐關鍵字 str.find 的「全域最長匹配優先」結果一致
+"""
+import random
+
+from app.services.keyword_matcher import KeywordMatcher
+
+
+def _reference_chars(content: str, keywords: list[str]) -> int:
+    """原本 _score_keyword_density 的算法：關鍵字由長到短，計入不與已計入範圍重疊的出現位置"""
+    counted = [False] * len(content)
+    keyword_chars = 0
+    for kw in sorted(keywords, key=len, reverse=True):
+        if not kw:
+            continue
+        start = 0
+        while True:
+            pos = content.find(kw, start)
+            if pos == -1:
+                break
+            if not any(counted[pos:pos + len(kw)]):
+                keyword_chars += len(kw)
+                for i in range(pos, pos + len(kw)):
+                    counted[i] = True
+            start = pos + 1
+    return keyword_chars
+
+
+def test_longest_keyword_wins_over_leftmost():
+    matches = KeywordMatcher(["風機推薦", "吹風"]).scan("吹風機推薦")
+    assert matches.matched_chars == 4
+    assert matches.spans == [(1, 5, 0)]
+    # 被部分重疊的「吹風」仍算出現（關鍵字分佈評分）
+    assert matches.contains(0, 5, top=2)
+    assert {index for _, _, index in matches.occurrences} == {0, 1}
+
+
+def test_nested_keyword_reported():
+    matches = KeywordMatcher(["吹風機推薦", "吹風機"]).scan("這台吹風機推薦給大家")
+    assert matches.matched_chars == 5
+    assert matches.contains(0, 10, top=1)
+    assert matches.contains(2, 5, top=2)
+    assert not matches.contains(2, 5, top=1)
+
+
+def test_matches_reference_on_random_inputs():
+    rng = random.Random(0)
+    for _ in range(5000):
+        alphabet = rng.choice(["abc", "abcdefgh"])
+        keywords = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(0, 6))]
+        text = "".join(rng.choice(alphabet + "x") for _ in range(rng.randint(0, 60)))
+        matches = KeywordMatcher(keywords).scan(text)
+        assert matches.matched_chars == _reference_chars(text, keywords), (keywords, text)
+
+        start = rng.randint(0, len(text))
+        end = rng.randint(start, len(text) + 1)
+        top = rng.randint(1, 6)
+        expected = any(kw in text[start:end] for kw in keywords[:top] if kw)
+        assert matches.contains(start, end, top) == expected, (keywords, text, start, end, top)
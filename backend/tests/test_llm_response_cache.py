@@ -0,0 +1,68 @@
+"""
+LLM 回應快取：快取鍵涵蓋所有影響輸出的輸入（模型 / prompt / 圖片內容 / 取樣參數），LRU 與 TTL 淘汰
+"""
+import pytest
+
+from app.config import settings
+from app.services.llm_response_cache import LLMResponseCache
+
+IMAGE = (b"\x89PNG-a", "image/png")
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_RESPONSE_CACHE_TTL", 3600)
+    monkeypatch.setattr(settings, "LLM_RESPONSE_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RESPONSE_CACHE_MAX_BYTES", 1024)
+    return LLMResponseCache()
+
+
+def test_key_depends_on_every_input(monkeypatch):
+    base = LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", [IMAGE])
+    assert base == LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", [IMAGE])
+    # 圖片只看內容，不看 MIME type
+    assert base == LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", [(IMAGE[0], "image/jpeg")])
+
+    variants = [
+        LLMResponseCache.make_key("gemini-2.5-pro", "sys", "user", [IMAGE]),
+        LLMResponseCache.make_key("gemini-2.5-flash", "sys2", "user", [IMAGE]),
+        LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user2", [IMAGE]),
+        LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", [(b"other", "image/png")]),
+        LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", [IMAGE, IMAGE]),
+        LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", None),
+    ]
+    assert len({base, *variants}) == len(variants) + 1
+
+    monkeypatch.setattr(settings, "LLM_TEMPERATURE", settings.LLM_TEMPERATURE + 0.1)
+    assert LLMResponseCache.make_key("gemini-2.5-flash", "sys", "user", [IMAGE]) != base
+
+
+def test_key_does_not_confuse_field_boundaries():
+    assert LLMResponseCache.make_key("m", "ab", "c", None) != LLMResponseCache.make_key("m", "a", "bc", None)
+
+
+def test_lru_eviction(cache):
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"  # a 變成最近使用
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_byte_limit_and_ttl(cache, monkeypatch):
+    cache.put("big", "x" * 2048)
+    assert cache.get("big") is None  # 單筆超過位元組上限不保留
+
+    cache.put("a", "1")
+    monkeypatch.setattr(settings, "LLM_RESPONSE_CACHE_TTL", 0)
+    assert cache.get("a") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_disabled(cache, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RESPONSE_CACHE_ENABLED", False)
+    cache.put("a", "1")
+    assert cache.get("a") is None
@@ -0,0 +1,73 @@
+"""
+速率限制：token bucket 的突發量 / 補充量、依模型分桶、等待超時，以及 Redis 無法連線時退回程序內限制
+"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.rate_limiter import RateLimiter, RateLimitTimeout, _MemoryBackend
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setattr(settings, "RATE_LIMITS", {"gemini": 60, "gemini:gemini-2.5-pro": 6})
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", {"gemini": 2})
+    monkeypatch.setattr(settings, "RATE_LIMIT_MAX_WAIT", 0.0)
+    return RateLimiter()
+
+
+def test_bucket_burst_then_refill_wait():
+    backend = _MemoryBackend()
+    assert backend.reserve("k", rate=1.0, burst=2.0) == 0.0
+    assert backend.reserve("k", rate=1.0, burst=2.0) == 0.0
+    wait = backend.reserve("k", rate=1.0, burst=2.0)
+    assert 0.9 < wait <= 1.0  # 桶已空，約需 1 秒補充一個 token
+    assert backend.reserve("other", rate=1.0, burst=2.0) == 0.0  # 各桶獨立
+
+
+@pytest.mark.usefixtures("limiter")
+def test_limit_lookup():
+    assert RateLimiter._limit_for("gemini:gemini-2.5-pro") == ("gemini:gemini-2.5-pro", 0.1, 1.0)
+    # 以 provider 設定時每個 model 各自一個桶
+    assert RateLimiter._limit_for("gemini:gemini-2.5-flash") == ("gemini:gemini-2.5-flash", 1.0, 2.0)
+    assert RateLimiter._limit_for("shopee") is None
+
+
+def test_acquire_times_out_when_bucket_empty(limiter):
+    limiter.acquire("gemini:gemini-2.5-flash")
+    limiter.acquire("gemini:gemini-2.5-flash")
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("gemini:gemini-2.5-flash")
+
+    stats = limiter.get_stats()["buckets"]["gemini:gemini-2.5-flash"]
+    assert stats["acquired"] == 2
+    assert stats["timeouts"] == 1
+
+
+def test_try_acquire_does_not_wait(limiter):
+    async def scenario():
+        assert await limiter.atry_acquire("gemini:gemini-2.5-pro") is True
+        assert await limiter.atry_acquire("gemini:gemini-2.5-pro") is False
+        assert await limiter.atry_acquire("shopee") is True  # 未設定限制
+
+    asyncio.run(scenario())
+
+
+def test_disabled_never_limits(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    for _ in range(10):
+        limiter.acquire("gemini:gemini-2.5-pro")
+
+
+def test_redis_unreachable_falls_back_to_memory(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "redis")
+    monkeypatch.setattr(settings, "RATE_LIMIT_REDIS_URL", "redis://127.0.0.1:1/0")
+
+    limiter.acquire("gemini:gemini-2.5-pro")
+    assert limiter.get_stats()["backend"] == "memory (redis 無法連線)"
+    # 退回期間仍以程序內的桶限速
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("gemini:gemini-2.5-pro")
@@ -0,0 +1,121 @@
+"""
+相同工作合併執行：並行的相同鍵只執行一次，後到者拿到深複製；取消只影響自己，全部取消時才取消工作
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def test_sync_calls_coalesce():
+    flight = SingleFlight()
+    calls = 0
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def work():
+        nonlocal calls
+        calls += 1
+        started.set()
+        release.wait(5)
+        return {"items": [1]}
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    follower.start()
+    while flight.get_stats()["coalesced_total"] == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert calls == 1
+    assert results == [{"items": [1]}, {"items": [1]}]
+    assert results[0] is not results[1]  # 後到者拿到深複製
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_sync_error_shared():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("x")
+
+    with pytest.raises(ValueError):
+        flight.do("k", boom)
+    assert flight.do("k", lambda: 1) == 1  # 失敗後不留下進行中的呼叫
+
+
+def test_async_calls_coalesce_and_copy():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"items": [1]}
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.ado("k", work))
+        await asyncio.sleep(0)
+        assert flight.in_flight("k")
+        second = await flight.ado("k", work)
+        second["items"].append(2)
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert calls == 1
+    assert first == {"items": [1]}
+    assert second == {"items": [1, 2]}
+    assert not flight.in_flight("k")
+
+
+def test_async_cancel_one_waiter_keeps_work():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.ado("k", work))
+        second = asyncio.ensure_future(flight.ado("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_async_cancel_all_waiters_cancels_work():
+    flight = SingleFlight()
+
+    async def scenario():
+        stopped = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        waiters = [asyncio.ensure_future(flight.ado("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(stopped.wait(), 1)
+        # 下一個呼叫端重新開始新的工作，不會加入已取消的那一個
+        assert not flight.in_flight("k")
+
+    asyncio.run(scenario())
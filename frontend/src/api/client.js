@@ -187,6 +187,10 @@ export const copyArticle = (id) =>
 export const getArticleImages = (id) =>
   api.get(`/articles/${id}/images`).then(r => r.data);
 
+// 圖片代理（需登入，回傳 Blob）
+export const fetchProxiedImage = (url) =>
+  api.get('/articles/image-proxy', { params: { url }, responseType: 'blob' }).then(r => r.data);
+
 // Prompt 範本（帶快取）
 export const getPrompts = () =>
   cachedGet('prompts', () => api.get('/prompts').then(r => r.data), 300_000); // 5 分鐘
@@ -210,6 +214,17 @@ export const analyzeSeo = (data) =>
 export const analyzeSeoById = (articleId) =>
   api.post(`/seo/analyze/${articleId}`).then(r => r.data);
 
+// 即時 SEO 分析（編輯中）：start 送全文，之後 patch 只送段落修改 [{ start, delete, insert }]
+// patch 回 404 / 409 時重新 start
+export const startSeoLive = (data) =>
+  api.post('/seo/live', data).then(r => r.data);
+
+export const patchSeoLive = (sessionId, data) =>
+  api.patch(`/seo/live/${sessionId}`, data).then(r => r.data);
+
+export const closeSeoLive = (sessionId) =>
+  api.delete(`/seo/live/${sessionId}`).then(r => r.data);
+
 // 用量（帶快取，TTL 60 秒）
 export const getUsage = () =>
   cachedGet('usage', () => api.get('/usage').then(r => r.data), 60_000);
@@ -88,8 +88,9 @@ function KeywordPill({ keyword }) {
  * @param {boolean} props.optimized - 是否為優化後的結果
  * @param {number} props.beforeScore - 優化前的分數（僅在 optimized 時使用）
  * @param {Object} props.beforeAnalysis - 優化前的完整分析（含 breakdown）
+ * @param {boolean} props.live - 是否為編輯中的即時分析（見 useSeoLive，尚未儲存）
  */
-export default function SeoPanel({ data, optimized = false, beforeScore = null, beforeAnalysis = null }) {
+export default function SeoPanel({ data, optimized = false, beforeScore = null, beforeAnalysis = null, live = false }) {
   const [collapsed, setCollapsed] = useState(true);
 
   if (!data) return null;
@@ -146,7 +147,7 @@ export default function SeoPanel({ data, optimized = false, beforeScore = null,
         onClick={() => setCollapsed(c => !c)}
       >
         <span className={`font-semibold text-base ${optimized ? 'text-green-800' : 'text-purple-800'}`}>
-          {optimized ? 'SEO 優化完成' : 'SEO 分析'}
+          {optimized ? 'SEO 優化完成' : live ? 'SEO 分析（編輯中即時更新）' : 'SEO 分析'}
         </span>
         <div className="flex items-center gap-3">
           <div className="text-right">
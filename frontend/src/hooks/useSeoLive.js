@@ -0,0 +1,97 @@
+import { useEffect, useRef } from 'react';
+import { startSeoLive, patchSeoLive, closeSeoLive } from '../api/client';
+
+// 停止輸入多久後才送出分析（毫秒）
+const DEBOUNCE_MS = 500;
+
+// 以空行切段（與後端 seo_incremental 相同）
+function splitBlocks(text) {
+  return text.split('\n\n');
+}
+
+// 新舊段落比對：去掉相同的開頭與結尾，剩下的部分以一個 splice 表示，沒有變化時回傳 null
+function diffBlocks(prev, next) {
+  let start = 0;
+  while (start < prev.length && start < next.length && prev[start] === next[start]) start++;
+  let endPrev = prev.length;
+  let endNext = next.length;
+  while (endPrev > start && endNext > start && prev[endPrev - 1] === next[endNext - 1]) {
+    endPrev--;
+    endNext--;
+  }
+  if (start === endPrev && start === endNext) return null;
+  return { start, delete: endPrev - start, insert: next.slice(start, endNext) };
+}
+
+/**
+ * 編輯中的即時 SEO 分析：開始時送一次全文（POST /seo/live），之後只送改動的段落（PATCH）
+ * 工作階段不存在 / 版本不符（404 / 409，例如請求落到其他 worker）時自動重新開始；停用或卸載時關閉工作階段
+ * @param {boolean} enabled - 是否啟用（編輯模式中）
+ * @param {Object} input - { title, content, imageCount }
+ * @param {Function} onResult - 收到分析結果（與 analyze 相同格式）
+ */
+export function useSeoLive(enabled, { title, content, imageCount }, onResult) {
+  const sessionRef = useRef(null); // { id, version, blocks, title }
+  const queueRef = useRef(Promise.resolve());
+  const latestRef = useRef(null);
+  latestRef.current = { enabled, title, content, imageCount, onResult };
+
+  useEffect(() => {
+    if (!enabled) return undefined;
+
+    const sync = async () => {
+      const { title, content, imageCount } = latestRef.current;
+      // 回應抵達時已離開編輯模式則不更新結果（取消編輯後顯示的是已儲存的分析）
+      const onResult = (analysis) => {
+        if (latestRef.current.enabled) latestRef.current.onResult(analysis);
+      };
+      const blocks = splitBlocks(content);
+      const session = sessionRef.current;
+      try {
+        if (session) {
+          const op = diffBlocks(session.blocks, blocks);
+          const titleChanged = title !== session.title;
+          if (!op && !titleChanged) return;
+          try {
+            const res = await patchSeoLive(session.id, {
+              version: session.version,
+              ops: op ? [op] : [],
+              title: titleChanged ? title : undefined,
+              image_count: imageCount,
+            });
+            sessionRef.current = { id: res.session_id, version: res.version, blocks, title };
+            onResult(res.analysis);
+            return;
+          } catch (err) {
+            const status = err.response?.status;
+            if (status !== 404 && status !== 409) throw err;
+            sessionRef.current = null;
+          }
+        }
+        const res = await startSeoLive({ title, content, image_count: imageCount });
+        sessionRef.current = { id: res.session_id, version: res.version, blocks, title };
+        onResult(res.analysis);
+      } catch (err) {
+        console.error('即時 SEO 分析失敗:', err);
+      }
+    };
+
+    // 依序送出，避免兩個 patch 帶同一個版本號
+    const timer = setTimeout(() => {
+      queueRef.current = queueRef.current.then(sync);
+    }, sessionRef.current ? DEBOUNCE_MS : 0);
+    return () => clearTimeout(timer);
+  }, [enabled, title, content, imageCount]);
+
+  // 離開編輯模式 / 卸載時關閉工作階段
+  useEffect(() => {
+    if (!enabled) return undefined;
+    return () => {
+      queueRef.current = queueRef.current.then(() => {
+        const session = sessionRef.current;
+        sessionRef.current = null;
+        if (session) closeSeoLive(session.id).catch(() => {});
+      });
+    };
+  }, [enabled]);
+}
@@ -1,17 +1,15 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
-import { getArticles, getArticle, updateArticle, deleteArticle, batchDeleteArticles, copyArticle, analyzeSeoById, invalidateCache, fetchArticlesFresh } from '../api/client';
+import { getArticles, getArticle, updateArticle, deleteArticle, batchDeleteArticles, copyArticle, analyzeSeoById, invalidateCache, fetchArticlesFresh, fetchProxiedImage } from '../api/client';
 import SeoPanel from '../components/SeoPanel';
 import { useAuth } from '../contexts/AuthContext';
 import { useExtensionDetect } from '../hooks/useExtensionDetect';
+import { useSeoLive } from '../hooks/useSeoLive';
 import { formatDate, formatDateTime } from '../utils/datetime';
 
 // 複製圖片到剪貼簿（透過後端代理避免跨域）
 async function copyImageToClipboard(imageUrl) {
   try {
-    const proxyUrl = `/api/articles/image-proxy?url=${encodeURIComponent(imageUrl)}`;
-    const resp = await fetch(proxyUrl);
-    if (!resp.ok) throw new Error(`代理回應 ${resp.status}`);
-    const blob = await resp.blob();
+    const blob = await fetchProxiedImage(imageUrl);
     const pngBlob = await convertToPng(blob);
     await navigator.clipboard.write([
       new ClipboardItem({ 'image/png': pngBlob })
@@ -110,6 +108,15 @@ function RenderContent({ text }) {
   });
 }
 
+// 文章已儲存的 SEO 分析（seo_suggestions 含 breakdown 時才直接顯示）
+function storedSeo(article) {
+  const seoData = article.seo_suggestions;
+  if (seoData && typeof seoData === 'object' && !Array.isArray(seoData) && seoData.breakdown) {
+    return seoData;
+  }
+  return null;
+}
+
 export default function ArticlesPage() {
   const { user } = useAuth();
   const { isInstalled: extInstalled, extensionId } = useExtensionDetect();
@@ -130,6 +137,13 @@ export default function ArticlesPage() {
   const [batchDeleting, setBatchDeleting] = useState(false);
   const [mobileShowDetail, setMobileShowDetail] = useState(false);
 
+  // 編輯內文時即時更新 SEO 分析（只送改動的段落）
+  useSeoLive(editing, {
+    title: editTitle || selectedArticle?.title || '',
+    content: editContent,
+    imageCount: selectedArticle?.image_map ? Object.keys(selectedArticle.image_map).length : 0,
+  }, setSeoResult);
+
   const showToast = (type, message) => {
     setToast({ type, message });
     setTimeout(() => setToast(null), 4000);
@@ -218,13 +232,7 @@ export default function ArticlesPage() {
       setEditingTitle(false);
       setMobileShowDetail(true);
 
-      // 若已有 seo_suggestions 且含 breakdown，直接顯示
-      const seoData = article.seo_suggestions;
-      if (seoData && typeof seoData === 'object' && !Array.isArray(seoData) && seoData.breakdown) {
-        setSeoResult(seoData);
-      } else {
-        setSeoResult(null);
-      }
+      setSeoResult(storedSeo(article));
     } catch (err) {
       console.error('載入文章詳情失敗:', err);
     }
@@ -591,6 +599,7 @@ export default function ArticlesPage() {
                 <SeoPanel
                   data={seoResult}
                   optimized={false}
+                  live={editing}
                 />
               </div>
             )}
@@ -617,7 +626,7 @@ export default function ArticlesPage() {
                     />
                     <div className="flex gap-2 mt-3">
                       <button onClick={handleSave} className="px-4 py-2 bg-blue-500 text-white rounded-lg text-sm hover:bg-blue-600 active:scale-95 transition-transform">💾 儲存</button>
-                      <button onClick={() => { setEditing(false); setEditContent(selectedArticle.content || ''); }} className="px-4 py-2 bg-gray-200 rounded-lg text-sm hover:bg-gray-300 active:scale-95 transition-transform">✕ 取消</button>
+                      <button onClick={() => { setEditing(false); setEditContent(selectedArticle.content || ''); setSeoResult(storedSeo(selectedArticle)); }} className="px-4 py-2 bg-gray-200 rounded-lg text-sm hover:bg-gray-300 active:scale-95 transition-transform">✕ 取消</button>
                     </div>
                   </div>
                 ) : (
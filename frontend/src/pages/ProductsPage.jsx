@@ -71,6 +71,7 @@ export default function ProductsPage() {
   const [affiliateUrls, setAffiliateUrls] = useState('');
   const [affiliateImporting, setAffiliateImporting] = useState(false);
   const [affiliateResult, setAffiliateResult] = useState(null);
+  const lastGeneratedRef = useRef(null); // 上次成功生成的請求內容（相同內容再按一次 = 重新生成）
 
   // 已儲存連結
   const [savedLinksData, setSavedLinksData] = useState([]);
@@ -212,7 +213,13 @@ export default function ProductsPage() {
       if (keywordStrategy) {
         payload.keyword_strategy = keywordStrategy;
       }
+      // 後端預設沿用相同輸入的上次結果（避免重送時重複呼叫 LLM）；已成功生成過的內容再按一次代表要新版本
+      const payloadKey = JSON.stringify(payload);
+      if (lastGeneratedRef.current === payloadKey) {
+        payload.use_cache = false;
+      }
       await generateArticle(payload);
+      lastGeneratedRef.current = payloadKey;
       showToast('success', '文章生成完成！可到文章管理頁查看');
     } catch (err) {
       showToast('error', '生成失敗: ' + (err.response?.data?.detail || err.message));
@@ -159,6 +159,11 @@ export default function UsagePage() {
                       <div className="font-medium text-gray-800">{formatTokens(m.output_tokens)}</div>
                     </div>
                   </div>
+                  {(m.cache_read_tokens > 0 || m.cache_write_tokens > 0) && (
+                    <div className="mt-2 text-xs text-gray-500">
+                      Prompt 快取：讀取 {formatTokens(m.cache_read_tokens)} · 寫入 {formatTokens(m.cache_write_tokens)}
+                    </div>
+                  )}
                 </div>
               );
             })}